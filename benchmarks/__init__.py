@@ -0,0 +1 @@
+"""Benchmarks for customer capture and webhook state. Run with `python -m benchmarks.<name>`."""
@@ -0,0 +1,96 @@
+"""
+Small timing harness shared by the benchmark scripts.
+
+Each case is timed per call with perf_counter_ns so that tail latency (p99)
+is visible, not just the mean.
+"""
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+
+def measure(fn: Callable, inputs: list, min_time: float = 0.5, max_calls: int = 200_000) -> dict:
+    """
+    Call fn(x) for inputs in round-robin until min_time seconds have elapsed.
+
+    Returns ops/sec plus p50/p99/max latencies in nanoseconds.
+    """
+    if not inputs:
+        raise ValueError("measure() needs at least one input")
+
+    # Warm-up pass (regex cache, lazy imports)
+    for x in inputs:
+        fn(x)
+
+    samples: list[int] = []
+    clock = time.perf_counter_ns
+    deadline = clock() + int(min_time * 1e9)
+    n = len(inputs)
+    i = 0
+    while clock() < deadline and i < max_calls:
+        x = inputs[i % n]
+        t0 = clock()
+        fn(x)
+        samples.append(clock() - t0)
+        i += 1
+
+    samples.sort()
+    total = sum(samples)
+    return {
+        "calls": len(samples),
+        "ops_per_sec": round(len(samples) / (total / 1e9), 1) if total else 0.0,
+        "mean_ns": total // len(samples),
+        "p50_ns": samples[len(samples) // 2],
+        "p99_ns": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_ns": samples[-1],
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def print_table(results: dict, baseline: Optional[dict] = None) -> None:
+    """Print results (name -> measure() dict), with deltas against a previous run if given."""
+    header = f"{'case':<40} {'ops/sec':>12} {'p50 µs':>10} {'p99 µs':>10}"
+    if baseline:
+        header += f" {'Δ ops/sec':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        line = f"{name:<40} {r['ops_per_sec']:>12,.0f} {r['p50_ns'] / 1000:>10.1f} {r['p99_ns'] / 1000:>10.1f}"
+        if baseline and name in baseline:
+            prev = baseline[name]["ops_per_sec"]
+            if prev:
+                line += f" {(r['ops_per_sec'] - prev) / prev * 100:>+9.1f}%"
+        print(line)
+
+
+def save_results(path: str, suite: str, results: dict, extra: Optional[dict] = None) -> None:
+    payload = {"suite": suite, "environment": environment(), "results": results}
+    if extra:
+        payload.update(extra)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
@@ -0,0 +1,72 @@
+"""
+Structured address tokenizer vs the free-text street extractor.
+
+Times extract_street_address alone, the tokenizer on the extracted lines, and
+both together, then shows the components found for each distinct address in the
+corpus and how AggregationRecord.merge combines follow-up answers.
+
+Usage:
+    python -m benchmarks.bench_address [--json PATH] [--compare PATH]
+"""
+import argparse
+import logging
+
+from customer_capture.address import tokenize_address
+from customer_capture.parser import extract_street_address, parse_customer_message
+from customer_capture.state import AggregationRecord
+
+from ._harness import load_results, measure, print_table, save_results
+from .corpus import all_messages, build_corpus
+
+# Address given over several DMs, as customers answer the delivery form
+FOLLOW_UPS = [
+    ["str. Mihai Viteazu 25", "ap. 12", "bl. 3, sc. 2"],
+    ["ул. Дачия 20/1", "кв. 44"],
+    ["bd. Ștefan cel Mare 134, bl. 2, sc. 3, et. 4, ap. 56", "str. Lenin 14"],
+]
+
+
+def extract_and_tokenize(text: str):
+    address = extract_street_address(text)
+    return tokenize_address(address) if address else None
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Address tokenizer benchmark")
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--json", metavar="PATH")
+    ap.add_argument("--compare", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    mixed = build_corpus()
+    addresses = sorted({a for a in map(extract_street_address, all_messages()) if a})
+
+    results = {
+        "extract_street_address[mixed]": measure(extract_street_address, mixed, min_time=args.min_time),
+        "extract+tokenize[mixed]": measure(extract_and_tokenize, mixed, min_time=args.min_time),
+        "tokenize_address[addresses]": measure(tokenize_address, addresses, min_time=args.min_time),
+    }
+    baseline = load_results(args.compare) if args.compare else None
+    print_table(results, baseline)
+
+    print("\nComponents:")
+    for address in addresses:
+        parts = tokenize_address(address)
+        print(f"  {address[:50]!r:<54} -> {parts.format()!r} ({parts.component_count()})")
+
+    print("\nMerge of follow-up messages:")
+    for messages in FOLLOW_UPS:
+        record = AggregationRecord("bench")
+        for text in messages:
+            record.merge(parse_customer_message(text))
+        print(f"  {' | '.join(messages)!r}\n    -> {record.adress!r}")
+
+    if args.json:
+        save_results(args.json, "address", results)
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
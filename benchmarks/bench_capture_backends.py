@@ -0,0 +1,133 @@
+"""
+Customer capture stores on the same workload: memory, SQLite, Redis.
+
+--users leads each send name, phone, address and town as four DMs in an
+interleaved order. For every backend the DMs go through update() (the
+webhook's merge), then get(), delete() (a successful export) and one
+cleanup_stale() over records that have all gone stale are timed.
+
+  memory          InMemoryStore
+  sqlite          SqliteStore in a temp file, batched commits (the default)
+  sqlite/commit1  SqliteStore committing every write, to show what batching saves
+  redis           RedisStore against --redis-url / REDIS_URL, else fakeredis
+                  (in-process: no network round trips, so not comparable)
+
+Usage:
+    python -m benchmarks.bench_capture_backends [--users 5000] [--json PATH]
+    python -m benchmarks.bench_capture_backends --redis-url redis://localhost:6379/15
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.settings import settings
+from customer_capture.state import InMemoryStore, RedisStore, SqliteStore
+
+from ._harness import measure, print_table, save_results
+from .bench_capture_concurrency import DMS, atomic_merge, cleanup, jobs, user_ids
+
+
+def once(fn, inputs: list) -> dict:
+    """fn(x) once per input, reported like measure(); no warm-up, as the calls change the store."""
+    samples = []
+    clock = time.perf_counter_ns
+    for x in inputs:
+        t0 = clock()
+        fn(x)
+        samples.append(clock() - t0)
+    samples.sort()
+    total = sum(samples)
+    return {
+        "calls": len(samples),
+        "ops_per_sec": round(len(samples) / (total / 1e9), 1) if total else 0.0,
+        "mean_ns": total // len(samples),
+        "p50_ns": samples[len(samples) // 2],
+        "p99_ns": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_ns": samples[-1],
+    }
+
+
+def run(name: str, store, ids: list[str], min_time: float) -> dict:
+    parsed = [parse_customer_message(text) for text in DMS]
+    work = jobs(ids, 0)
+    # measure() warms up with the whole workload: the timed calls merge into pending leads
+    results = {
+        f"{name}: dm (update+merge)": measure(lambda job: atomic_merge(store, job[0], parsed[job[1]]),
+                                              work, min_time=min_time),
+        f"{name}: get": measure(store.get, ids, min_time=min_time),
+    }
+    flush = getattr(store, "flush", None)
+    if flush is not None:
+        flush()
+    half = len(ids) // 2
+    results[f"{name}: delete"] = once(store.delete, ids[:half])
+
+    # Age the rest past 2x cooldown and time one cleanup pass removing them
+    stale = time.time() - settings.COOLDOWN_SECONDS * 3
+    for uid in ids[half:]:
+        record = store.get(uid)
+        record.last_update = int(stale)
+        store.set(uid, record)
+    if flush is not None:
+        flush()
+
+    def cleanup_pass(_) -> None:
+        store.cleanup_stale()
+        if flush is not None:
+            flush()
+
+    results[f"{name}: cleanup_stale ({len(ids) - half} stale)"] = once(cleanup_pass, [None])
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Capture store backends on one workload")
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    ids = user_ids(args.users)
+    print(f"{args.users:,} users x {len(DMS)} DMs\n")
+    results = run("memory", InMemoryStore(), ids, args.min_time)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, batch in (("sqlite", None), ("sqlite/commit1", 1)):
+            path = os.path.join(tmp, f"{name.replace('/', '-')}.db")
+            store = SqliteStore(path) if batch is None else SqliteStore(path, commit_batch=batch)
+            results.update(run(name, store, ids, args.min_time))
+            store.close()
+            print(f"  {name}: {store.commits:,} commits")
+
+    client = None
+    if args.redis_url:
+        import redis
+        client, name = redis.from_url(args.redis_url), "redis"
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("  redis: skipped (pass --redis-url or install fakeredis)")
+        else:
+            client, name = fakeredis.FakeRedis(), "fakeredis"
+    if client is not None:
+        cleanup(client)
+        # Redis expires keys itself: its cleanup_stale is a no-op and timed as such
+        results.update(run(name, RedisStore(client), ids, args.min_time))
+        cleanup(client)
+
+    print()
+    print_table(results)
+    if args.json:
+        save_results(args.json, "capture_backends", results, extra={"users": args.users})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
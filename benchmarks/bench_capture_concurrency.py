@@ -0,0 +1,179 @@
+"""
+Stress check for concurrent capture merges of the same user.
+
+tests/test_capture_concurrency.py runs the same interleaving through
+process_customer_message with an export racing it, on every test run; this
+script races the merges alone at scale.
+
+Every user sends name, phone, address and town as four DMs, and workers
+process them in an interleaved order, so the DMs of one user race each other.
+Afterwards each record must hold all four fields and all four raw messages;
+the script exits 1 if any user lost something. For comparison the old
+get -> merge -> save sequence is raced the same way and its losses reported.
+
+  memory   threads sharing one InMemoryStore (striped locks)
+  redis    processes x threads, each process with its own client, against
+           --redis-url / REDIS_URL (WATCH/MULTI); threads only with fakeredis
+
+Usage:
+    python -m benchmarks.bench_capture_concurrency [--users 500] [--threads 8]
+    python -m benchmarks.bench_capture_concurrency --redis-url redis://localhost:6379/15 --processes 4
+"""
+import argparse
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import AggregationRecord, InMemoryStore, RedisStore
+
+# One field per DM: losing a DM loses its field and its raw message
+DMS = ["Ion Popescu", "069123456", "str. Mihai Viteazu 25, ap. 12", "Bălți, MD-3100"]
+FIELDS = ("full_name", "contact_number", "adress", "location")
+PREFIX = "customer_capture:bench-conc-"
+
+
+def user_ids(n: int) -> list[str]:
+    return [f"bench-conc-{i:06d}" for i in range(n)]
+
+
+def jobs(ids: list[str], seed: int) -> list[tuple[str, int]]:
+    work = [(uid, i) for uid in ids for i in range(len(DMS))]
+    random.Random(seed).shuffle(work)
+    return work
+
+
+def naive_merge(store, uid: str, parsed) -> None:
+    """The pre-update sequence: read, merge, save."""
+    record = store.get(uid) or AggregationRecord(uid)
+    time.sleep(0)  # let another thread in between the read and the save, as a slow parse would
+    record.merge(parsed)
+    store.set(uid, record)
+
+
+def atomic_merge(store, uid: str, parsed) -> None:
+    def merge_into(record):
+        record = record or AggregationRecord(uid)
+        record.merge(parsed)
+        return record
+    store.update(uid, merge_into)
+
+
+def race(store, ids: list[str], threads: int, merge, seed: int = 0) -> None:
+    parsed = [parse_customer_message(text) for text in DMS]
+    work = jobs(ids, seed)
+    with ThreadPoolExecutor(threads) as pool:
+        for _ in pool.map(lambda job: merge(store, job[0], parsed[job[1]]), work):
+            pass
+
+
+def lost(store, ids: list[str]) -> int:
+    """Users whose record misses a field or a raw message."""
+    missing = 0
+    for uid in ids:
+        record = store.get(uid)
+        if record is None or len(record.raw_messages) < len(DMS) \
+                or any(getattr(record, field) is None for field in FIELDS):
+            missing += 1
+    return missing
+
+
+def _redis_process(url: str, ids: list[str], threads: int, seed: int) -> int:
+    import redis
+    store = RedisStore(redis.from_url(url))
+    race(store, ids, threads, atomic_merge, seed)
+    return store.conflicts
+
+
+def cleanup(client) -> None:
+    keys = list(client.scan_iter(match=PREFIX + "*", count=1000))
+    for i in range(0, len(keys), 1000):
+        client.delete(*keys[i:i + 1000])
+
+
+def report(name: str, ids: list[str], missing: int, elapsed: float, extra: str = "") -> bool:
+    print(f"  {name:<30} {missing:>5} of {len(ids)} users lost data{extra}  ({elapsed:.2f}s)")
+    return missing == 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Concurrent capture merge check")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--processes", type=int, default=4, help="Redis only")
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    ids = user_ids(args.users)
+    print(f"{args.users:,} users x {len(DMS)} DMs, {args.threads} threads")
+    ok = True
+
+    store = InMemoryStore()
+    start = time.perf_counter()
+    race(store, ids, args.threads, naive_merge)
+    # Expected to lose data: shown for comparison, does not fail the run
+    report("memory, get/merge/save", ids, lost(store, ids), time.perf_counter() - start)
+
+    store = InMemoryStore()
+    start = time.perf_counter()
+    race(store, ids, args.threads, atomic_merge)
+    ok &= report("memory, update", ids, lost(store, ids), time.perf_counter() - start)
+
+    if args.redis_url:
+        import redis
+        client = redis.from_url(args.redis_url)
+        cleanup(client)
+        store = RedisStore(client)
+        start = time.perf_counter()
+        race(store, ids, args.threads, naive_merge)
+        report("redis, get/merge/save", ids, lost(store, ids), time.perf_counter() - start)
+        cleanup(client)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(args.processes) as pool:
+            futures = [pool.submit(_redis_process, args.redis_url, ids, args.threads, n)
+                       for n in range(args.processes)]
+            conflicts = sum(future.result() for future in futures)
+        # Every process sends every DM: records must still hold each field once
+        ok &= report(f"redis, {args.processes} procs x {args.threads} thr", ids, lost(store, ids),
+                     time.perf_counter() - start, f", {conflicts} WATCH retries")
+        cleanup(client)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("  redis: skipped (pass --redis-url or install fakeredis)")
+        else:
+            client = fakeredis.FakeRedis()
+            store = RedisStore(client)
+            start = time.perf_counter()
+            race(store, ids, args.threads, naive_merge)
+            report("fakeredis, get/merge/save", ids, lost(store, ids), time.perf_counter() - start)
+            cleanup(client)
+
+            # Separate stores (and so separate stripe locks) act like separate workers
+            workers = [RedisStore(client) for _ in range(args.threads)]
+            start = time.perf_counter()
+            parsed = [parse_customer_message(text) for text in DMS]
+            work = jobs(ids, 0)
+
+            def worker(n: int) -> None:
+                for uid, i in work[n::args.threads]:
+                    atomic_merge(workers[n], uid, parsed[i])
+
+            with ThreadPoolExecutor(args.threads) as pool:
+                list(pool.map(worker, range(args.threads)))
+            conflicts = sum(w.conflicts for w in workers)
+            ok &= report("fakeredis, update", ids, lost(store, ids), time.perf_counter() - start,
+                         f", {conflicts} WATCH retries")
+            cleanup(client)
+
+    print("OK: no user lost a field" if ok else "FAIL: concurrent merges lost data")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
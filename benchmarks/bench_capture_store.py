@@ -0,0 +1,209 @@
+"""
+RedisStore layouts: one JSON blob per record vs hash fields + capped raw list.
+
+Replays lead conversations (one get -> merge -> set per DM, as flask_hook does)
+against each layout and reports, per DM, the bytes sent to Redis, the payload
+bytes read back, round trips and latency. "short" is one lead giving its
+details over 8 DMs; "long" goes on with 20 more lead messages, so the record
+sits at its 10 raw message cap:
+
+  json          the previous layout: GET + json/fromisoformat, SETEX of the
+                whole to_dict() including every raw message
+  hash          HGETALL + LRANGE in one pipeline; HSET of changed fields,
+                RPUSH/LTRIM of new raw messages and EXPIREs in another
+  hash+compact  same, raw messages zlib-compressed when that is smaller
+
+Needs --redis-url / REDIS_URL or fakeredis; byte counts do not depend on the
+server, latencies from fakeredis leave out the network.
+
+Usage:
+    python -m benchmarks.bench_capture_store [--redis-url URL] [--conversations 300] [--json PATH]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from redis.connection import Connection
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import AggregationRecord, RedisStore
+
+from ._harness import print_table, save_results
+from .corpus import LEAD_MESSAGES
+
+# One lead over several DMs: questions first, then the form answered piecemeal
+CONVERSATION = [
+    "Bună ziua! Cât costă lampa cu inscripție și cât durează livrarea în Bălți?",
+    "Vreau să comand una pentru ziua mamei, cu textul «Te iubim, mama» și o inimioară",
+    "Ion Popescu",
+    "069123456",
+    "str. Mihai Viteazu 25, ap. 12",
+    "bl. 3, sc. 2, et. 4",
+    "Bălți, MD-3100",
+    "Ion Popescu\n069123456\nstr. Mihai Viteazu 25, bl. 3, sc. 2, et. 4, ap. 12, Bălți",
+]
+
+PROFILES = {"short": CONVERSATION, "long": CONVERSATION + LEAD_MESSAGES}
+
+
+class JsonRedisStore(RedisStore):
+    """The layout RedisStore used before: one JSON string per record."""
+
+    def get(self, user_id):
+        data = self.redis.get(f"customer_capture:{user_id}")
+        return AggregationRecord.from_dict(json.loads(data)) if data else None
+
+    def set(self, user_id, record):
+        self.redis.set(f"customer_capture:{user_id}", json.dumps(record.to_dict()), ex=self.ttl)
+
+
+def _payload_bytes(value) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_bytes(k) + _payload_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_bytes(v) for v in value)
+    return 8
+
+
+class WireCounter:
+    """Counts request bytes (RESP-encoded), reply payload bytes and round trips of a client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.sent = self.received = self.round_trips = 0
+        self._packer = Connection()
+        execute_command = client.execute_command
+
+        def counted(*args, **options):
+            self._count_request([args])
+            result = execute_command(*args, **options)
+            self.received += _payload_bytes(result)
+            return result
+
+        client.execute_command = counted
+        pipeline = client.pipeline
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def counted_execute(*a, **kw):
+                self._count_request([command for command, _ in pipe.command_stack])
+                result = execute(*a, **kw)
+                self.received += _payload_bytes(result)
+                return result
+
+            pipe.execute = counted_execute
+            return pipe
+
+        client.pipeline = counted_pipeline
+
+    def _count_request(self, commands) -> None:
+        self.round_trips += 1
+        for args in commands:
+            self.sent += sum(len(chunk) for chunk in self._packer.pack_command(*args))
+
+    def reset(self) -> None:
+        self.sent = self.received = self.round_trips = 0
+
+
+def connect(url: str | None):
+    if url:
+        import redis
+        client = redis.from_url(url)
+        client.ping()
+        return client, "redis"
+    try:
+        import fakeredis
+    except ImportError:
+        return None, None
+    return fakeredis.FakeRedis(), "fakeredis"
+
+
+def replay(store: RedisStore, user_ids: list[str], parsed: list) -> list[int]:
+    """Run the conversation for each user; returns ns per DM."""
+    samples = []
+    clock = time.perf_counter_ns
+    for uid in user_ids:
+        for message in parsed:
+            t0 = clock()
+            record = store.get(uid) or AggregationRecord(uid)
+            record.merge(message)
+            store.set(uid, record)
+            samples.append(clock() - t0)
+    return samples
+
+
+def summarize(samples: list[int]) -> dict:
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "calls": len(samples),
+        "ops_per_sec": round(len(samples) / (total / 1e9), 1),
+        "mean_ns": total // len(samples),
+        "p50_ns": samples[len(samples) // 2],
+        "p99_ns": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_ns": samples[-1],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Customer capture Redis layout benchmark")
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    ap.add_argument("--conversations", type=int, default=300)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    client, target = connect(args.redis_url)
+    if client is None:
+        print("No Redis available: pass --redis-url (or set REDIS_URL) or install fakeredis")
+        return 2
+
+    counter = WireCounter(client)
+    results, wire = {}, {}
+    for profile, texts in PROFILES.items():
+        parsed = [parse_customer_message(text) for text in texts]
+        for layout, store_cls, compact in (
+            ("json", JsonRedisStore, False),
+            ("hash", RedisStore, False),
+            ("hash+compact", RedisStore, True),
+        ):
+            name = f"dm[{profile},{layout}]"
+            os.environ["COMPACT_RAW_MESSAGES"] = "1" if compact else "0"
+            # Same-length IDs in every run so key names weigh the same on the wire
+            user_ids = [f"bench-{i:06d}" for i in range(args.conversations)]
+            counter.reset()
+            store = store_cls(client)
+            samples = replay(store, user_ids, parsed)
+            dms = len(samples)
+            results[name] = summarize(samples)
+            wire[name] = {
+                "sent_per_dm": round(counter.sent / dms),
+                "received_per_dm": round(counter.received / dms),
+                "round_trips_per_dm": round(counter.round_trips / dms, 2),
+            }
+            for uid in user_ids:
+                store.delete(uid)
+    os.environ.pop("COMPACT_RAW_MESSAGES", None)
+
+    sizes = ", ".join(f"{profile} {len(texts)}" for profile, texts in PROFILES.items())
+    print(f"{args.conversations} conversations per case ({sizes} DMs) against {target}\n")
+    print_table(results)
+    print(f"\n{'case':<28} {'sent B/DM':>10} {'read B/DM':>10} {'round trips':>12}")
+    for name, w in wire.items():
+        print(f"{name:<28} {w['sent_per_dm']:>10,} {w['received_per_dm']:>10,} {w['round_trips_per_dm']:>12}")
+
+    if args.json:
+        save_results(args.json, "capture_store", results,
+                     extra={"target": target, "conversations": args.conversations, "wire": wire})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
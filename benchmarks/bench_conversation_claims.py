@@ -0,0 +1,210 @@
+"""
+Concurrency check and timings for the conversation guards (claim_flag / claim_cooldown).
+
+tests/test_conversation_claims.py asserts the exactly-once guarantees below
+on every test run; this script races them at scale and times them.
+
+Many workers race to send the offer (and the greeting) to the same senders.
+Each sender must be won exactly once; the script exits 1 if any sender got
+two offers. For comparison the old read-then-write guard is raced the same
+way and its double sends are reported.
+
+The same run delivers every message MID to all workers, as webhook retries
+spread over gunicorn workers do. Through the shared Redis MID set
+(RedisExpiringSet) each MID must be accepted by exactly one worker, or the
+script exits 1; per-worker ExpiringSets, which accept it once per worker,
+are shown for comparison.
+
+  memory   threads sharing one in-memory ConversationStore
+  redis    processes x threads, each process with its own client, against
+           --redis-url / REDIS_URL (threads only with fakeredis, which cannot
+           be shared between processes)
+
+Usage:
+    python -m benchmarks.bench_conversation_claims [--senders 2000] [--threads 8]
+    python -m benchmarks.bench_conversation_claims --redis-url redis://localhost:6379/15 --processes 4
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from conversation_state import ConversationStore, RedisConversationStore
+from dedup import ExpiringSet, RedisExpiringSet
+
+from .bench_conversation_state import sender_ids
+
+PREFIX = "bench:claims:"
+COOLDOWN_SEC = 3600
+
+
+def naive_guard(store: ConversationStore, sid: str) -> bool:
+    """The pre-claim guard: check the flag, then set it."""
+    state = store.get(sid)
+    if state.offer_sent:
+        return False
+    time.sleep(0)  # let another thread in between the read and the write, as a slow request would
+    state.offer_sent = True
+    return True
+
+
+def race(store, ids: list[str], threads: int, seed: int = 0) -> tuple[Counter, Counter]:
+    """Threads claim offer + greeting for every sender in their own order; wins per sender."""
+    def worker(n: int) -> tuple[list[str], list[str]]:
+        order = ids[:]
+        random.Random(seed * 1000 + n).shuffle(order)
+        offers, greetings = [], []
+        for sid in order:
+            if store.claim(sid, "offer_sent"):
+                offers.append(sid)
+            if store.claim_cooldown(sid, "greeting_sent_at", COOLDOWN_SEC):
+                greetings.append(sid)
+        return offers, greetings
+
+    offers, greetings = Counter(), Counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for won_offers, won_greetings in pool.map(worker, range(threads)):
+            offers.update(won_offers)
+            greetings.update(won_greetings)
+    return offers, greetings
+
+
+def race_mids(make_filter, mids: list[str], workers: int) -> Counter:
+    """Each worker thread gets every MID through its own make_filter(); MIDs accepted as new, counted."""
+    def worker(n: int) -> list[str]:
+        seen = make_filter()
+        order = mids[:]
+        random.Random(n).shuffle(order)
+        return [mid for mid in order if not seen.check_and_add(mid)]
+
+    accepted = Counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for won in pool.map(worker, range(workers)):
+            accepted.update(won)
+    return accepted
+
+
+def report_mids(name: str, mids: list[str], accepted: Counter, elapsed: float) -> bool:
+    doubled = sum(1 for mid in mids if accepted[mid] > 1)
+    missing = sum(1 for mid in mids if accepted[mid] == 0)
+    print(f"  {name:<28} MIDs:   {doubled:>5} double, {missing} missing  ({elapsed:.2f}s)")
+    return doubled == 0 and missing == 0
+
+
+def race_naive(ids: list[str], threads: int) -> Counter:
+    store = ConversationStore()
+
+    def worker(n: int) -> list[str]:
+        order = ids[:]
+        random.Random(n).shuffle(order)
+        return [sid for sid in order if naive_guard(store, sid)]
+
+    wins = Counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for won in pool.map(worker, range(threads)):
+            wins.update(won)
+    return wins
+
+
+def _redis_store(url: str) -> RedisConversationStore:
+    import redis
+    return RedisConversationStore(redis.from_url(url, decode_responses=True), prefix=PREFIX)
+
+
+def _redis_process(url: str, ids: list[str], threads: int, seed: int) -> tuple[Counter, Counter]:
+    return race(_redis_store(url), ids, threads, seed)
+
+
+def report(name: str, ids: list[str], offers: Counter, greetings: Counter | None, elapsed: float) -> bool:
+    doubled = sum(1 for sid in ids if offers[sid] > 1)
+    missing = sum(1 for sid in ids if offers[sid] == 0)
+    line = f"  {name:<28} offers: {doubled:>5} double, {missing} missing"
+    ok = doubled == 0 and missing == 0
+    if greetings is not None:
+        g_doubled = sum(1 for sid in ids if greetings[sid] > 1)
+        line += f"; greetings: {g_doubled} double"
+        ok = ok and g_doubled == 0 and all(greetings[sid] == 1 for sid in ids)
+    print(f"{line}  ({elapsed:.2f}s)")
+    return ok
+
+
+def cleanup(client) -> None:
+    keys = list(client.scan_iter(match=PREFIX + "*", count=1000))
+    for i in range(0, len(keys), 1000):
+        client.delete(*keys[i:i + 1000])
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Conversation guard concurrency check")
+    ap.add_argument("--senders", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--processes", type=int, default=4, help="Redis only")
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    args = ap.parse_args(argv)
+
+    ids = sender_ids(args.senders)
+    mids = [f"mid.{sid}" for sid in ids]
+    print(f"{args.senders:,} senders, {args.threads} threads racing for each")
+    ok = True
+
+    start = time.perf_counter()
+    naive = race_naive(ids, args.threads)
+    # Expected to double-send: shown for comparison, does not fail the run
+    report("memory, read-then-write", ids, naive, None, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    accepted = race_mids(lambda: ExpiringSet(COOLDOWN_SEC), mids, args.threads)
+    # One set per worker process: every worker accepts every MID, also for comparison only
+    report_mids("MIDs, ExpiringSet per worker", mids, accepted, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    offers, greetings = race(ConversationStore(), ids, args.threads)
+    ok &= report("memory, claim", ids, offers, greetings, time.perf_counter() - start)
+
+    if args.redis_url:
+        client = _redis_store(args.redis_url).redis
+        cleanup(client)
+        start = time.perf_counter()
+        offers, greetings = Counter(), Counter()
+        with ProcessPoolExecutor(args.processes) as pool:
+            futures = [pool.submit(_redis_process, args.redis_url, ids, args.threads, n)
+                       for n in range(args.processes)]
+            for future in futures:
+                won_offers, won_greetings = future.result()
+                offers.update(won_offers)
+                greetings.update(won_greetings)
+        ok &= report(f"redis, {args.processes} procs x {args.threads} thr", ids, offers, greetings,
+                     time.perf_counter() - start)
+        start = time.perf_counter()
+        accepted = race_mids(lambda: RedisExpiringSet(_redis_store(args.redis_url).redis, COOLDOWN_SEC,
+                                                      prefix=PREFIX + "mid:"),
+                             mids, args.threads)
+        ok &= report_mids("MIDs, redis shared set", mids, accepted, time.perf_counter() - start)
+        cleanup(client)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("  redis: skipped (pass --redis-url or install fakeredis)")
+        else:
+            server = fakeredis.FakeServer()
+            store = RedisConversationStore(fakeredis.FakeRedis(server=server, decode_responses=True), prefix=PREFIX)
+            start = time.perf_counter()
+            offers, greetings = race(store, ids, args.threads)
+            ok &= report("fakeredis, claim", ids, offers, greetings, time.perf_counter() - start)
+            start = time.perf_counter()
+            # A client per worker on one server, as separate processes would have
+            accepted = race_mids(lambda: RedisExpiringSet(fakeredis.FakeRedis(server=server, decode_responses=True),
+                                                          COOLDOWN_SEC, prefix=PREFIX + "mid:"),
+                                 mids, args.threads)
+            ok &= report_mids("MIDs, fakeredis shared set", mids, accepted, time.perf_counter() - start)
+
+    print("OK: every sender and MID won exactly once" if ok
+          else "FAIL: a guard or the MID set let something through twice")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+"""
+Conversation state in Redis: pipelined load/flush vs one command per flag.
+
+Seeds N senders, then times what one DM costs against the store:
+
+  pipelined   prefetch (one pipelined HGETALL), flag checks on the loaded
+              state, one flag set, flush (one pipelined HSET + EXPIRE)
+  per_field   one HGET per former webhook.py dict plus an HSET, which is what
+              moving the old dicts to Redis one-to-one would cost
+  memory      the in-memory ConversationStore, for reference
+
+Needs a Redis server (--redis-url or REDIS_URL, e.g. redis://localhost:6379/15)
+or the fakeredis package; a fake only shows command overhead, not network
+round trips. Keys are written under "bench:conv:" and deleted afterwards.
+
+Usage:
+    python -m benchmarks.bench_conversation_redis [--redis-url URL] [--senders 10000] [--json PATH]
+"""
+import argparse
+import os
+import random
+
+from conversation_state import (
+    FLAG_NAMES, STORED_FIELDS, ConversationStore, RedisConversationStore,
+)
+
+from ._harness import measure, print_table, save_results
+from .bench_conversation_state import DICT_NAMES, populate_states, sender_ids
+
+PREFIX = "bench:conv:"
+
+
+def connect(url: str | None):
+    """Redis client for url, or a fakeredis client; None if neither is available."""
+    if url:
+        import redis
+        client = redis.from_url(url, decode_responses=True)
+        client.ping()
+        return client, "redis"
+    try:
+        import fakeredis
+    except ImportError:
+        return None, None
+    return fakeredis.FakeRedis(decode_responses=True), "fakeredis"
+
+
+def seed(client, states: dict) -> None:
+    pipe = client.pipeline(transaction=False)
+    for i, (sid, state) in enumerate(states.items(), 1):
+        pipe.hset(PREFIX + sid, mapping=state.to_hash())
+        if i % 1000 == 0:
+            pipe.execute()
+    pipe.execute()
+
+
+def cleanup(client) -> None:
+    keys = list(client.scan_iter(match=PREFIX + "*", count=1000))
+    for i in range(0, len(keys), 1000):
+        client.delete(*keys[i:i + 1000])
+
+
+class _CountingClient:
+    """Wraps a client to count round trips (commands and pipeline executes)."""
+
+    def __init__(self, client):
+        self._client = client
+        self.round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self._client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted():
+            self.round_trips += 1
+            return execute()
+
+        pipe.execute = counted
+        return pipe
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.round_trips += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Redis conversation state latency benchmark")
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    ap.add_argument("--senders", type=int, default=10_000)
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+
+    client, target = connect(args.redis_url)
+    if client is None:
+        print("No Redis available: pass --redis-url (or set REDIS_URL) or install fakeredis")
+        return 2
+
+    ids = sender_ids(args.senders)
+    states = populate_states(ids, random.Random(1))
+    cleanup(client)
+    seed(client, states)
+    print(f"{args.senders:,} senders seeded in {target}\n")
+
+    counting = _CountingClient(client)
+    redis_store = RedisConversationStore(counting, prefix=PREFIX)
+    memory_store = ConversationStore()
+    for sid, state in states.items():
+        memory_store._states[sid] = state
+    probe = ids[:: max(1, args.senders // 1000)]
+
+    def dm(store, sid):
+        store.prefetch((sid,))
+        state = store.get(sid)
+        for name in FLAG_NAMES:
+            getattr(state, name)
+        state.followup_replied = True
+        store.flush()
+
+    def dm_per_field(sid):
+        key = PREFIX + "dicts:" + sid  # own keys, so the pipelined case never sees these fields
+        for name in DICT_NAMES:
+            counting.hget(key, name)
+        counting.hset(key, "followup_replied", "1")
+
+    results = {}
+    trips = {}
+    for name, fn in (
+        ("dm[pipelined]", lambda sid: dm(redis_store, sid)),
+        ("dm[per_field]", dm_per_field),
+        ("dm[memory]", lambda sid: dm(memory_store, sid)),
+    ):
+        counting.round_trips = 0
+        results[name] = measure(fn, probe, min_time=args.min_time)
+        calls = results[name]["calls"] + len(probe)  # measure() warms up once per input
+        trips[name] = round(counting.round_trips / calls, 2)
+    print_table(results)
+    print("\nRound trips per DM: " + ", ".join(f"{name} {n:g}" for name, n in trips.items()))
+    print(f"Stored fields per sender: {len(STORED_FIELDS)} (flags share one)")
+
+    cleanup(client)
+    if args.json:
+        save_results(args.json, "conversation_redis", results,
+                     extra={"senders": args.senders, "target": target,
+                            "round_trips_per_dm": trips})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+"""
+Per-sender webhook state: parallel dicts vs one ConversationState per sender.
+
+Fills both layouts for N senders with a typical mix of flags (greeting, offer,
+gallery, delivery, location choice...) and reports bytes per sender, plus the
+cost of the flag checks one DM goes through.
+
+The churn run feeds a ConversationStore months of simulated traffic from new
+senders and samples its size, to show memory stays flat under the TTL and cap.
+
+Usage:
+    python -m benchmarks.bench_conversation_state [--senders 100000] [--json PATH]
+    python -m benchmarks.bench_conversation_state --days 90 --per-day 20000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from conversation_state import FLAG_NAMES, ConversationState, ConversationStore
+
+from ._harness import format_bytes, measure, print_table, save_results
+
+# Former webhook.py dicts, in the order the handler touches them
+DICT_NAMES = [
+    "GREETING_SENT", "OFFER_SENT", "NEON_SIGN_SENT", "GALLERY_SENT", "NEON_GALLERY_SENT",
+    "ETA_REPLIED", "DELIVERY_REPLIED", "DELIVERY_FORM_REPLIED", "LOCATION_DELIVERY_REPLIED",
+    "USER_LOCATION_CHOICE", "USER_SPECIFIC_LOCATION", "USER_DELIVERY_METHOD",
+    "FOLLOWUP_REPLIED", "THANK_YOU_REPLIED", "GOODBYE_REPLIED",
+    "PAYMENT_GENERAL_REPLIED", "ADVANCE_AMOUNT_REPLIED", "ADVANCE_METHOD_REPLIED",
+]
+
+
+def sender_ids(n: int) -> list[str]:
+    # Instagram-scoped IDs are 16-17 digit strings
+    return [str(17841400000000000 + i) for i in range(n)]
+
+
+def populate_dicts(ids: list[str], rng: random.Random, long: bool = False) -> dict:
+    dicts = {name: {} for name in DICT_NAMES}
+    for sid in ids:
+        dicts["GREETING_SENT"][sid] = time.time()
+        if long:
+            # Long conversation: every one-shot reply has gone out
+            for name in DICT_NAMES[1:]:
+                dicts[name][sid] = True
+            dicts["THANK_YOU_REPLIED"][sid] = time.time()
+            for name in ("LOCATION_DELIVERY_REPLIED", "USER_LOCATION_CHOICE"):
+                dicts[name][sid] = "OTHER_MD"
+            dicts["USER_DELIVERY_METHOD"][sid] = "posta"
+            continue
+        if rng.random() < 0.6:
+            dicts["OFFER_SENT"][sid] = True
+            dicts["GALLERY_SENT"][sid] = True
+        if rng.random() < 0.4:
+            dicts["DELIVERY_REPLIED"][sid] = True
+            dicts["LOCATION_DELIVERY_REPLIED"][sid] = "OTHER_MD"
+            dicts["USER_LOCATION_CHOICE"][sid] = "OTHER_MD"
+        if rng.random() < 0.3:
+            dicts["ETA_REPLIED"][sid] = True
+        if rng.random() < 0.3:
+            dicts["THANK_YOU_REPLIED"][sid] = time.time()
+        if rng.random() < 0.2:
+            dicts["PAYMENT_GENERAL_REPLIED"][sid] = True
+    return dicts
+
+
+def populate_states(ids: list[str], rng: random.Random, long: bool = False) -> dict:
+    states = {}
+    for sid in ids:
+        state = states[sid] = ConversationState(greeting_sent_at=time.time())
+        if long:
+            for name in FLAG_NAMES:
+                setattr(state, name, True)
+            state.thank_you_at = time.time()
+            state.location_delivery = state.location_choice = "OTHER_MD"
+            state.delivery_method = "posta"
+            continue
+        if rng.random() < 0.6:
+            state.offer_sent = state.gallery_sent = True
+        if rng.random() < 0.4:
+            state.delivery_replied = True
+            state.location_delivery = state.location_choice = "OTHER_MD"
+        if rng.random() < 0.3:
+            state.eta_replied = True
+        if rng.random() < 0.3:
+            state.thank_you_at = time.time()
+        if rng.random() < 0.2:
+            state.payment_general_replied = True
+    return states
+
+
+def bytes_per_sender(build, ids: list[str], long: bool = False) -> tuple[object, float]:
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    built = build(ids, random.Random(1), long)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, (current - base) / len(ids)
+
+
+def churn(days: int, per_day: int, ttl_sec: int, max_entries: int) -> dict:
+    """Simulated uptime: per_day new senders a day, 30% of them writing again later."""
+    store = ConversationStore(ttl_sec=ttl_sec, max_entries=max_entries)
+    rng = random.Random(7)
+    recent: list[str] = []  # ring buffer of senders who may write again
+    sizes = []
+    start = time.perf_counter()
+    for day in range(days):
+        base = day * 86400.0
+        for i in range(per_day):
+            now = base + i * 86400.0 / per_day
+            if recent and rng.random() < 0.3:
+                sid = rng.choice(recent)
+            else:
+                n = day * per_day + i
+                sid = str(17841400000000000 + n)
+                if len(recent) < 5000:
+                    recent.append(sid)
+                else:
+                    recent[n % 5000] = sid
+            store.get(sid, now)
+        sizes.append(len(store))
+    elapsed = time.perf_counter() - start
+    ops = days * per_day
+    stats = store.stats()
+    stats.update({
+        "ops": ops,
+        "ns_per_dm": round(elapsed * 1e9 / ops, 1),
+        "size_first_week": max(sizes[:7]),
+        "size_last_week": max(sizes[-7:]),
+    })
+    return stats
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Conversation state memory benchmark")
+    ap.add_argument("--senders", type=int, default=100_000)
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--days", type=int, default=90, help="Churn simulation length")
+    ap.add_argument("--per-day", type=int, default=20_000, help="Churn DMs per simulated day")
+    ap.add_argument("--ttl", type=int, default=7 * 86400)
+    ap.add_argument("--max-entries", type=int, default=100_000)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+
+    # Fresh ID strings for each layout so neither gets the other's keys for free
+    memory = {}
+    print(f"{args.senders:,} senders (sender ID strings not counted)")
+    for profile, long in (("typical", False), ("long", True)):
+        _, dict_bytes = bytes_per_sender(populate_dicts, sender_ids(args.senders), long)
+        _, state_bytes = bytes_per_sender(populate_states, sender_ids(args.senders), long)
+        memory[profile] = {"dicts": round(dict_bytes, 1), "state": round(state_bytes, 1)}
+        print(f"  {profile:>7}: parallel dicts {format_bytes(dict_bytes)}/sender "
+              f"({format_bytes(dict_bytes * args.senders)}), "
+              f"ConversationState {format_bytes(state_bytes)}/sender "
+              f"({format_bytes(state_bytes * args.senders)})")
+    print()
+
+    dicts = populate_dicts(sender_ids(args.senders), random.Random(1))
+    states = populate_states(sender_ids(args.senders), random.Random(1))
+    probe = sender_ids(args.senders)[:: max(1, args.senders // 1000)]
+
+    FIELDS = ConversationState.__slots__ + FLAG_NAMES
+
+    def dm_dicts(sid):
+        # Flag checks a plain DM goes through in webhook()
+        for name in DICT_NAMES:
+            dicts[name].get(sid)
+
+    def dm_state(sid):
+        state = states.get(sid)
+        for field in FIELDS:
+            getattr(state, field)
+
+    results = {
+        "dm_flag_checks[dicts]": measure(dm_dicts, probe, min_time=args.min_time),
+        "dm_flag_checks[state]": measure(dm_state, probe, min_time=args.min_time),
+    }
+    print_table(results)
+
+    churn_stats = churn(args.days, args.per_day, args.ttl, args.max_entries)
+    print(f"\nChurn: {args.days} days x {args.per_day:,} DMs/day, ttl={args.ttl}s, max={args.max_entries:,}")
+    print(f"  size: {churn_stats['size_first_week']:,} (first week) -> {churn_stats['size_last_week']:,} (last week)")
+    print(f"  evicted: {churn_stats['evicted_idle']:,} idle, {churn_stats['evicted_full']:,} over cap")
+    print(f"  {churn_stats['ns_per_dm']:.0f} ns per simulated DM (driver loop included)")
+
+    if args.json:
+        save_results(args.json, "conversation_state", results,
+                     extra={"senders": args.senders, "bytes_per_sender": memory, "churn": churn_stats})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+"""
+MID / comment dedup: dict with a full sweep per event vs ExpiringSet.
+
+Streams --per-window events per TTL window (10% of them Meta redeliveries
+of a recent ID) for a few windows and reports the cost per
+event. The old dict sweeps every stored ID on each event, so it is only run
+for --dict-events events once the window is full; its per-event cost grows
+with the window size, ExpiringSet's does not.
+
+Usage:
+    python -m benchmarks.bench_dedup [--per-window 100000] [--windows 3] [--json PATH]
+"""
+import argparse
+import random
+import time
+
+from dedup import ExpiringSet
+
+from ._harness import save_results
+
+TTL_SEC = 300.0
+
+
+def dict_is_duplicate(seen: dict, mid: str, now: float) -> bool:
+    """The former _is_duplicate_mid."""
+    last = seen.get(mid, 0.0)
+    if now - last < TTL_SEC:
+        return True
+    seen[mid] = now
+    for k, ts in list(seen.items()):
+        if now - ts > TTL_SEC:
+            seen.pop(k, None)
+    return False
+
+
+def event_stream(per_window: int, windows: int, seed: int = 3):
+    """(mid, now) pairs: per_window events per TTL, 10% of them redeliveries."""
+    rng = random.Random(seed)
+    step = TTL_SEC / per_window
+    recent: list[str] = []
+    for n in range(per_window * windows):
+        now = n * step
+        if recent and rng.random() < 0.1:
+            yield rng.choice(recent), now
+            continue
+        mid = f"aWdfZAG1faWdfZAG1fa{n:012d}"
+        if len(recent) < 1000:
+            recent.append(mid)
+        else:
+            recent[n % 1000] = mid
+        yield mid, now
+
+
+def run(check, events) -> tuple[float, int]:
+    duplicates = 0
+    start = time.perf_counter()
+    for mid, now in events:
+        duplicates += check(mid, now)
+    return time.perf_counter() - start, duplicates
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Expiring dedup set benchmark")
+    ap.add_argument("--per-window", type=int, default=100_000, help="Events per TTL window")
+    ap.add_argument("--windows", type=int, default=3)
+    ap.add_argument("--dict-events", type=int, default=300, help="Events timed for the sweeping dict")
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+
+    events = list(event_stream(args.per_window, args.windows))
+    print(f"{len(events):,} events, {args.per_window:,} per {TTL_SEC:.0f}s window")
+
+    expiring = ExpiringSet(TTL_SEC)
+    peak = 0
+
+    def check_set(mid, now):
+        nonlocal peak
+        dup = expiring.check_and_add(mid, now)
+        peak = max(peak, len(expiring))
+        return dup
+
+    set_elapsed, set_dups = run(check_set, events)
+    set_ns = set_elapsed * 1e9 / len(events)
+    print(f"  ExpiringSet:  {set_ns:>12,.0f} ns/event  ({set_dups:,} duplicates, peak size {peak:,})")
+
+    # Fill the dict with one window of IDs, then time events against the full window
+    seen: dict = {}
+    for mid, now in events[:args.per_window]:
+        seen[mid] = now
+    tail = events[args.per_window:args.per_window + args.dict_events]
+    dict_elapsed, _ = run(lambda mid, now: dict_is_duplicate(seen, mid, now), tail)
+    dict_ns = dict_elapsed * 1e9 / len(tail)
+    print(f"  dict + sweep: {dict_ns:>12,.0f} ns/event  (over {len(tail)} events with a full window)")
+    print(f"  one window of events: ExpiringSet {set_ns * args.per_window / 1e9:.2f}s, "
+          f"dict ~{dict_ns * args.per_window / 1e9:,.0f}s")
+
+    if args.json:
+        results = {
+            "expiring_set": {"ns_per_event": round(set_ns, 1), "duplicates": set_dups, "peak_size": peak},
+            "dict_sweep": {"ns_per_event": round(dict_ns, 1), "events": len(tail)},
+        }
+        save_results(args.json, "dedup", results,
+                     extra={"per_window": args.per_window, "windows": args.windows})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
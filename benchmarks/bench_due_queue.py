@@ -0,0 +1,128 @@
+"""
+Check and timing for the Redis due queue of pending capture leads.
+
+Leads are saved into one Redis, then several workers claim the due ones at
+the same time, the way every gunicorn worker's finalizer does. Each lead
+must be claimed exactly once; the script exits 1 otherwise. It also times
+one claim batch and the next_due() peek a worker makes between batches,
+with the queue holding --leads entries.
+
+  redis      processes, each with its own client, against --redis-url /
+             REDIS_URL
+  fakeredis  threads with one RedisStore each (no --redis-url)
+
+Usage:
+    python -m benchmarks.bench_due_queue [--leads 20000] [--workers 4]
+    python -m benchmarks.bench_due_queue --redis-url redis://localhost:6379/15
+"""
+import argparse
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import DUE_QUEUE_KEY, AggregationRecord, RedisStore
+
+from ._harness import measure, print_table
+
+PREFIX = "customer_capture:bench-due-"
+BATCH = 100
+
+
+def fill(store: RedisStore, n: int) -> list[str]:
+    """Save n leads with name + phone and make them all due now."""
+    parsed = [parse_customer_message("Ion Popescu"), parse_customer_message("069123456")]
+    ids = [f"bench-due-{i:06d}" for i in range(n)]
+    for uid in ids:
+        record = AggregationRecord(uid)
+        for p in parsed:
+            record.merge(p)
+        store.set(uid, record)
+    store.redis.zadd(DUE_QUEUE_KEY, {uid: 0 for uid in ids})
+    return ids
+
+
+def claim_all(store: RedisStore) -> list[str]:
+    claimed = []
+    while True:
+        ids = store.claim_due(limit=BATCH)
+        claimed.extend(ids)
+        if len(ids) < BATCH:
+            return claimed
+
+
+def _redis_process(url: str) -> list[str]:
+    import redis
+    return claim_all(RedisStore(redis.from_url(url)))
+
+
+def cleanup(client) -> None:
+    client.delete(DUE_QUEUE_KEY)
+    keys = list(client.scan_iter(match=PREFIX + "*", count=1000))
+    for i in range(0, len(keys), 1000):
+        client.delete(*keys[i:i + 1000])
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Redis due queue check")
+    ap.add_argument("--leads", type=int, default=20_000)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    if args.redis_url:
+        import redis
+        client = redis.from_url(args.redis_url)
+        backend = "redis"
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print("skipped: pass --redis-url or install fakeredis")
+            return 0
+        client = fakeredis.FakeRedis()
+        backend = "fakeredis"
+
+    cleanup(client)
+    store = RedisStore(client)
+    ids = fill(store, args.leads)
+    print(f"{args.leads:,} due leads, {args.workers} workers ({backend})")
+
+    start = time.perf_counter()
+    if args.redis_url:
+        with ProcessPoolExecutor(args.workers) as pool:
+            batches = [pool.submit(_redis_process, args.redis_url) for _ in range(args.workers)]
+            per_worker = [future.result() for future in batches]
+    else:
+        workers = [RedisStore(client) for _ in range(args.workers)]
+        with ThreadPoolExecutor(args.workers) as pool:
+            per_worker = list(pool.map(claim_all, workers))
+    elapsed = time.perf_counter() - start
+    claims = Counter(uid for claimed in per_worker for uid in claimed)
+    twice = sum(1 for count in claims.values() if count > 1)
+    missed = len(set(ids) - set(claims))
+    print(f"  claimed {sum(claims.values()):,} in {elapsed:.2f}s "
+          f"({', '.join(str(len(c)) for c in per_worker)} per worker): "
+          f"{twice} claimed twice, {missed} never claimed")
+
+    # Timings with the queue full again: leases make each claim take fresh leads
+    store.redis.zadd(DUE_QUEUE_KEY, {uid: 0 for uid in ids})
+    results = {
+        # One warm-up call plus max_calls: every timed claim still finds a full batch
+        f"claim_due({BATCH})": measure(lambda _: store.claim_due(limit=BATCH), [None],
+                                       max_calls=args.leads // BATCH - 1),
+        "next_due()": measure(lambda _: store.next_due(), [None]),
+    }
+    print_table(results)
+    cleanup(client)
+
+    ok = twice == 0 and missed == 0
+    print("OK: every lead claimed exactly once" if ok else "FAIL: due queue lost or duplicated leads")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
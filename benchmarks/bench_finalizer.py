@@ -0,0 +1,118 @@
+"""
+Idle lead export: background Finalizer (deadline heap) vs scanning every record.
+
+Builds --pending AggregationRecords with name + phone, last touched at
+moments spread over one cooldown window, and advances a simulated clock one
+--tick at a time over two windows. Per tick it reports what finding the due records costs:
+
+  heap   Finalizer.run_due(): pops only the entries whose deadline passed
+  scan   should_finalize() on every pending record, as a periodic sweep would
+
+plus how late each record was exported relative to its next_finalize_at()
+(the heap runs at the deadline in production; here the tick bounds it).
+
+Usage:
+    python -m benchmarks.bench_finalizer [--pending 50000] [--tick 1.0] [--json PATH]
+"""
+import argparse
+import logging
+import random
+import time
+from unittest import mock
+
+from customer_capture.settings import settings
+from customer_capture.finalizer import Finalizer
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import AggregationRecord
+
+from ._harness import save_results
+
+LEAD = "Ion Popescu\n069123456"
+
+
+def build_records(n: int, now: float, seed: int = 5) -> dict[str, AggregationRecord]:
+    rng = random.Random(seed)
+    parsed = parse_customer_message(LEAD)
+    records = {}
+    for i in range(n):
+        record = AggregationRecord(f"bench-{i:06d}")
+        record.merge(parsed)
+        touched = now + rng.uniform(0, settings.COOLDOWN_SECONDS)
+        record.last_update = record.last_field_update = touched
+        records[record.platform_user_id] = record
+    return records
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Background finalizer benchmark")
+    ap.add_argument("--pending", type=int, default=50_000)
+    ap.add_argument("--tick", type=float, default=1.0, help="Simulated seconds between checks")
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    # Simulated clock a day ahead, so the real finalizer thread sleeps through the run
+    start = time.time() + 86_400
+    records = build_records(args.pending, start)
+    ticks = int(2 * settings.COOLDOWN_SECONDS / args.tick) + 1
+
+    # heap: every record scheduled once, then each tick runs only what is due
+    exported, late = set(), []
+    now = start
+
+    def on_due(user_id):
+        record = records[user_id]
+        late.append(now - record.next_finalize_at())
+        exported.add(user_id)
+        return None
+
+    finalizer = Finalizer(on_due)
+    t0 = time.perf_counter()
+    for uid, record in records.items():
+        finalizer.schedule(uid, record.next_finalize_at())
+    schedule_ns = (time.perf_counter() - t0) * 1e9 / len(records)
+
+    heap_ns = []
+    for n in range(ticks):
+        now = start + n * args.tick
+        t0 = time.perf_counter_ns()
+        finalizer.run_due(now)
+        heap_ns.append(time.perf_counter_ns() - t0)
+    finalizer.stop()
+
+    # scan: should_finalize() on every remaining record each tick
+    pending = dict(records)
+    scan_ns, scan_exported = [], 0
+    # A plain function as the clock: a Mock call per record would dominate the scan
+    with mock.patch("customer_capture.state.time.time", lambda: now):
+        for n in range(ticks):
+            now = start + n * args.tick
+            t0 = time.perf_counter_ns()
+            due = [uid for uid, record in pending.items() if record.should_finalize()]
+            for uid in due:
+                del pending[uid]
+            scan_ns.append(time.perf_counter_ns() - t0)
+            scan_exported += len(due)
+
+    heap_tick = sum(heap_ns) / ticks
+    scan_tick = sum(scan_ns) / ticks
+    print(f"{args.pending:,} pending leads, {ticks} ticks of {args.tick:g}s\n")
+    print(f"  heap: {heap_tick / 1000:>10,.1f} µs/tick (max {max(heap_ns) / 1000:,.1f}), "
+          f"{schedule_ns:,.0f} ns/schedule, {len(exported):,} exported, "
+          f"max lateness {max(late):.2f}s")
+    print(f"  scan: {scan_tick / 1000:>10,.1f} µs/tick (max {max(scan_ns) / 1000:,.1f}), "
+          f"{scan_exported:,} exported")
+
+    if args.json:
+        results = {
+            "heap": {"us_per_tick": round(heap_tick / 1000, 1), "ns_per_schedule": round(schedule_ns, 1),
+                     "exported": len(exported), "max_late_sec": max(late)},
+            "scan": {"us_per_tick": round(scan_tick / 1000, 1), "exported": scan_exported},
+        }
+        save_results(args.json, "finalizer", results, extra={"pending": args.pending, "tick": args.tick})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
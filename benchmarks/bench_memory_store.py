@@ -0,0 +1,104 @@
+"""
+InMemoryStore stale cleanup: full scan on every DM vs last-update order.
+
+Fills the store with --pending records touched over the last two cooldowns
+(none stale yet, the steady state of a busy worker) and times one DM's
+store work, get -> merge -> set, with cleanup_stale() per DM as before:
+
+  scan     the previous InMemoryStore: a dict, cleanup lists every stale ID
+           by walking all records
+  ordered  records in last-update order, cleanup pops stale ones off the
+           front and stops at the first fresh one
+
+then, separately, one background tick of the ordered store expiring a
+cooldown's worth of records.
+
+Usage:
+    python -m benchmarks.bench_memory_store [--pending 50000] [--json PATH]
+"""
+import argparse
+import logging
+import time
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.settings import settings
+from customer_capture.state import AggregationRecord, InMemoryStore
+
+from ._harness import measure, print_table, save_results
+
+
+class ScanningStore(InMemoryStore):
+    """InMemoryStore as it was: cleanup scans every record."""
+
+    def __init__(self):
+        super().__init__()
+        self.store = {}
+
+    def set(self, user_id, record):
+        self.store[user_id] = record
+
+    def cleanup_stale(self):
+        max_age = settings.COOLDOWN_SECONDS * 2
+        now = time.time()
+        stale = [uid for uid, rec in self.store.items() if (now - rec.last_update) > max_age]
+        for uid in stale:
+            del self.store[uid]
+
+
+def fill(store: InMemoryStore, n: int, now: float, window: float) -> list[str]:
+    """n records, last_update spread evenly over [now - window, now), saved oldest first."""
+    ids = [f"bench-{i:06d}" for i in range(n)]
+    for i, uid in enumerate(ids):
+        record = AggregationRecord(uid)
+        record.last_update = now - window + window * i / n
+        store.set(uid, record)
+    return ids
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="In-memory capture store cleanup benchmark")
+    ap.add_argument("--pending", type=int, default=50_000)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    parsed = parse_customer_message("069123456")
+    max_age = settings.COOLDOWN_SECONDS * 2
+    results = {}
+    for name, store_cls in (("scan", ScanningStore), ("ordered", InMemoryStore)):
+        store = store_cls()
+        # Touched within the last 2 cooldowns minus a margin, so nothing expires mid-run
+        ids = fill(store, args.pending, time.time(), max_age - 60)
+
+        def dm(uid, store=store):
+            record = store.get(uid) or AggregationRecord(uid)
+            record.merge(parsed)
+            store.set(uid, record)
+            store.cleanup_stale()
+
+        # A spread of senders; measure() warms up over every input, so not all of them
+        senders = ids[::max(1, args.pending // 200)]
+        results[f"dm+cleanup[{name}]"] = measure(dm, senders, min_time=1.0)
+        assert len(store.store) == args.pending
+
+    print(f"{args.pending:,} pending records\n")
+    print_table(results)
+
+    # One background tick: half of the ordered store has gone stale
+    store = InMemoryStore()
+    fill(store, args.pending, time.time() - max_age / 2, max_age)
+    start = time.perf_counter()
+    store.cleanup_stale()
+    tick_ms = (time.perf_counter() - start) * 1000
+    expired = args.pending - len(store.store)
+    print(f"\ncleanup tick (ordered): {expired:,} of {args.pending:,} expired in {tick_ms:.2f} ms")
+    results["tick[ordered]"] = {"expired": expired, "ms": round(tick_ms, 2)}
+
+    if args.json:
+        save_results(args.json, "memory_store", results, extra={"pending": args.pending})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
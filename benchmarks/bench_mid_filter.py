@@ -0,0 +1,131 @@
+"""
+MID dedup at volume: exact ExpiringSet vs RotatingBloomFilter.
+
+Inserts --mids distinct MIDs inside one TTL window into both, reporting
+memory, time per check_and_add and, for the filter, the false-positive rate
+measured on --probes MIDs it has never seen (each one wrongly reported as a
+duplicate would be a dropped DM) next to the configured and estimated rates.
+
+With --redis-url / REDIS_URL (or fakeredis installed) the Redis-backed
+filter is timed too, on --redis-mids MIDs (fakeredis runs Lua far slower
+than a Redis server, so its timing is only an upper bound).
+
+Usage:
+    python -m benchmarks.bench_mid_filter [--mids 1000000] [--error-rate 0.0001] [--json PATH]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from dedup import ExpiringSet, RedisBloomFilter, RotatingBloomFilter
+
+from ._harness import format_bytes, save_results
+
+TTL_SEC = 300.0
+
+
+def mids(n: int, offset: int = 0) -> list[str]:
+    # Instagram MIDs are ~60 char base64 strings
+    return [f"aWdfZAG1faWdfZAG1faWdfZAG1faWdfZAG1fMTc4NDE0{offset + i:016d}" for i in range(n)]
+
+
+def fill(store, keys: list[str]) -> float:
+    """Insert keys within one window; returns ns per check_and_add."""
+    step = TTL_SEC / 2 / len(keys)  # all inside the first half of the window
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        store.check_and_add(key, 1000 * TTL_SEC + i * step)
+    return (time.perf_counter() - start) * 1e9 / len(keys)
+
+
+def allocated(build, keys: list[str]) -> int:
+    """Bytes a freshly built store holds after keys were inserted."""
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    store = build()
+    for key in keys:
+        store.check_and_add(key, 1000 * TTL_SEC)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current - base
+
+
+def false_positives(store, probes: list[str]) -> float:
+    # seen() does not insert, so the filter stays at its capacity while probing
+    now = 1000 * TTL_SEC + TTL_SEC * 0.75
+    return sum(store.seen(key, now) for key in probes) / len(probes)
+
+
+def redis_client(url: str | None):
+    if url:
+        import redis
+        client = redis.from_url(url, decode_responses=True)
+        client.ping()
+        return client, "redis"
+    try:
+        import fakeredis
+    except ImportError:
+        return None, None
+    return fakeredis.FakeRedis(decode_responses=True), "fakeredis"
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="MID dedup filter benchmark")
+    ap.add_argument("--mids", type=int, default=1_000_000)
+    ap.add_argument("--probes", type=int, default=200_000)
+    ap.add_argument("--error-rate", type=float, default=1e-4)
+    ap.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    ap.add_argument("--redis-mids", type=int, default=5_000)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+
+    keys = mids(args.mids)
+    probes = mids(args.probes, offset=args.mids)
+    print(f"{args.mids:,} MIDs in one {TTL_SEC:.0f}s window, {args.probes:,} unseen probes\n")
+
+    exact_ns = fill(ExpiringSet(TTL_SEC), keys)
+    exact_bytes = allocated(lambda: ExpiringSet(TTL_SEC), keys)
+    print(f"  ExpiringSet:         {exact_ns:>7,.0f} ns/op  {format_bytes(exact_bytes):>10}  exact")
+
+    bloom = RotatingBloomFilter(TTL_SEC, capacity=args.mids, error_rate=args.error_rate)
+    bloom_ns = fill(bloom, keys)
+    # Bit arrays are preallocated, so the footprint is known without tracing
+    bloom_bytes = sum(len(bits) for bits in bloom._filters.values())
+    estimated = bloom.estimated_error_rate()
+    measured = false_positives(bloom, probes)
+    print(f"  RotatingBloomFilter: {bloom_ns:>7,.0f} ns/op  {format_bytes(bloom_bytes):>10}  "
+          f"(all {bloom.generations} generations: {format_bytes(bloom.memory_bytes)}, k={bloom.hashes})")
+    print(f"    false positives: configured <= {args.error_rate:.2e}, estimated {estimated:.2e}, "
+          f"measured {measured:.2e}")
+
+    results = {
+        "expiring_set": {"ns_per_op": round(exact_ns, 1), "bytes": exact_bytes},
+        "bloom": {
+            "ns_per_op": round(bloom_ns, 1), "bytes": bloom_bytes, "budget_bytes": bloom.memory_bytes,
+            "hashes": bloom.hashes, "error_rate": args.error_rate,
+            "estimated_fp": estimated, "measured_fp": measured,
+        },
+    }
+
+    client, target = redis_client(args.redis_url)
+    if client is None:
+        print("\n  Redis filter: skipped (pass --redis-url or install fakeredis)")
+    else:
+        prefix = "bench:mid_bloom:"
+        shared = RedisBloomFilter(client, TTL_SEC, capacity=args.mids, error_rate=args.error_rate, prefix=prefix)
+        redis_ns = fill(shared, keys[:args.redis_mids])
+        print(f"\n  RedisBloomFilter ({target}): {redis_ns / 1000:,.1f} µs/op over {args.redis_mids:,} MIDs "
+              f"(one EVALSHA per MID)")
+        for key in client.scan_iter(match=prefix + "*"):
+            client.delete(key)
+        results["redis_bloom"] = {"ns_per_op": round(redis_ns, 1), "mids": args.redis_mids, "target": target}
+
+    if args.json:
+        save_results(args.json, "mid_filter", results, extra={"mids": args.mids, "probes": args.probes})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""
+Cost of building parse results: slotted dataclasses vs the former pydantic models.
+
+Reports construction time and bytes allocated per message, both for the bare
+models and for the full parse_customer_message path.
+
+Usage:
+    python -m benchmarks.bench_models [--json PATH]
+"""
+import argparse
+import logging
+import tracemalloc
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from customer_capture.models import AddressBlock, ParsedMessage
+from customer_capture.parser import parse_customer_message
+
+from ._harness import format_bytes, measure, print_table, save_results
+from .corpus import build_corpus
+
+
+# Previous pydantic definitions, kept here as the baseline
+class PydanticAddressBlock(BaseModel):
+    street_address: Optional[str] = None
+    location: Optional[str] = None
+    postal_code: Optional[str] = None
+
+
+class PydanticParsedMessage(BaseModel):
+    full_name: Optional[str] = None
+    contact_number: Optional[str] = None
+    address_block: PydanticAddressBlock = Field(default_factory=PydanticAddressBlock)
+    raw_message: str
+    confidence: float = Field(default=1.0, ge=0.0, le=1.0)
+
+
+FIELDS = {
+    "full_name": "Ion Popescu",
+    "contact_number": "+37369123456",
+    "street_address": "str. Lenin 14",
+    "location": "Chișinău",
+    "postal_code": "2001",
+}
+
+
+def build_slotted(text: str):
+    return ParsedMessage(
+        full_name=FIELDS["full_name"],
+        contact_number=FIELDS["contact_number"],
+        address_block=AddressBlock(
+            street_address=FIELDS["street_address"],
+            location=FIELDS["location"],
+            postal_code=FIELDS["postal_code"],
+        ),
+        raw_message=text,
+        confidence=0.9,
+    )
+
+
+def build_pydantic(text: str):
+    return PydanticParsedMessage(
+        full_name=FIELDS["full_name"],
+        contact_number=FIELDS["contact_number"],
+        address_block=PydanticAddressBlock(
+            street_address=FIELDS["street_address"],
+            location=FIELDS["location"],
+            postal_code=FIELDS["postal_code"],
+        ),
+        raw_message=text,
+        confidence=0.9,
+    )
+
+
+def build_slotted_empty(text: str):
+    # The common case: nothing extracted, discarded at confidence < 0.1
+    return ParsedMessage(raw_message=text, confidence=0.0)
+
+
+def build_pydantic_empty(text: str):
+    return PydanticParsedMessage(raw_message=text, confidence=0.0)
+
+
+def allocated_per_call(fn, inputs: list, rounds: int = 20) -> float:
+    """Bytes allocated per call while keeping every result alive (peak / calls)."""
+    keep = []
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    for _ in range(rounds):
+        for x in inputs:
+            keep.append(fn(x))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Subtract the list's own growth (one pointer per result)
+    return (current - base) / len(keep) - 8
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Parse-result model benchmark")
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    texts = build_corpus(500)
+    cases = {
+        "pydantic_full": build_pydantic,
+        "slotted_full": build_slotted,
+        "pydantic_empty": build_pydantic_empty,
+        "slotted_empty": build_slotted_empty,
+    }
+    results = {name: measure(fn, texts, min_time=args.min_time) for name, fn in cases.items()}
+    for name, fn in cases.items():
+        results[name]["bytes_per_call"] = round(allocated_per_call(fn, texts), 1)
+    results["parse_customer_message"] = measure(parse_customer_message, texts, min_time=args.min_time)
+
+    print_table(results)
+    print()
+    for kind in ("full", "empty"):
+        pyd, slot = results[f"pydantic_{kind}"], results[f"slotted_{kind}"]
+        saved_ns = pyd["mean_ns"] - slot["mean_ns"]
+        saved_bytes = pyd["bytes_per_call"] - slot["bytes_per_call"]
+        print(f"{kind:>5}: {saved_ns / 1000:.2f} µs and {format_bytes(saved_bytes)} saved per message "
+              f"({format_bytes(pyd['bytes_per_call'])} -> {format_bytes(slot['bytes_per_call'])})")
+
+    if args.json:
+        save_results(args.json, "models", results)
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
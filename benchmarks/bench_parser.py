@@ -0,0 +1,82 @@
+"""
+Per-extractor microbenchmarks for customer_capture.parser.
+
+Usage:
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser --json after.json --compare before.json
+    python -m benchmarks.bench_parser --only extract_name --min-time 2
+"""
+import argparse
+import functools
+import logging
+
+from customer_capture import parser as p
+from customer_capture.state import SETTLED_NAME
+from customer_capture.templates import register_templates
+
+from ._harness import load_results, measure, print_table, save_results
+from .corpus import LONG_PASTES, all_messages, build_corpus
+
+CASES = {
+    "extract_phone": p.extract_phone,
+    "extract_postal_code": p.extract_postal_code,
+    "extract_name": p.extract_name,
+    "extract_street_address": p.extract_street_address,
+    "extract_location": p.extract_location,
+    "is_likely_system_message": p.is_likely_system_message,
+    "parse_customer_message": p.parse_customer_message,
+}
+
+
+def run(min_time: float, only: list[str] | None = None) -> dict:
+    mixed = build_corpus()
+    distinct = all_messages()
+    results = {}
+    for name, fn in CASES.items():
+        if only and name not in only:
+            continue
+        results[f"{name}[mixed]"] = measure(fn, mixed, min_time=min_time)
+        results[f"{name}[distinct]"] = measure(fn, distinct, min_time=min_time)
+        results[f"{name}[long]"] = measure(fn, LONG_PASTES, min_time=min_time)
+    if not only or "parse_customer_message" in only:
+        # Follow-up messages once the pending record has name + phone settled
+        settled = functools.partial(p.parse_customer_message, settled_fields=SETTLED_NAME)
+        results["parse_customer_message[mixed,settled]"] = measure(settled, mixed, min_time=min_time)
+        # Cost of trace mode (per-step timings and rule notes)
+        traced = functools.partial(p.parse_customer_message, trace=True)
+        results["parse_customer_message[mixed,trace]"] = measure(traced, mixed, min_time=min_time)
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--min-time", type=float, default=0.5, help="Seconds per case (default 0.5)")
+    ap.add_argument("--only", action="append", choices=sorted(CASES), help="Run only this extractor (repeatable)")
+    ap.add_argument("--no-templates", action="store_true", help="Skip registering the bot templates (outbound_templates.py)")
+    ap.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    ap.add_argument("--compare", metavar="PATH", help="Previous JSON results to diff against")
+    args = ap.parse_args(argv)
+
+    # Debug logging inside extractors would dominate the timings
+    logging.disable(logging.CRITICAL)
+
+    if not args.no_templates:
+        # Production registers the bot templates at startup
+        try:
+            from outbound_templates import OUTBOUND_TEMPLATES
+        except ImportError as e:
+            print(f"(bot templates not registered: {e})")
+        else:
+            register_templates(OUTBOUND_TEMPLATES)
+
+    results = run(args.min_time, args.only)
+    baseline = load_results(args.compare) if args.compare else None
+    print_table(results, baseline)
+    if args.json:
+        save_results(args.json, "parser", results)
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
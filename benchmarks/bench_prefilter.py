@@ -0,0 +1,92 @@
+"""
+Prefilter accuracy and cost against the full parser.
+
+A message is a true lead when parse_customer_message scores it at or above the
+capture threshold (flask_hook drops anything below 0.1). Reports the prefilter's
+precision/recall on the corpus, then the cost of the prefilter alone, the parser
+alone, and the gated pipeline the webhook runs.
+
+Usage:
+    python -m benchmarks.bench_prefilter [--json PATH] [--compare PATH]
+"""
+import argparse
+import logging
+
+from customer_capture.parser import parse_customer_message
+from customer_capture.prefilter import has_candidate_data
+from customer_capture.templates import register_templates
+
+from ._harness import load_results, measure, print_table, save_results
+from .corpus import all_messages, build_corpus
+
+MIN_CONFIDENCE = 0.1
+
+
+def gated(text: str):
+    if has_candidate_data(text):
+        return parse_customer_message(text)
+    return None
+
+
+def confusion(texts: list[str]) -> dict:
+    counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    missed = []
+    for text in texts:
+        lead = parse_customer_message(text).confidence >= MIN_CONFIDENCE
+        passed = has_candidate_data(text)
+        key = ("t" if passed == lead else "f") + ("p" if passed else "n")
+        counts[key] += 1
+        if key == "fn" and text not in missed:
+            missed.append(text)
+    tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+    counts["precision"] = round(tp / (tp + fp), 4) if tp + fp else 1.0
+    counts["recall"] = round(tp / (tp + fn), 4) if tp + fn else 1.0
+    counts["rejected_share"] = round((counts["tn"] + fn) / len(texts), 4)
+    return counts, missed
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Prefilter precision/recall and cost")
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--no-templates", action="store_true", help="Skip registering the bot templates (outbound_templates.py)")
+    ap.add_argument("--json", metavar="PATH")
+    ap.add_argument("--compare", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    if not args.no_templates:
+        try:
+            from outbound_templates import OUTBOUND_TEMPLATES
+        except ImportError as e:
+            print(f"(bot templates not registered: {e})")
+        else:
+            register_templates(OUTBOUND_TEMPLATES)
+
+    mixed = build_corpus()
+    accuracy = {}
+    for label, texts in (("mixed", mixed), ("distinct", all_messages())):
+        counts, missed = confusion(texts)
+        accuracy[label] = counts
+        print(f"{label:>8}: precision={counts['precision']:.3f} recall={counts['recall']:.3f} "
+              f"rejected={counts['rejected_share']:.1%} "
+              f"(tp={counts['tp']} fp={counts['fp']} fn={counts['fn']} tn={counts['tn']})")
+        for text in missed:
+            print(f"          missed: {text[:60]!r}")
+    print()
+
+    results = {
+        "has_candidate_data[mixed]": measure(has_candidate_data, mixed, min_time=args.min_time),
+        "parse_customer_message[mixed]": measure(parse_customer_message, mixed, min_time=args.min_time),
+        "prefilter+parse[mixed]": measure(gated, mixed, min_time=args.min_time),
+    }
+    baseline = load_results(args.compare) if args.compare else None
+    print_table(results, baseline)
+
+    if args.json:
+        save_results(args.json, "prefilter", results, extra={"accuracy": accuracy})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
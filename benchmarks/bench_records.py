@@ -0,0 +1,137 @@
+"""
+Memory and merge cost of pending capture records (AggregationRecord).
+
+Builds --leads pending records from simulated conversations and reports the
+bytes each one holds (tracemalloc), for two shapes of traffic:
+
+  typical  a greeting, then name, phone, address and town over a few DMs
+  burst    customers who keep sending details and corrections (filled-in
+           templates included), enough to fill the raw message buffer
+
+Every lead gets its own copies of the message texts, as real DMs do, so the
+figures include the raw messages a record keeps. Then times merge() into a
+record whose raw buffer is full (with parsed fields, and with the raw
+message alone, which isolates the buffer), building a lead from scratch,
+and the to_dict / to_hash round trips the journal and Redis use.
+
+Usage:
+    python -m benchmarks.bench_records [--leads 20000] [--json PATH] [--compare PATH]
+"""
+import argparse
+import dataclasses
+import logging
+import random
+import tracemalloc
+
+from customer_capture.models import ParsedMessage
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import AggregationRecord
+
+from ._harness import format_bytes, load_results, measure, print_table, save_results
+from .corpus import CHATTER, LEAD_MESSAGES, LONG_PASTES
+
+TYPICAL = [
+    ["Bună ziua", "Ion Popescu", "069123456", "str. Mihai Viteazu 25, ap. 12", "Bălți, MD-3100"],
+    ["Maria Rusu 079013356", "Chișinău", "mun. Chișinău, str. Ismail 88"],
+    ["Здравствуйте", "Иван Петров\n060123456\nул. Пушкина 10, кв. 5", "Спасибо большое"],
+]
+
+
+def conversations(kind: str, n: int, seed: int = 3) -> list[list]:
+    """n conversations of parsed DMs; texts are shared here and copied per lead when built."""
+    rng = random.Random(seed)
+    cache: dict[str, object] = {}
+
+    def parsed(text: str):
+        if text not in cache:
+            cache[text] = parse_customer_message(text)
+        return cache[text]
+
+    result = []
+    for i in range(n):
+        if kind == "typical":
+            texts = TYPICAL[i % len(TYPICAL)]
+        else:
+            texts = rng.sample(LEAD_MESSAGES + LONG_PASTES, 14) + rng.sample(CHATTER, 2)
+        # The webhook drops DMs parsed below 0.1 confidence before they reach a record
+        result.append([p for p in map(parsed, texts) if p.confidence >= 0.1])
+    return result
+
+
+def build(convs: list[list]) -> list[AggregationRecord]:
+    records = []
+    for i, conv in enumerate(convs):
+        record = AggregationRecord(str(17841400000000000 + i))
+        for p in conv:
+            # A fresh string per DM, as if it came off the wire
+            text = p.raw_message
+            record.merge(dataclasses.replace(p, raw_message=text[:1] + text[1:]))
+        records.append(record)
+    return records
+
+
+def bytes_per_lead(convs: list[list]) -> tuple[list, float]:
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    records = build(convs)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, (current - base) / len(convs)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="AggregationRecord memory and merge benchmark")
+    ap.add_argument("--leads", type=int, default=20_000)
+    ap.add_argument("--min-time", type=float, default=0.5)
+    ap.add_argument("--json", metavar="PATH")
+    ap.add_argument("--compare", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    memory = {}
+    print(f"{args.leads:,} pending leads")
+    for kind in ("typical", "burst"):
+        convs = conversations(kind, args.leads)
+        records, per_lead = bytes_per_lead(convs)
+        raw = sum(len(r.raw_messages) for r in records) / len(records)
+        memory[kind] = round(per_lead, 1)
+        print(f"  {kind:<8} {format_bytes(per_lead):>10} per lead, {format_bytes(per_lead * args.leads):>10} total, "
+              f"{raw:.1f} raw messages kept")
+        del records
+
+    pool = [m for conv in conversations("burst", 50) for m in conv]
+    full = AggregationRecord("17841400000000000")
+    for p in pool:
+        full.merge(p)
+    # No fields, so merge() does little besides keeping the raw message: 12 texts cycle
+    # through a 10-message buffer, each one evicting or moving an older one
+    texts = [ParsedMessage(raw_message=f"{text} #{i}", confidence=0.9)
+             for i, text in enumerate(LEAD_MESSAGES[:12])]
+    raw_only = AggregationRecord("17841400000000000")
+    lead = conversations("typical", 1)[0]
+    sample = build(conversations("typical", 1))[0]
+    as_dict, as_hash = sample.to_dict(), sample.to_hash()
+    raw = list(sample.raw_messages)
+
+    results = {
+        "merge[full raw buffer]": measure(full.merge, pool, min_time=args.min_time),
+        "merge[raw message only]": measure(raw_only.merge, texts, min_time=args.min_time),
+        "new lead (typical DMs)": measure(lambda conv: build([conv]), [lead], min_time=args.min_time),
+        "to_dict": measure(lambda r: r.to_dict(), [sample], min_time=args.min_time),
+        "from_dict": measure(AggregationRecord.from_dict, [as_dict], min_time=args.min_time),
+        "to_hash": measure(lambda r: r.to_hash(), [sample], min_time=args.min_time),
+        "from_hash": measure(lambda h: AggregationRecord.from_hash("17841400000000000", h, raw),
+                             [as_hash], min_time=args.min_time),
+    }
+    print()
+    baseline = load_results(args.compare) if args.compare else None
+    print_table(results, baseline)
+
+    if args.json:
+        save_results(args.json, "records", results, extra={"leads": args.leads, "bytes_per_lead": memory})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
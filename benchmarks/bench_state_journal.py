@@ -0,0 +1,144 @@
+"""
+StateJournal: write overhead per mutation and recovery time on startup.
+
+Overhead: the same mutations with and without a journal attached, per store
+(MID check_and_add, conversation claim, lead set).
+
+Recovery: --mids MIDs, --senders conversation states and --leads pending
+leads are written, the process "crashes" (the journal is abandoned without
+a final snapshot) and fresh stores are restored from the directory, once
+from the journal alone and once from a compacted snapshot.
+
+Usage:
+    python -m benchmarks.bench_state_journal [--mids 100000] [--senders 50000] [--leads 5000] [--json PATH]
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from conversation_state import ConversationStore
+from customer_capture.parser import parse_customer_message
+from customer_capture.state import AggregationRecord, InMemoryStore
+from dedup import ExpiringSet
+from persistence import StateJournal
+
+from ._harness import format_bytes, save_results
+
+TTL_SEC = 300.0
+
+
+def stores() -> dict:
+    return {"mids": ExpiringSet(TTL_SEC), "conversations": ConversationStore(), "leads": InMemoryStore()}
+
+
+def open_journal(directory: str, attached: dict) -> tuple[StateJournal, dict]:
+    journal = StateJournal(directory, snapshot_interval=3600)
+    for name, store in attached.items():
+        journal.attach(name, store)
+    return journal, journal.open()
+
+
+def abandon(journal: StateJournal) -> None:
+    """Simulated crash: release the directory without the shutdown snapshot."""
+    journal._file.close()
+    journal._file = None
+    journal._compact_now.set()
+    journal._lock_file.close()
+    for store in journal.stores.values():
+        store.journal = None
+
+
+def workload(attached: dict, args, parsed) -> dict[str, float]:
+    """Run every mutation once; returns ns per mutation for each store."""
+    timings = {}
+    mids, conversations, leads = attached["mids"], attached["conversations"], attached["leads"]
+
+    start = time.perf_counter_ns()
+    for i in range(args.mids):
+        mids.check_and_add(f"aWdfZAG1faWdfZAG1faWdfZAG1faWdfZAG1fMTc4{i:016d}")
+    timings["mid"] = (time.perf_counter_ns() - start) / args.mids
+
+    start = time.perf_counter_ns()
+    for i in range(args.senders):
+        conversations.claim(f"17841400{i:010d}", "offer_sent")
+    timings["claim"] = (time.perf_counter_ns() - start) / args.senders
+
+    start = time.perf_counter_ns()
+    for i in range(args.leads):
+        uid = f"17841400{i:010d}"
+        record = leads.get(uid) or AggregationRecord(uid)
+        record.merge(parsed)
+        leads.set(uid, record)
+    timings["lead"] = (time.perf_counter_ns() - start) / args.leads
+    return timings
+
+
+def dir_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="State journal benchmark")
+    ap.add_argument("--mids", type=int, default=100_000)
+    ap.add_argument("--senders", type=int, default=50_000)
+    ap.add_argument("--leads", type=int, default=5_000)
+    ap.add_argument("--dir", help="Journal directory (default: a temp dir, removed afterwards)")
+    ap.add_argument("--json", metavar="PATH")
+    args = ap.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    parsed = parse_customer_message("Ion Popescu\n069123456\nstr. Mihai Viteazu 25, Bălți")
+    directory = args.dir or tempfile.mkdtemp(prefix="state_journal_")
+    results = {}
+    try:
+        plain = workload(stores(), args, parsed)
+
+        attached = stores()
+        journal, _ = open_journal(directory, attached)
+        journaled = workload(attached, args, parsed)
+        journal_size = dir_bytes(directory)
+        abandon(journal)
+
+        print(f"{args.mids:,} MIDs, {args.senders:,} conversations, {args.leads:,} leads\n")
+        print(f"{'mutation':<10} {'memory ns':>10} {'journaled ns':>13} {'overhead ns':>12}")
+        for name in plain:
+            overhead = journaled[name] - plain[name]
+            print(f"{name:<10} {plain[name]:>10,.0f} {journaled[name]:>13,.0f} {overhead:>12,.0f}")
+            results[f"write[{name}]"] = {"memory_ns": round(plain[name], 1), "journaled_ns": round(journaled[name], 1)}
+
+        # Recovery from the journal alone (crash before any snapshot)
+        recovered = stores()
+        journal, from_journal = open_journal(directory, recovered)
+        sizes = {"mids": len(recovered["mids"]), "conversations": len(recovered["conversations"]),
+                 "leads": len(recovered["leads"].store)}
+        snapshot_size = dir_bytes(directory)  # open() compacted what it replayed
+        abandon(journal)
+
+        # Recovery from that snapshot
+        recovered = stores()
+        journal, from_snapshot = open_journal(directory, recovered)
+        abandon(journal)
+
+        print(f"\nrecovered {sizes}")
+        print(f"  from journal:  {from_journal['ms']:>8.1f} ms  ({from_journal['journal_records']:,} records, "
+              f"{format_bytes(journal_size)})")
+        print(f"  from snapshot: {from_snapshot['ms']:>8.1f} ms  ({from_snapshot['snapshot_entries']:,} entries, "
+              f"{format_bytes(snapshot_size)})")
+        results["recover[journal]"] = {**from_journal, "bytes": journal_size}
+        results["recover[snapshot]"] = {**from_snapshot, "bytes": snapshot_size}
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.json:
+        save_results(args.json, "state_journal", results,
+                     extra={"mids": args.mids, "senders": args.senders, "leads": args.leads})
+        print(f"\nSaved {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Synthetic but realistic RO/RU DM corpus for parser benchmarks.
+
+Mix mirrors what the Instagram inbox sees: mostly short chatter without lead
+data, a share of delivery-form answers, and a few long pasted messages
+(bot templates echoed back with details filled in).
+"""
+import random
+
+CHATTER = [
+    "Bună",
+    "Bună ziua",
+    "Salut! 👋",
+    "Mulțumesc",
+    "Mersi frumos 💜",
+    "Cât costă?",
+    "Care e prețul la lampă?",
+    "Vreau o lampă cu poza noastră",
+    "Ok, mă gândesc și revin",
+    "În cât timp poate fi gata?",
+    "Cum se face achitarea?",
+    "Da",
+    "Super, mulțumesc mult!",
+    "Aveți livrare în Bălți?",
+    "Se poate cu logo?",
+    "Здравствуйте",
+    "Сколько стоит?",
+    "Спасибо большое",
+    "Какой срок изготовления?",
+    "Доставка в Кишинев есть?",
+    "Хорошо, подумаю",
+    "Привет, можно с фото?",
+    "La revedere",
+    "Poștă",
+    "Curier",
+]
+
+LEAD_MESSAGES = [
+    "Ion Popescu\n069123456\nstr. Lenin 14",
+    "Maria Rusu 079013356",
+    "Numele meu este Ana Cebotari",
+    "Numele Vasile Ciobanu",
+    "Cristina Bivol\n+37368977378\nsat. Sauca, r-nul Ocnița, 7133",
+    "Sauca, Ocnita, 7133",
+    "068977378",
+    "069 682 881",
+    "Tel: 079 555 123",
+    "str. Mihai Viteazu 25, ap. 12",
+    "bd. Ștefan cel Mare 134, bl. 2, sc. 3, et. 4, ap. 56",
+    "Telenești",
+    "satul Limbenii Noi, raionul Glodeni, MD-4918",
+    "Иван Петров\n060123456\nул. Пушкина 10, кв. 5",
+    "Кишинев, ул. Дачия 20/1 кв. 44",
+    "Orhei, str. Vasile Lupu 5\nAlexandru Munteanu\n078112233",
+    "Doina Lungu, 067 123 456",
+    "Chișinău",
+    "mun. Chișinău, str. Ismail 88",
+    "Elena Vasilache\nFlorești, str. Independenței 12\nMD-5001\n069000111",
+]
+
+LONG_PASTES = [
+    (
+        "Pentru a expedia comanda prin poștă, avem nevoie de câteva date:\n\n"
+        "Numele Prenumele: Irina Guțu\n\n"
+        "Adresa: str. Păcii 17\n\n"
+        "Codul poștal și localitatea: MD-3101 Bălți\n\n"
+        "Nr de contact: 069876543"
+    ),
+    (
+        "Putem livra prin curier\n\n"
+        "Livrează timp de o zi lucrătoare\n\n"
+        "Direct la adresa comodă\n\n"
+        "Sună și se înțelege din timp\n\n"
+        "Livrarea e 65 lei\n\n"
+        "La fel din Chișinău este posibilă preluarea comenzii din oficiu\n\n"
+        "De luni până vineri la adresa Feredeului 4/4\n\n"
+        "În intervalul orelor 9:00-16:00\n\n"
+        "Cum vă este mai comod ?\n"
+        "Cu livrare sau preluare din oficiu?\n\n"
+        "Cu livrare, Tudor Rotaru, 079334455, str. Alba Iulia 75, ap. 8"
+    ),
+    (
+        "Bună ziua! Am văzut postarea voastră cu lămpile și aș vrea să comand una pentru "
+        "aniversarea părinților mei, care este peste două săptămâni. Am o fotografie de la nunta lor "
+        "și m-aș bucura dacă ați putea face ceva frumos din ea. Nu știu exact ce dimensiune să aleg, "
+        "poate îmi recomandați voi. Plata o pot face pe card sau cash la primire, cum vă este mai comod. "
+        "Livrarea ar fi în Ungheni, pe strada Națională. Mulțumesc anticipat și aștept răspunsul vostru! "
+    ) * 3,
+    (
+        "Здравствуйте! Хотела бы заказать лампу с фотографией в подарок мужу на годовщину. "
+        "Фото пришлю отдельным сообщением. Доставка нужна в Бельцы, удобнее курьером. "
+        "Подскажите пожалуйста сроки и стоимость, а также как можно оплатить. Спасибо! "
+    ) * 3,
+]
+
+
+def build_corpus(size: int = 2000, seed: int = 1234) -> list[str]:
+    """Weighted sample: ~70% chatter, ~25% lead data, ~5% long pastes."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        r = rng.random()
+        if r < 0.70:
+            corpus.append(rng.choice(CHATTER))
+        elif r < 0.95:
+            corpus.append(rng.choice(LEAD_MESSAGES))
+        else:
+            corpus.append(rng.choice(LONG_PASTES))
+    return corpus
+
+
+def all_messages() -> list[str]:
+    """Every distinct message once (useful for per-extractor timing)."""
+    return CHATTER + LEAD_MESSAGES + LONG_PASTES
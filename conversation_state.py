@@ -0,0 +1,604 @@
+"""
+Per-sender conversation state for the Instagram webhook.
+
+One slotted ConversationState per sender replaces the parallel per-sender dicts
+webhook.py used to keep (OFFER_SENT, GREETING_SENT, USER_LOCATION_CHOICE, ...):
+the sender ID is stored once, and a DM costs one map lookup instead of one per
+anti-spam flag. The once-per-conversation flags share a single int bit field,
+so a sender costs the same few slots however many replies we have sent.
+
+States live in a ConversationStore kept in least-recently-seen order: senders
+idle for CONVERSATION_TTL_SEC are dropped (their next DM starts a new
+conversation), and the store never holds more than CONVERSATION_MAX_ENTRIES.
+Both checks only look at the oldest entry, so eviction is O(1) amortized.
+
+With REDIS_URL set, states live in Redis instead (one hash per sender, expiring
+after CONVERSATION_TTL_SEC), so they survive deploys and are shared between
+workers. A webhook request loads all its senders in one pipelined HGETALL
+(prefetch) and writes back only the changed fields in one pipeline (flush).
+Redis sits behind a circuit breaker: while it is unreachable, states are kept
+in memory and the webhook keeps answering (ResilientConversationStore).
+
+Guards that decide whether to send something (offer once, greeting cooldown...)
+go through claim_flag / claim_cooldown, which test and set atomically: under a
+lock in memory, in one Lua script in Redis. With Redis, any number of workers
+can share the conversation state without double-sending.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from customer_capture.resilience import OPEN, CircuitBreaker
+from customer_capture.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Idle time after which a sender's flags are forgotten (must exceed the reply cooldowns)
+CONVERSATION_TTL_SEC = int(os.getenv("CONVERSATION_TTL_SEC", str(7 * 24 * 3600)))
+CONVERSATION_MAX_ENTRIES = int(os.getenv("CONVERSATION_MAX_ENTRIES", "100000"))
+CONVERSATION_KEY_PREFIX = os.getenv("CONVERSATION_KEY_PREFIX", "conv:")
+
+
+class _Flag:
+    """Boolean attribute stored as one bit of ConversationState.flags."""
+    __slots__ = ("mask",)
+
+    def __init__(self, bit: int):
+        self.mask = 1 << bit
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return bool(obj.flags & self.mask)
+
+    def __set__(self, obj, value: bool) -> None:
+        obj.flags = (obj.flags | self.mask) if value else (obj.flags & ~self.mask)
+
+
+@dataclass(slots=True)
+class ConversationState:
+    """Anti-spam flags and delivery choices for one sender."""
+    flags: int = 0  # bit field behind the _Flag attributes below
+    last_seen: float = 0.0  # epoch seconds of the last get_conversation
+
+    # Cooldowns (epoch seconds of the last reply, 0.0 = never)
+    greeting_sent_at: float = 0.0
+    thank_you_at: float = 0.0
+
+    # Delivery choices
+    location_delivery: Optional[str] = None  # location category we answered for
+    location_choice: Optional[str] = None  # CHISINAU, BALTI, OTHER_MD
+    specific_location: Optional[str] = None  # e.g. "Telenești"
+    delivery_method: Optional[str] = None  # curier, posta
+
+    # Sent once per conversation
+    offer_sent = _Flag(0)
+    neon_sign_sent = _Flag(1)
+    gallery_sent = _Flag(2)
+    neon_gallery_sent = _Flag(3)
+    eta_replied = _Flag(4)
+    delivery_replied = _Flag(5)  # any delivery message (general or per location)
+    delivery_form_replied = _Flag(6)
+    followup_replied = _Flag(7)
+    goodbye_replied = _Flag(8)
+    payment_general_replied = _Flag(9)
+    advance_amount_replied = _Flag(10)
+    advance_method_replied = _Flag(11)
+
+    def to_hash(self) -> dict[str, str]:
+        """Stored fields that differ from the defaults, as Redis hash values."""
+        return {
+            name: repr(value) if isinstance(value, float) else str(value)
+            for name in STORED_FIELDS
+            if (value := getattr(self, name))
+        }
+
+    def absorb(self, other: "ConversationState") -> None:
+        """Fold in a newer copy of this sender's state: flags united, latest cooldowns, its choices."""
+        self.flags |= other.flags
+        self.greeting_sent_at = max(self.greeting_sent_at, other.greeting_sent_at)
+        self.thank_you_at = max(self.thank_you_at, other.thank_you_at)
+        for name in _CHOICE_FIELDS:
+            value = getattr(other, name)
+            if value is not None:
+                setattr(self, name, value)
+
+    @classmethod
+    def from_hash(cls, data: dict[str, str]) -> "ConversationState":
+        state = cls()
+        for name, value in data.items():
+            if name == "flags":
+                state.flags = int(value)
+            elif name in _FLOAT_FIELDS:
+                setattr(state, name, float(value))
+            elif name in STORED_FIELDS:
+                setattr(state, name, value)
+        return state
+
+
+FLAG_NAMES = tuple(name for name, value in vars(ConversationState).items() if isinstance(value, _Flag))
+
+# Fields persisted by RedisConversationStore (last_seen is replaced by the key TTL)
+STORED_FIELDS = tuple(name for name in ConversationState.__slots__ if name != "last_seen")
+_FLOAT_FIELDS = frozenset({"greeting_sent_at", "thank_you_at"})
+_CHOICE_FIELDS = tuple(name for name in STORED_FIELDS if name != "flags" and name not in _FLOAT_FIELDS)
+
+
+def _flag_mask(flag: str) -> int:
+    descriptor = vars(ConversationState).get(flag)
+    if not isinstance(descriptor, _Flag):
+        raise ValueError(f"Unknown conversation flag: {flag}")
+    return descriptor.mask
+
+
+class ConversationStore:
+    """Sender -> ConversationState with idle TTL and a size cap (LRU)."""
+
+    def __init__(self, ttl_sec: float = CONVERSATION_TTL_SEC, max_entries: int = CONVERSATION_MAX_ENTRIES):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._states: OrderedDict[str, ConversationState] = OrderedDict()
+        self._lock = threading.RLock()
+        self.evicted_idle = 0
+        self.evicted_full = 0
+        self.journal = None  # called as journal(sender_id, fields) on changes (see persistence.py)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, sender_id: str) -> bool:
+        return sender_id in self._states
+
+    def get(self, sender_id: str, now: Optional[float] = None) -> ConversationState:
+        """State for sender_id (created on first use), marked as seen now."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            state = self._get(sender_id, now)
+        if self.journal is not None:
+            # Remember how it looked, so flush() journals it only if the request changed it
+            batch = _batch.get()
+            if batch is None:
+                batch = {}
+                _batch.set(batch)
+            if sender_id not in batch:
+                batch[sender_id] = (state, state.to_hash())
+        return state
+
+    def _get(self, sender_id: str, now: float) -> ConversationState:
+        states = self._states
+        state = states.get(sender_id)
+        if state is not None and now - state.last_seen > self.ttl_sec:
+            del states[sender_id]
+            self.evicted_idle += 1
+            state = None
+        if state is None:
+            state = states[sender_id] = ConversationState()
+        else:
+            states.move_to_end(sender_id)
+        state.last_seen = now
+        self._evict(now)
+        return state
+
+    def _evict(self, now: float) -> None:
+        states = self._states
+        while len(states) > self.max_entries:
+            states.popitem(last=False)
+            self.evicted_full += 1
+        cutoff = now - self.ttl_sec
+        while states:
+            oldest = next(iter(states.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            states.popitem(last=False)
+            self.evicted_idle += 1
+
+    def pop(self, sender_id: str) -> Optional[ConversationState]:
+        """Remove and return sender_id's state, if any."""
+        with self._lock:
+            return self._states.pop(sender_id, None)
+
+    def claim(self, sender_id: str, flag: str) -> bool:
+        """Set a once-per-conversation flag; True only for the caller that set it."""
+        mask = _flag_mask(flag)
+        with self._lock:
+            state = self._get(sender_id, time.time())
+            if state.flags & mask:
+                return False
+            state.flags |= mask
+            self._journal_state(sender_id, state)
+            return True
+
+    def claim_cooldown(self, sender_id: str, field: str, cooldown_sec: float, now: Optional[float] = None) -> bool:
+        """Set a timestamp field to now if cooldown_sec has passed since its last value."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            state = self._get(sender_id, now)
+            if now - getattr(state, field) < cooldown_sec:
+                return False
+            setattr(state, field, now)
+            self._journal_state(sender_id, state)
+            return True
+
+    def prefetch(self, sender_ids: Iterable[str]) -> None:
+        """No-op: in-memory states need no loading."""
+
+    def flush(self) -> None:
+        """Journal the states this request changed; changes are already visible in memory."""
+        batch = _batch.get()
+        _batch.set(None)
+        if not batch or self.journal is None:
+            return
+        for sid, (state, loaded) in batch.items():
+            if state.to_hash() != loaded:
+                self._journal_state(sid, state)
+
+    def _journal_state(self, sender_id: str, state: ConversationState) -> None:
+        if self.journal is not None:
+            self.journal(sender_id, {**state.to_hash(), "last_seen": repr(state.last_seen)})
+
+    def dump(self) -> list[tuple[str, dict[str, str]]]:
+        """(sender_id, stored fields + last_seen) pairs, least recently seen first."""
+        with self._lock:
+            return [(sid, {**state.to_hash(), "last_seen": repr(state.last_seen)})
+                    for sid, state in self._states.items()]
+
+    def restore(self, items: Iterable[tuple[str, Optional[dict[str, str]]]]) -> None:
+        """Put back dumped or journaled (sender_id, fields) pairs in order; None fields remove the state."""
+        states = self._states
+        with self._lock:
+            for sender_id, fields in items:
+                states.pop(sender_id, None)  # re-inserted at the most recently seen end
+                if fields is not None:
+                    state = ConversationState.from_hash(fields)
+                    state.last_seen = float(fields.get("last_seen", 0.0))
+                    states[sender_id] = state
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Drop idle states (and any over the size cap)."""
+        with self._lock:
+            self._evict(time.time() if now is None else now)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._states),
+            "max_entries": self.max_entries,
+            "ttl_sec": self.ttl_sec,
+            "evicted_idle": self.evicted_idle,
+            "evicted_full": self.evicted_full,
+        }
+
+
+# sender_id -> (state, hash as loaded) for the current webhook request
+_batch: ContextVar[Optional[dict[str, tuple[ConversationState, dict[str, str]]]]] = ContextVar(
+    "conversation_batch", default=None
+)
+
+
+# Flag bits are tested with arithmetic: not every Redis-compatible server ships Lua's bit library.
+# KEYS[1] = hash, ARGV = mask, ttl. Returns 1 if this call set the bit.
+_CLAIM_FLAG_LUA = """
+local flags = tonumber(redis.call('HGET', KEYS[1], 'flags') or '0')
+local mask = tonumber(ARGV[1])
+if math.floor(flags / mask) % 2 == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'flags', flags + mask)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] = hash, ARGV = field, now, cooldown, ttl. Returns 1 if the cooldown had passed.
+_CLAIM_COOLDOWN_LUA = """
+local last = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) - last < tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+# KEYS[1] = hash, ARGV = bits to set, bits to clear. Keeps bits other workers set meanwhile.
+_MERGE_FLAGS_LUA = """
+local old = tonumber(redis.call('HGET', KEYS[1], 'flags') or '0')
+local set, clear = tonumber(ARGV[1]), tonumber(ARGV[2])
+local flags, value = 0, 1
+while value <= old or value <= set do
+    local on = math.floor(old / value) % 2 == 1 or math.floor(set / value) % 2 == 1
+    if on and math.floor(clear / value) % 2 == 0 then
+        flags = flags + value
+    end
+    value = value * 2
+end
+if flags == 0 then
+    redis.call('HDEL', KEYS[1], 'flags')
+else
+    redis.call('HSET', KEYS[1], 'flags', flags)
+end
+return flags
+"""
+
+
+class RedisConversationStore:
+    """
+    Sender -> ConversationState in Redis, one hash per sender.
+
+    States are loaded into a per-request batch and written back by flush();
+    a get() outside prefetch() still works, it just costs its own round trip.
+    Flag bits are merged on flush rather than overwritten, and claims go
+    straight to Redis, so concurrent workers never undo each other's flags.
+    """
+
+    def __init__(self, client, ttl_sec: float = CONVERSATION_TTL_SEC, prefix: str = CONVERSATION_KEY_PREFIX):
+        self.redis = client
+        self.ttl_sec = int(ttl_sec)
+        self.prefix = prefix
+        self.round_trips = 0
+        self.loaded = 0
+        self.written = 0
+        self._claim_flag = client.register_script(_CLAIM_FLAG_LUA)
+        self._claim_cooldown = client.register_script(_CLAIM_COOLDOWN_LUA)
+        self._merge_flags = client.register_script(_MERGE_FLAGS_LUA)
+
+    def _key(self, sender_id: str) -> str:
+        return f"{self.prefix}{sender_id}"
+
+    def _current_batch(self) -> dict:
+        batch = _batch.get()
+        if batch is None:
+            batch = {}
+            _batch.set(batch)
+        return batch
+
+    def prefetch(self, sender_ids: Iterable[str]) -> None:
+        """Load every sender not yet in the batch with one pipelined HGETALL."""
+        batch = self._current_batch()
+        missing = list(dict.fromkeys(sid for sid in sender_ids if sid not in batch))
+        if not missing:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for sid in missing:
+            pipe.hgetall(self._key(sid))
+        rows = pipe.execute()
+        self.round_trips += 1
+        self.loaded += len(missing)
+        now = time.time()
+        for sid, data in zip(missing, rows):
+            state = ConversationState.from_hash(data or {})
+            state.last_seen = now
+            batch[sid] = (state, data or {})
+
+    def get(self, sender_id: str, now: Optional[float] = None) -> ConversationState:
+        """State for sender_id from the current batch, loading it if needed."""
+        batch = self._current_batch()
+        if sender_id not in batch:
+            self.prefetch((sender_id,))
+        state = batch[sender_id][0]
+        if now is not None:
+            state.last_seen = now
+        return state
+
+    def claim(self, sender_id: str, flag: str) -> bool:
+        """Set a once-per-conversation flag; True only for the caller that set it."""
+        mask = _flag_mask(flag)
+        won = bool(self._claim_flag(keys=[self._key(sender_id)], args=[mask, self.ttl_sec]))
+        self.round_trips += 1
+        # The bit is set in Redis either way; mirror it so flush has nothing to write
+        entry = (_batch.get() or {}).get(sender_id)
+        if entry:
+            state, loaded = entry
+            state.flags |= mask
+            loaded["flags"] = str(int(loaded.get("flags", 0)) | mask)
+        return won
+
+    def claim_cooldown(self, sender_id: str, field: str, cooldown_sec: float, now: Optional[float] = None) -> bool:
+        """Set a timestamp field to now if cooldown_sec has passed since its last value."""
+        if now is None:
+            now = time.time()
+        value = repr(float(now))
+        won = bool(self._claim_cooldown(keys=[self._key(sender_id)],
+                                        args=[field, value, cooldown_sec, self.ttl_sec]))
+        self.round_trips += 1
+        entry = (_batch.get() or {}).get(sender_id)
+        if entry and won:
+            state, loaded = entry
+            setattr(state, field, float(value))
+            loaded[field] = value
+        return won
+
+    def flush(self) -> None:
+        """Write changed fields of every batched state in one pipeline and end the batch."""
+        batch = _batch.get()
+        _batch.set(None)
+        if not batch:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        queued = 0
+        for sid, (state, loaded) in batch.items():
+            current = state.to_hash()
+            key = self._key(sid)
+            changed = {name: value for name, value in current.items()
+                       if name != "flags" and loaded.get(name) != value}
+            removed = [name for name in loaded if name != "flags" and name not in current]
+            if changed:
+                pipe.hset(key, mapping=changed)
+            if removed:
+                pipe.hdel(key, *removed)
+            old_flags = int(loaded.get("flags", 0))
+            flags_changed = state.flags != old_flags
+            if flags_changed:
+                self._merge_flags(keys=[key], args=[state.flags & ~old_flags, old_flags & ~state.flags],
+                                  client=pipe)
+            if current:
+                # Sliding TTL: an active conversation keeps its flags
+                pipe.expire(key, self.ttl_sec)
+            if changed or removed or flags_changed or current:
+                queued += 1
+        if queued:
+            pipe.execute()
+            self.round_trips += 1
+            self.written += queued
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "ttl_sec": self.ttl_sec,
+            "loaded": self.loaded,
+            "written": self.written,
+            "round_trips": self.round_trips,
+        }
+
+
+class ResilientConversationStore:
+    """
+    RedisConversationStore behind a circuit breaker, with a ConversationStore as fallback.
+
+    Connection errors and timeouts count against the breaker and the senders
+    involved are served from memory instead of failing the webhook request;
+    while the breaker is open Redis is not tried. A state the request already
+    loaded from Redis is copied to memory before a claim falls back, so its
+    flags still hold. States changed in memory are folded into the Redis copy
+    (ConversationState.absorb) the next time their sender is loaded from Redis.
+    """
+
+    def __init__(self, primary: RedisConversationStore, fallback: Optional[ConversationStore] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        import redis
+        self.primary = primary
+        self.fallback = fallback if fallback is not None else ConversationStore()
+        self.breaker = breaker if breaker is not None else CircuitBreaker(
+            settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET_SECONDS
+        )
+        self._outage_errors = (redis.ConnectionError, redis.TimeoutError, OSError)
+        self.fallback_calls = 0
+
+    def _call(self, fn, *args):
+        """Run fn on Redis if the breaker allows; (True, result) on success, (False, None) otherwise."""
+        if not self.breaker.allow():
+            self.fallback_calls += 1
+            return False, None
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = fn(*args)
+            succeeded = True
+        except self._outage_errors as e:
+            self.breaker.record_failure()
+            self.fallback_calls += 1
+            logger.warning(f"Redis conversation {fn.__name__} failed ({type(e).__name__}), "
+                           f"using memory; breaker {self.breaker.state}")
+            return False, None
+        finally:
+            if not succeeded:
+                self.breaker.release_trial()
+        self.breaker.record_success((time.perf_counter() - start) * 1000)
+        return True, result
+
+    def prefetch(self, sender_ids: Iterable[str]) -> None:
+        """Load senders from Redis, folding in any state kept in memory during an outage."""
+        sender_ids = list(sender_ids)
+        ok, _ = self._call(self.primary.prefetch, sender_ids)
+        if ok and len(self.fallback):
+            batch = _batch.get()
+            for sid in sender_ids:
+                local = self.fallback.pop(sid)
+                if local is not None:
+                    batch[sid][0].absorb(local)  # written back to Redis by flush()
+
+    def get(self, sender_id: str, now: Optional[float] = None) -> ConversationState:
+        batch = _batch.get()
+        if batch is None or sender_id not in batch:
+            self.prefetch((sender_id,))
+            batch = _batch.get()
+        if batch is not None and sender_id in batch:
+            return self.primary.get(sender_id, now)
+        return self.fallback.get(sender_id, now)
+
+    def _local(self, sender_id: str) -> ConversationStore:
+        """The fallback, holding sender_id's state as this request loaded it from Redis."""
+        entry = (_batch.get() or {}).get(sender_id)
+        if entry is not None and sender_id not in self.fallback:
+            state = entry[0]
+            self.fallback.restore([(sender_id, {**state.to_hash(), "last_seen": repr(state.last_seen)})])
+        return self.fallback
+
+    def claim(self, sender_id: str, flag: str) -> bool:
+        ok, won = self._call(self.primary.claim, sender_id, flag)
+        return won if ok else self._local(sender_id).claim(sender_id, flag)
+
+    def claim_cooldown(self, sender_id: str, field: str, cooldown_sec: float, now: Optional[float] = None) -> bool:
+        ok, won = self._call(self.primary.claim_cooldown, sender_id, field, cooldown_sec, now)
+        return won if ok else self._local(sender_id).claim_cooldown(sender_id, field, cooldown_sec, now)
+
+    def flush(self) -> None:
+        """Write the batch to Redis; if that fails, keep the changed states in memory."""
+        batch = _batch.get()
+        ok, _ = self._call(self.primary.flush)
+        if ok or not batch:
+            return
+        _batch.set(None)
+        for sid, (state, loaded) in batch.items():
+            if state.to_hash() == loaded:
+                continue
+            local = self.fallback.pop(sid)  # holds the claims that fell back during the request
+            if local is not None:
+                local.absorb(state)
+                state = local
+            self.fallback.restore([(sid, {**state.to_hash(), "last_seen": repr(state.last_seen)})])
+
+    def stats(self) -> dict:
+        return {
+            **self.primary.stats(),
+            "backend": "memory" if self.breaker.state == OPEN else "redis",
+            "breaker": self.breaker.stats(),
+            "fallback_calls": self.fallback_calls,
+            "fallback_states": len(self.fallback),
+        }
+
+
+def _create_store() -> ConversationStore | ResilientConversationStore:
+    """Redis store (with in-memory fallback) when REDIS_URL is set, in-memory otherwise."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        try:
+            import redis
+            client = redis.from_url(redis_url, decode_responses=True, socket_timeout=2)
+        except Exception as e:
+            logger.warning(f"Redis unavailable, conversation state in memory: {e}")
+        else:
+            store = ResilientConversationStore(RedisConversationStore(client))
+            try:
+                client.ping()
+                logger.info("Using Redis for conversation state")
+            except Exception as e:
+                # Not fatal: the breaker retries Redis after its reset timeout
+                store.breaker.trip()
+                logger.warning(f"Redis connection failed, conversation state in memory until it answers: {e}")
+            return store
+    return ConversationStore()
+
+
+CONVERSATIONS = _create_store()
+
+
+def get_conversation(sender_id: str) -> ConversationState:
+    """State for sender_id, created on first use (loaded from Redis when configured)."""
+    return CONVERSATIONS.get(sender_id)
+
+
+def claim_flag(sender_id: str, flag: str) -> bool:
+    """Atomically set a once-per-conversation flag; False if it was already set."""
+    return CONVERSATIONS.claim(sender_id, flag)
+
+
+def claim_cooldown(sender_id: str, field: str, cooldown_sec: float) -> bool:
+    """Atomically stamp field with now unless its last value is within cooldown_sec."""
+    return CONVERSATIONS.claim_cooldown(sender_id, field, cooldown_sec)
@@ -0,0 +1,184 @@
+"""
+Street-address tokenizer for Moldovan address formats.
+
+Splits an address line such as "bd. Ștefan cel Mare 134, bl. 2, sc. 3, et. 4, ap. 56"
+or "ул. Дачия 20/1, кв. 44" into components in one left-to-right pass over regex
+tokens: a marker word ("str.", "bl.", "кв.") says which component the next number
+belongs to; unmarked words before the first number form the street name.
+"""
+import re
+from dataclasses import dataclass, field, fields
+from typing import Optional
+
+from .postal import fold
+
+_TOKEN_PATTERN = re.compile(
+    r'(?P<num>\d+(?:\s*/\s*\d+)?(?:[a-zA-Zа-яА-Я](?!\w))?)'
+    r'|(?P<word>[^\W\d_]+(?:-[^\W\d_]+)*\.?)'
+    r'|(?P<sep>[,;!?\n])'
+)
+
+# Longest street name kept; stops free text after "strada" from running on
+MAX_STREET_WORDS = 5
+
+# Street type markers (lowercase, no dot) -> canonical label
+STREET_TYPES = {
+    'str': 'str.', 'strada': 'str.', 'strad': 'str.',
+    'bd': 'bd.', 'bul': 'bd.', 'bulevardul': 'bd.',
+    'șos': 'șos.', 'sos': 'șos.', 'șoseaua': 'șos.', 'soseaua': 'șos.',
+    'ул': 'ул.', 'улица': 'ул.',
+    'бул': 'бул.', 'бульвар': 'бул.',
+    'пр': 'пр.', 'проспект': 'пр.',
+    'пер': 'пер.', 'переулок': 'пер.',
+    'шос': 'шос.', 'шоссе': 'шос.',
+}
+
+# Component markers (lowercase, no dot) -> StreetAddress field
+COMPONENT_MARKERS = {
+    'nr': 'house', 'numărul': 'house', 'numarul': 'house', 'дом': 'house', 'д': 'house',
+    'bl': 'block', 'bloc': 'block', 'blocul': 'block', 'корп': 'block', 'корпус': 'block',
+    'sc': 'entrance', 'scara': 'entrance', 'под': 'entrance', 'подъезд': 'entrance',
+    'et': 'floor', 'etaj': 'floor', 'etajul': 'floor', 'эт': 'floor', 'этаж': 'floor',
+    'ap': 'apartment', 'apt': 'apartment', 'apartament': 'apartment', 'apartamentul': 'apartment',
+    'кв': 'apartment', 'квартира': 'apartment',
+}
+
+_LABELS_RO = {'block': 'bl.', 'entrance': 'sc.', 'floor': 'et.', 'apartment': 'ap.'}
+_LABELS_RU = {'block': 'корп.', 'entrance': 'под.', 'floor': 'эт.', 'apartment': 'кв.'}
+# Only used when a house number has to be added to text that lacks one
+_HOUSE_LABELS = {False: 'nr.', True: 'д.'}
+
+_COMPONENTS = ('block', 'entrance', 'floor', 'apartment')
+
+
+@dataclass(slots=True)
+class StreetAddress:
+    """Structured street address components."""
+    street: Optional[str] = None  # street name without its type marker
+    street_type: Optional[str] = None  # canonical marker: "str.", "bd.", "ул." ...
+    house: Optional[str] = None  # "14", "20/1", "4A"
+    block: Optional[str] = None
+    entrance: Optional[str] = None
+    floor: Optional[str] = None
+    apartment: Optional[str] = None
+    cyrillic: bool = False
+    # (start, end) in the tokenized text of each number component, for amend_address
+    spans: Optional[dict] = field(default=None, compare=False, repr=False)
+
+    def component_count(self) -> int:
+        """Number of components present (street type and script flag not counted)."""
+        return sum(
+            1 for f in fields(self)
+            if f.name not in ('street_type', 'cyrillic', 'spans') and getattr(self, f.name)
+        )
+
+    def same_street(self, other: "StreetAddress") -> bool:
+        """True if both name the same street (case/diacritics-insensitive)."""
+        return bool(self.street and other.street) and fold(self.street) == fold(other.street)
+
+    def combined(self, other: "StreetAddress") -> "StreetAddress":
+        """Components from other override, missing ones are kept from self."""
+        merged = StreetAddress(cyrillic=self.cyrillic or other.cyrillic)
+        for f in fields(self):
+            if f.name not in ('cyrillic', 'spans'):
+                setattr(merged, f.name, getattr(other, f.name) or getattr(self, f.name))
+        return merged
+
+    def format(self) -> str:
+        """Canonical one-line form: "str. Lenin 14, bl. 2, sc. 3, et. 4, ap. 56"."""
+        labels = _LABELS_RU if self.cyrillic else _LABELS_RO
+        head = ' '.join(p for p in (self.street_type, self.street, self.house) if p)
+        parts = [head] if head else []
+        parts += [f"{labels[name]} {getattr(self, name)}" for name in _COMPONENTS if getattr(self, name)]
+        return ', '.join(parts)
+
+
+def amend_address(text: str, current: StreetAddress, new: StreetAddress) -> str:
+    """
+    text (tokenized as current) with the numbered components of new written in.
+    
+    A value that differs replaces the old number where it stands, a missing one
+    is appended with its label; everything else the customer wrote (village,
+    intercom, a street named after a date) is kept as it was.
+    """
+    spans = current.spans or {}
+    replacements = []
+    appended = []
+    for name in ('house',) + _COMPONENTS:
+        value = getattr(new, name)
+        if not value or value == getattr(current, name):
+            continue
+        if name in spans:
+            replacements.append((spans[name], value))
+        elif name == 'house':
+            appended.append(f"{_HOUSE_LABELS[current.cyrillic]} {value}")
+        else:
+            labels = _LABELS_RU if current.cyrillic else _LABELS_RO
+            appended.append(f"{labels[name]} {value}")
+    # Right to left, so earlier spans stay valid
+    for (start, end), value in sorted(replacements, reverse=True):
+        text = text[:start] + value + text[end:]
+    if appended:
+        text = ', '.join([text.rstrip(' ,;.')] + appended)
+    return text
+
+
+def tokenize_address(text: str) -> StreetAddress:
+    """Split an address line into components. Unrecognised text is ignored."""
+    result = StreetAddress(spans={})
+    street_words: list[str] = []
+    pending: Optional[str] = None  # component the next number belongs to
+    street_done = False
+    in_phone = False  # inside a run of numbers that started with 0
+
+    for match in _TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        value = match.group()
+        if kind != 'num':
+            in_phone = False
+
+        if kind == 'sep':
+            # "Orhei, str. ..." - words before a separator were not the street
+            if not street_done and result.street_type is None:
+                street_words.clear()
+            continue
+
+        if kind == 'word':
+            key = value.rstrip('.').lower()
+            if key in STREET_TYPES:
+                if street_done or result.street_type:
+                    continue
+                result.street_type = STREET_TYPES[key]
+                result.cyrillic = result.street_type[0] >= 'а'
+                street_words.clear()
+            elif key in COMPONENT_MARKERS:
+                pending = COMPONENT_MARKERS[key]
+                if key[0] >= 'а':
+                    result.cyrillic = True
+            elif not street_done and len(street_words) < MAX_STREET_WORDS:
+                street_words.append(value.rstrip('.'))
+                # "pe strada Națională. Mulțumesc" - a sentence end closes the name
+                if value.endswith('.') and result.street_type:
+                    street_done = True
+            continue
+
+        # Number; phones start with 0 ("079 555 123"), house numbers never do
+        if value[0] == '0' or in_phone:
+            in_phone = True
+            pending = None
+            continue
+        if pending and not getattr(result, pending):
+            setattr(result, pending, value.replace(' ', ''))
+            result.spans[pending] = match.span()
+            if pending == 'house':
+                street_done = True
+        elif not street_done and street_words:
+            result.house = value.replace(' ', '')
+            result.spans['house'] = match.span()
+            street_done = True
+        pending = None
+
+    # Unmarked words only count as a street when a house number followed ("Lenin 14")
+    if street_words and (result.street_type or result.house):
+        result.street = ' '.join(street_words)
+    return result
@@ -0,0 +1,240 @@
+"""
+Batch re-extraction of customer data from stored messages.
+
+Re-runs the parser over Raw_Message values exported to Google Sheets (or
+archived DMs) so that improved heuristics can refill Full_Name / Adress /
+Location columns.
+
+Usage:
+    python -m customer_capture.batch leads.csv -o leads_filled.csv --workers 4
+    python -m customer_capture.batch dms.jsonl -o parsed.jsonl --text-field text
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+from .models import ParsedMessage
+from .templates import register_templates, registered_templates
+
+logger = logging.getLogger(__name__)
+
+# Sheet columns refilled from parse results (see exporter.SHEET_COLUMNS)
+FILL_COLUMNS = {
+    "Full_Name": lambda p: p.full_name,
+    "Adress": lambda p: p.address_block.street_address,
+    "Location": lambda p: p.address_block.location,
+    "Contact Number": lambda p: p.contact_number,
+    "Postal Code": lambda p: p.address_block.postal_code,
+}
+
+DEFAULT_TEXT_FIELD = "Raw_Message"
+DEFAULT_CHUNKSIZE = 64
+# Input windows handed to the pool at once: the next one is parsed while results of the first are yielded
+WINDOWS_IN_FLIGHT = 2
+
+# Sample used to warm the per-worker regex cache before real work arrives
+_WARMUP_TEXT = "Ion Popescu\n069123456\nstr. Lenin 14, ap. 5\nsat. Sauca, r-nul Ocnița, MD-7133"
+
+
+def _warm_up() -> None:
+    """
+    Import the parser and compile its patterns.
+
+    The parser builds most patterns on the fly and relies on the `re` module
+    cache, so a single warm-up parse compiles everything up front instead of
+    during the first chunk of real messages.
+    """
+    from .parser import parse_customer_message
+    parse_customer_message(_WARMUP_TEXT)
+
+
+def _init_worker(templates: tuple[str, ...] = ()) -> None:
+    """Pool initializer: the parent's bot templates, quiet logging, then a warm-up parse."""
+    # Workers inherit the parent's handlers; keep per-message debug noise out of batch runs
+    logging.getLogger("customer_capture").setLevel(logging.WARNING)
+    # A spawned worker starts with an empty template index (a forked one already has it)
+    if templates and not registered_templates():
+        register_templates(templates)
+    _warm_up()
+
+
+def _parse_one(text: str) -> ParsedMessage:
+    from .parser import parse_customer_message
+    return parse_customer_message(text or "")
+
+
+def parse_customer_messages(
+    texts: Iterable[str],
+    workers: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Iterator[ParsedMessage]:
+    """
+    Parse many messages, yielding results in input order.
+
+    Inputs are streamed through a process pool in bounded windows, so arbitrarily
+    large iterables are consumed lazily; WINDOWS_IN_FLIGHT windows are queued
+    at a time so workers never wait for the caller at a window boundary. Each worker registers the bot templates
+    registered in this process and compiles the parser patterns once at startup.
+
+    Args:
+        texts: Iterable of raw message texts
+        workers: Number of worker processes (default: CPU count; 0 or 1 parses in-process)
+        chunksize: Number of messages sent to a worker per task
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        _warm_up()
+        for text in texts:
+            yield _parse_one(text)
+        return
+
+    # Pool.imap drains its input eagerly; feed it windows to bound memory
+    window = workers * chunksize * 4
+    iterator = iter(texts)
+    in_flight: deque = deque()
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                              initargs=(registered_templates(),)) as pool:
+        while True:
+            while len(in_flight) < WINDOWS_IN_FLIGHT:
+                batch = list(islice(iterator, window))
+                if not batch:
+                    break
+                in_flight.append(pool.imap(_parse_one, batch, chunksize=chunksize))
+            if not in_flight:
+                break
+            # imap preserves input order, and windows are yielded in the order they were queued
+            yield from in_flight.popleft()
+
+
+def fill_row(row: dict, parsed: ParsedMessage, overwrite: bool = False) -> dict:
+    """Fill empty sheet columns of `row` from a parse result."""
+    filled = dict(row)
+    for column, getter in FILL_COLUMNS.items():
+        value = getter(parsed)
+        if value and (overwrite or not filled.get(column)):
+            filled[column] = value
+    return filled
+
+
+# === CLI ===
+
+def _detect_format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _read_rows(path: str, fmt: str) -> Iterator[dict]:
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                # Allow plain JSON strings per line (archived DM dumps)
+                yield row if isinstance(row, dict) else {DEFAULT_TEXT_FIELD: row}
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class _RowWriter:
+    """Writes filled rows as JSONL or CSV (CSV header taken from the first row)."""
+
+    def __init__(self, path: str, fmt: str):
+        self.fmt = fmt
+        self.stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        self._csv: Optional[csv.DictWriter] = None
+
+    def write(self, row: dict) -> None:
+        if self.fmt == "jsonl":
+            self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+            return
+        if self._csv is None:
+            fieldnames = list(row.keys()) + [c for c in FILL_COLUMNS if c not in row]
+            self._csv = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction="ignore")
+            self._csv.writeheader()
+        self._csv.writerow(row)
+
+    def close(self) -> None:
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m customer_capture.batch",
+        description="Re-run the customer parser over stored messages and refill missing columns.",
+    )
+    parser.add_argument("input", help="Input file (.csv or .jsonl), '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output file, '-' for stdout (default)")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"), help="Override input format detection")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), help="Override output format detection")
+    parser.add_argument("--text-field", default=DEFAULT_TEXT_FIELD, help=f"Column holding message text (default: {DEFAULT_TEXT_FIELD})")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Messages per worker task")
+    parser.add_argument("--overwrite", action="store_true", help="Overwrite non-empty columns too")
+    parser.add_argument("--progress-every", type=int, default=1000, help="Report progress every N rows (0 disables)")
+    parser.add_argument("--no-templates", action="store_true", help="Skip registering the bot templates (outbound_templates.py)")
+    args = parser.parse_args(argv)
+
+    if not args.no_templates:
+        # Same parse as production: lines of the bot's own messages pasted back are stripped
+        try:
+            from outbound_templates import OUTBOUND_TEMPLATES
+        except ImportError as e:
+            print(f"[batch] bot templates not registered: {e}", file=sys.stderr)
+        else:
+            register_templates(OUTBOUND_TEMPLATES)
+
+    in_fmt = _detect_format(args.input, args.input_format)
+    out_fmt = _detect_format(args.output, args.output_format or (in_fmt if args.output == "-" else None))
+
+    # Rows are needed twice (text for parsing, row for output): keep the rows that
+    # were handed to the pool but not yet written. Bounded by the windows in flight.
+    pending: deque[dict] = deque()
+
+    def texts() -> Iterator[str]:
+        for row in _read_rows(args.input, in_fmt):
+            pending.append(row)
+            yield row.get(args.text_field) or ""
+
+    writer = _RowWriter(args.output, out_fmt)
+    started = time.perf_counter()
+    count = 0
+    filled_rows = 0
+    try:
+        for parsed in parse_customer_messages(texts(), workers=args.workers, chunksize=args.chunksize):
+            row = pending.popleft()
+            new_row = fill_row(row, parsed, overwrite=args.overwrite)
+            if new_row != row:
+                filled_rows += 1
+            writer.write(new_row)
+            count += 1
+            if args.progress_every and count % args.progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"[batch] {count} rows, {count / elapsed:.0f} msg/s", file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"[batch] done: {count} rows ({filled_rows} updated) in {elapsed:.2f}s, {rate:.0f} msg/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
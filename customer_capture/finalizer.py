@@ -0,0 +1,136 @@
+"""
+Background finalizer for pending capture records.
+
+should_finalize() is otherwise only evaluated when the customer writes
+again, so a lead who sends name + phone and goes quiet would wait (and, with
+the in-memory store, be dropped by cleanup_stale) instead of being exported.
+
+Every saved record is scheduled at its next_finalize_at(). Deadlines live in
+a min-heap: scheduling is O(log n) and the thread sleeps until the earliest
+one, so nothing scans the pending records. Rescheduling a user just pushes a
+new entry; the latest deadline per user is kept aside and older heap entries
+are skipped when they surface.
+"""
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called with a user ID once its deadline passes; returns the next deadline to
+# wait for (record not due yet, export to retry) or None when done with the user
+DueCallback = Callable[[str], Optional[float]]
+
+
+class Finalizer:
+    """Deadline heap plus a daemon thread that runs on_due for each user when due."""
+
+    def __init__(self, on_due: DueCallback):
+        self.on_due = on_due
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}  # user ID -> current deadline
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, user_id: str, due_at: float) -> None:
+        """(Re)schedule user_id at due_at; replaces any earlier deadline. Starts the thread."""
+        with self._cond:
+            self._deadlines[user_id] = due_at
+            heapq.heappush(self._heap, (due_at, user_id))
+            # Wake the thread only if this deadline comes before the one it sleeps on
+            if self._heap[0][1] == user_id and self._heap[0][0] == due_at:
+                self._cond.notify()
+        self.start()
+
+    def schedule_earlier(self, user_id: str, due_at: float) -> None:
+        """Like schedule(), but keeps the current deadline if it is already sooner."""
+        with self._cond:
+            current = self._deadlines.get(user_id)
+        if current is None or due_at < current:
+            self.schedule(user_id, due_at)
+
+    def cancel(self, user_id: str) -> None:
+        with self._cond:
+            self._deadlines.pop(user_id, None)
+
+    def next_due(self) -> Optional[float]:
+        """Earliest live deadline, dropping superseded heap entries on the way."""
+        with self._cond:
+            return self._peek()
+
+    def _peek(self) -> Optional[float]:
+        heap = self._heap
+        while heap:
+            due_at, user_id = heap[0]
+            if self._deadlines.get(user_id) == due_at:
+                return due_at
+            heapq.heappop(heap)
+        return None
+
+    def _pop_due(self, now: float) -> list[str]:
+        due = []
+        while True:
+            due_at = self._peek()
+            if due_at is None or due_at > now:
+                return due
+            _, user_id = heapq.heappop(self._heap)
+            del self._deadlines[user_id]
+            due.append(user_id)
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Run on_due for every user whose deadline has passed; returns how many ran."""
+        with self._cond:
+            due = self._pop_due(time.time() if now is None else now)
+        for user_id in due:
+            try:
+                next_at = self.on_due(user_id)
+            except Exception as e:
+                logger.exception(f"[{user_id}] Finalizer callback failed: {e}")
+                continue
+            if next_at is not None:
+                with self._cond:
+                    # A message may have rescheduled the user meanwhile: keep the sooner
+                    # deadline, on_due re-checks the record anyway if it comes early
+                    current = self._deadlines.get(user_id)
+                    if current is None or next_at < current:
+                        self._deadlines[user_id] = next_at
+                        heapq.heappush(self._heap, (next_at, user_id))
+        return len(due)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="capture-finalizer", daemon=True)
+            self._thread.start()
+            logger.info("Customer capture finalizer started")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    due_at = self._peek()
+                    wait = None if due_at is None else due_at - time.time()
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stopped:
+                    return
+            self.run_due()
@@ -12,20 +12,61 @@ Usage in webhook.py:
     )
 """
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Optional
 from ..parser import parse_customer_message
+from ..prefilter import has_candidate_data
 from ..state import (
     get_pending_record, 
-    save_pending_record, 
-    delete_pending_record,
+    update_pending_record,
+    get_store,
     AggregationRecord,
-    cleanup_stale_records
+    InMemoryStore,
+    ResilientStore,
+    SqliteStore
 )
+from ..settings import settings
 from ..exporter import export_customer
+from ..finalizer import Finalizer
 
 logger = logging.getLogger(__name__)
 
+# Wait before the finalizer retries a failed export
+EXPORT_RETRY_SECONDS = 60
+
+# Finalizer entry for the shared Redis due queue (user IDs are numeric, never this)
+DUE_QUEUE = "redis-due-queue"
+DUE_CLAIM_BATCH = 100
+
+# Users whose record is being exported by some thread of this process
+_exporting: set[str] = set()
+_exporting_lock = threading.Lock()
+
+# Settled fields of each user's record after their last merge in this process,
+# most recent last; at most SETTLED_HINTS_MAX users are remembered
+SETTLED_HINTS_MAX = 10_000
+_settled_hints: OrderedDict[str, frozenset[str]] = OrderedDict()
+_settled_hints_lock = threading.Lock()
+
+
+def _settled_hint(platform_user_id: str) -> frozenset[str]:
+    with _settled_hints_lock:
+        return _settled_hints.get(platform_user_id, frozenset())
+
+
+def _remember_settled(platform_user_id: str, settled_fields: frozenset[str]) -> None:
+    with _settled_hints_lock:
+        if not settled_fields:
+            _settled_hints.pop(platform_user_id, None)
+            return
+        _settled_hints[platform_user_id] = settled_fields
+        _settled_hints.move_to_end(platform_user_id)
+        if len(_settled_hints) > SETTLED_HINTS_MAX:
+            _settled_hints.popitem(last=False)
+
 
 def process_customer_message(
     platform_user_id: str,
@@ -38,9 +79,11 @@ def process_customer_message(
     Process incoming customer message for data capture.
     
     This function:
-    1. Parses the message for customer entities
-    2. Aggregates data with cooldown logic
-    3. Exports to Google Sheets when ready
+    1. Drops messages with no candidate data (prefilter)
+    2. Parses the message for customer entities
+    3. Aggregates data with cooldown logic
+    4. Exports to Google Sheets when ready, or schedules the record with the
+       background finalizer so it is exported once idle
     
     Args:
         platform_user_id: Unique user ID from platform (e.g., Instagram sender_id)
@@ -52,48 +95,172 @@ def process_customer_message(
         logger.debug("Skipping: empty platform_user_id or text")
         return
     
-    # Cleanup old records periodically
-    cleanup_stale_records()
+    # Most DMs carry no lead data; drop them before touching state or the parser
+    if not has_candidate_data(text):
+        logger.debug(f"[{platform_user_id}] Prefilter: no extractable data, skipping")
+        return
+    
+    # Fields the record had settled after this user's last merge here are not
+    # re-extracted. Only a hint, kept in memory so no read of the record comes
+    # before the parse: merge_into checks it against the record it merges into.
+    settled_fields = _settled_hint(platform_user_id)
+    
+    def parse(settled: frozenset[str]):
+        return parse_customer_message(
+            text,
+            location_context=location_context,
+            specific_location=specific_location,
+            settled_fields=settled
+        )
     
     # Parse message
-    parsed = parse_customer_message(text, location_context=location_context, specific_location=specific_location)
+    parsed = parse(settled_fields)
+    if settled_fields and parsed.confidence < 0.1:
+        # Skipping the name can leave too little to keep the message (e.g. a town alone)
+        settled_fields = frozenset()
+        parsed = parse(settled_fields)
     logger.info(f"[{platform_user_id}] Parsed: name={parsed.full_name}, phone={parsed.contact_number}, location={parsed.address_block.location}, address={parsed.address_block.street_address}, postal={parsed.address_block.postal_code}, confidence={parsed.confidence:.2f}")
+    if settled_fields:
+        logger.debug(f"[{platform_user_id}] Skipped settled fields: {sorted(settled_fields)}")
     
     # Skip if nothing useful extracted
     if parsed.confidence < 0.1:
         logger.debug(f"[{platform_user_id}] Low confidence ({parsed.confidence:.2f}), skipping")
         return
     
-    # Get or create pending record
-    record = get_pending_record(platform_user_id)
+    def merge_into(record: Optional[AggregationRecord]) -> AggregationRecord:
+        nonlocal parsed, settled_fields
+        if settled_fields and (record is None or not settled_fields <= record.settled_fields()):
+            # Stale hint (lead exported or changed by another worker): parse in full
+            settled_fields = frozenset()
+            parsed = parse(settled_fields)
+        # Create pending record if needed
+        if record is None:
+            record = AggregationRecord(platform_user_id)
+            if timestamp:
+                record.created_at = timestamp
+            logger.info(f"[{platform_user_id}] Created new aggregation record")
+        record.merge(parsed)
+        return record
     
-    if record is None:
-        record = AggregationRecord(platform_user_id)
-        if timestamp:
-            record.created_at = timestamp
-        logger.info(f"[{platform_user_id}] Created new aggregation record")
-    
-    # Merge parsed data
-    had_changes = record.merge(parsed)
-    
-    # Save updated record
-    save_pending_record(record)
+    # Merge and save as one atomic update: concurrent DMs of the same user don't lose fields
+    record = update_pending_record(platform_user_id, merge_into)
+    _remember_settled(platform_user_id, record.settled_fields())
     
     # Check if should finalize
     if record.should_finalize():
         logger.info(f"[{platform_user_id}] Finalizing record")
-        _finalize_and_export(record)
+        _finalize_now(record)
     elif record.has_minimum_data() and parsed.confidence >= 0.8:
         # Immediate finalization for high-confidence complete data
         logger.info(f"[{platform_user_id}] High confidence complete data, finalizing immediately")
-        _finalize_and_export(record)
+        _finalize_now(record)
     else:
+        # Exported by the background finalizer once idle, unless another message comes first
         logger.debug(f"[{platform_user_id}] Saved, waiting for more data or cooldown")
+        _schedule(platform_user_id, record.next_finalize_at())
+
+
+def _schedule(platform_user_id: str, due_at: float, retry: bool = False) -> None:
+    """
+    Have the record looked at again at due_at.
+    
+    Records in Redis are already in the shared due queue (the save put them
+    there at next_finalize_at); this worker only wakes up to claim from it. A
+    retry moves the user in the queue first. Records in memory are scheduled
+    here, per user.
+    """
+    store = get_store()
+    if isinstance(store, ResilientStore) and store.in_redis(platform_user_id):
+        if not retry or store.reschedule(platform_user_id, due_at):
+            FINALIZER.schedule_earlier(DUE_QUEUE, due_at)
+            return
+    FINALIZER.schedule(platform_user_id, due_at)
+
 
+def _finalize_now(record: AggregationRecord) -> None:
+    """Export record now, or retry later if that fails."""
+    user_id = record.platform_user_id
+    store = get_store()
+    if isinstance(store, ResilientStore) and store.in_redis(user_id):
+        # Another worker may be claiming the same lead: go through the queue so one exports it
+        now = time.time()
+        if store.reschedule(user_id, now):
+            FINALIZER.schedule_earlier(DUE_QUEUE, now)
+            return
+    if not _finalize_and_export(record):
+        _schedule(user_id, time.time() + EXPORT_RETRY_SECONDS, retry=True)
 
-def _finalize_and_export(record: AggregationRecord) -> None:
-    """Finalize record and export to Google Sheets."""
+
+def _finalize_claimed(store: ResilientStore) -> float:
+    """
+    Export the leads this worker claimed from the Redis due queue.
+    
+    The claim script hands each due lead to one worker only. A lead moved
+    earlier on purpose after its last message (exported at once, or an export
+    retry) is due at the time it was claimed for; any other lead must still
+    pass should_finalize(), since a DM merged by another worker after the
+    claim makes it not due yet. Returns when to claim again: the next due
+    time in the queue, and at the latest one cooldown from now, so leads saved
+    by a worker that has since gone away still get exported.
+    """
+    while True:
+        claimed = store.claim_due(limit=DUE_CLAIM_BATCH)
+        for user_id, due_at in claimed.items():
+            record = store.get(user_id)
+            if record is None:
+                store.delete(user_id)  # expired or exported meanwhile: drop it from the queue
+                continue
+            if due_at <= record.last_update and not record.should_finalize():
+                store.reschedule(user_id, record.next_finalize_at())
+                continue
+            logger.info(f"[{user_id}] Finalizing idle record (claimed from Redis)")
+            if not _finalize_and_export(record):
+                store.reschedule(user_id, time.time() + EXPORT_RETRY_SECONDS)
+        if len(claimed) < DUE_CLAIM_BATCH:
+            break
+    latest = time.time() + settings.COOLDOWN_SECONDS
+    next_due = store.next_due()
+    return latest if next_due is None else min(next_due, latest)
+
+
+def _finalize_due(platform_user_id: str) -> Optional[float]:
+    """Finalizer callback: export the record if it is due, else return when to look again."""
+    if platform_user_id == DUE_QUEUE:
+        store = get_store()
+        return _finalize_claimed(store) if isinstance(store, ResilientStore) else None
+    record = get_pending_record(platform_user_id)
+    if record is None:
+        return None  # exported or expired meanwhile
+    if not record.should_finalize():
+        return record.next_finalize_at()
+    logger.info(f"[{platform_user_id}] Finalizing idle record")
+    if _finalize_and_export(record):
+        return None
+    return time.time() + EXPORT_RETRY_SECONDS
+
+
+FINALIZER = Finalizer(_finalize_due)
+
+
+def _finalize_and_export(record: AggregationRecord) -> bool:
+    """
+    Finalize record and export to Google Sheets.
+    
+    Returns False only if the export failed (the caller schedules a retry); a
+    user already being exported by another thread is skipped and counts as done.
+    """
+    user_id = record.platform_user_id
+    with _exporting_lock:
+        if user_id in _exporting:
+            # Another thread is exporting this user right now; it schedules any retry
+            logger.debug(f"[{user_id}] Export already in progress")
+            return True
+        _exporting.add(user_id)
     try:
+        # What is exported; the stored record may still change (InMemoryStore hands out the live one)
+        record = record.copy()
+        
         # Convert to CustomerDetails
         customer = record.to_customer_details()
         
@@ -104,13 +271,49 @@ def _finalize_and_export(record: AggregationRecord) -> None:
         
         if success:
             logger.info(f"[{record.platform_user_id}] Successfully exported")
-            # Delete pending record
-            delete_pending_record(record.platform_user_id)
+            # A DM merged since the record was read (another thread or worker) is not
+            # in this export: keep the record for the next one
+            if not get_store().delete_if_unchanged(user_id, record):
+                logger.info(f"[{user_id}] Record changed during export, left for the next one")
+                _schedule(user_id, time.time())
+                return True
+            _remember_settled(user_id, frozenset())
+            FINALIZER.cancel(record.platform_user_id)
+            return True
         else:
             logger.error(f"[{record.platform_user_id}] Export failed, keeping record for retry")
     
     except Exception as e:
         logger.exception(f"[{record.platform_user_id}] Error during finalization: {e}")
+    finally:
+        with _exporting_lock:
+            _exporting.discard(user_id)
+    return False
+
+
+def resume_pending_records() -> int:
+    """
+    Schedule every record already in the in-memory or SQLite store with the
+    finalizer, e.g. leads restored from the state journal or left in the
+    SQLite file by the previous run.
+    
+    With Redis the worker starts claiming from the shared due queue instead,
+    which holds the leads saved before the restart.
+    Returns the number of records scheduled.
+    """
+    store = get_store()
+    if isinstance(store, ResilientStore):
+        FINALIZER.schedule_earlier(DUE_QUEUE, time.time())
+        return 0
+    if isinstance(store, SqliteStore):
+        records = store.records()
+    elif isinstance(store, InMemoryStore):
+        records = [record for _, record in list(store.store.items())]
+    else:
+        return 0
+    for record in records:
+        FINALIZER.schedule(record.platform_user_id, record.next_finalize_at())
+    return len(records)
 
 
 def force_finalize_user(platform_user_id: str) -> bool:
@@ -0,0 +1,27 @@
+"""
+Per-user locking for read-modify-write of pending capture records.
+
+A lock per user would grow with every customer ever seen; one global lock
+would serialize all of them. StripedLock hashes the user ID onto a fixed
+set of locks instead: messages from the same user always serialize, while
+different users only contend when they share a stripe.
+"""
+import threading
+import zlib
+
+
+class StripedLock:
+    """Fixed pool of locks, picked by a stable hash of the key."""
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def lock_for(self, key: str) -> threading.Lock:
+        return self._locks[zlib.crc32(key.encode()) % len(self._locks)]
+
+    def __call__(self, key: str) -> threading.Lock:
+        """Lock for key, for use as `with stripes(user_id): ...`."""
+        return self.lock_for(key)
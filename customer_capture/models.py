@@ -1,26 +1,73 @@
 """
-Pydantic v2 models for customer data validation.
+Customer data models.
+
+Parse results (AddressBlock, ParsedMessage) are plain slotted dataclasses: they are
+built for every inbound DM and most are discarded at low confidence, so they skip
+validation. Pydantic v2 validation happens once, at the CustomerDetails export boundary.
 """
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field
 import pytz
 
+from .address import StreetAddress
+
 
-class AddressBlock(BaseModel):
+@dataclass(slots=True)
+class AddressBlock:
     """Structured address information."""
     street_address: Optional[str] = None  # str., bd., etc.
+    street_parts: Optional[StreetAddress] = None  # street_address split into components
     location: Optional[str] = None  # sat, oraș, raion
     postal_code: Optional[str] = None  # 4-digit MD code
 
 
-class ParsedMessage(BaseModel):
-    """Single message parsing result."""
+@dataclass(slots=True)
+class StepTrace:
+    """What one parser step did (see parser trace mode)."""
+    rule: Optional[str] = None  # rule that produced the value, e.g. "keyword", "two_words"
+    rejected: list[tuple[str, str]] = field(default_factory=list)  # (candidate, reason)
+    elapsed_ns: int = 0
+
+
+@dataclass(slots=True)
+class ParseTrace:
+    """Per-step rules, rejected candidates and timings for one parse."""
+    steps: dict[str, StepTrace] = field(default_factory=dict)
+    total_ns: int = 0
+
+    def step(self, name: str) -> StepTrace:
+        trace = self.steps.get(name)
+        if trace is None:
+            trace = self.steps[name] = StepTrace()
+        return trace
+
+    def to_dict(self, redact: bool = False) -> dict:
+        """Plain dict; redact=True replaces rejected candidates by their length (for logs)."""
+        return {
+            "total_ns": self.total_ns,
+            "steps": {
+                name: {
+                    "rule": t.rule,
+                    "rejected": [(len(c), r) for c, r in t.rejected] if redact else t.rejected,
+                    "elapsed_ns": t.elapsed_ns,
+                }
+                for name, t in self.steps.items()
+            },
+        }
+
+
+@dataclass(slots=True)
+class ParsedMessage:
+    """Single message parsing result (internal, unvalidated)."""
     full_name: Optional[str] = None
     contact_number: Optional[str] = None  # E.164 format
-    address_block: AddressBlock = Field(default_factory=AddressBlock)
-    raw_message: str
-    confidence: float = Field(default=1.0, ge=0.0, le=1.0)  # parsing confidence
+    alternate_numbers: tuple[str, ...] = ()  # other valid numbers in the message, best first
+    address_block: AddressBlock = field(default_factory=AddressBlock)
+    raw_message: str = ""
+    confidence: float = 1.0  # parsing confidence, 0.0-1.0 (see parser.calculate_confidence)
+    trace: Optional[ParseTrace] = None  # only set in trace mode
 
 
 class CustomerDetails(BaseModel):
@@ -28,6 +75,7 @@ class CustomerDetails(BaseModel):
     platform_user_id: str
     full_name: Optional[str] = None
     contact_number: Optional[str] = None  # E.164 +373...
+    alternate_numbers: list[str] = Field(default_factory=list)  # not exported as a sheet column
     adress: Optional[str] = None  # Keep original spelling from requirements
     location: Optional[str] = None
     postal_code: Optional[str] = None
@@ -4,9 +4,15 @@ Extracts: Full Name, Phone, Address, Location, Postal Code.
 """
 import re
 import logging
+import time
+from collections import Counter
 from typing import Optional
-from .models import ParsedMessage, AddressBlock
-from .utils import normalize_phone_md, is_capitalized_token, extract_tokens
+from .address import tokenize_address
+from .models import ParsedMessage, AddressBlock, ParseTrace
+from .postal import is_postal_mismatch, resolve_postal_code
+from .templates import strip_template_lines
+from .trace import end_trace, log_trace, note_rejected, note_rule, should_sample, start_trace, timed
+from .utils import is_capitalized_token, extract_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +23,25 @@ PHONE_PATTERN = re.compile(
     re.IGNORECASE
 )
 
+# === Phone Scanner (all candidates, one pass) ===
+# Optional +373 / 373 / 37 / 0 / (0) prefix, then an 8-digit subscriber number
+# starting with 6 or 7, digits optionally separated by space, dash or dot
+# (never a newline: numbers on adjacent lines stay separate).
+# Guards keep it from starting or ending inside a longer digit run (cards, IBANs).
+PHONE_SCAN_PATTERN = re.compile(
+    r'(?<![\w+])(?<!\d[ \-.])'
+    r'(?:\+? ?373[ \-.]?|37(?=[67])|\(?0\)?[ \-.]?)?'
+    r'([67](?:[ \-.]?\d){7})'
+    r'(?!\d|[ \-.]\d{3})'
+)
+
+# Separators stripped from a scanned subscriber number
+_PHONE_SEPARATORS = str.maketrans('', '', ' -.')
+
+# Words right before a number that mark it as the customer's contact number
+PHONE_CONTEXT_KEYWORDS = ('tel', 'mob', 'nr', 'contact', 'phone', 'тел', 'номер', 'моб')
+PHONE_CONTEXT_WINDOW = 16
+
 # === Postal Code Pattern (MD) ===
 POSTAL_CODE_PATTERN = re.compile(
     r'\b(?:MD-?)?(\d{4})\b',
@@ -106,40 +131,102 @@ DELIVERY_METHOD_KEYWORDS_RU = {
 # Combine all exclusions (lowercase for comparison)
 NAME_EXCLUSIONS = NAME_EXCLUSIONS_RO | NAME_EXCLUSIONS_RU | NAME_EXCLUSIONS_EN | DELIVERY_METHOD_KEYWORDS_RO | DELIVERY_METHOD_KEYWORDS_RU | GREETING_KEYWORDS_RO | PRODUCT_KEYWORDS_RO | SYSTEM_MESSAGE_KEYWORDS_RO
 
+# Words that stop a line from being read as a name (extract_name)
+NAME_CONVERSATION_WORDS = ['vreau', 'vrea', 'poate', 'poți', 'pot', 'să', 'și', 'cu', 'la', 'în', 'pe', 'de', 'pentru', 'că', 'când', 'cum', 'unde', 'ce', 'care']
+NAME_CONVERSATION_PATTERN = re.compile(r'\b(?:' + '|'.join(NAME_CONVERSATION_WORDS) + r')\b')
+
+# Common words that look like capitalized names in bot templates
+NAME_COMMON_WORDS = {'lampa', 'poza', 'poză', 'fotografie', 'imagine', 'produs', 'serviciu', 'comanda', 'comandă', 'elaborare', 'timp', 'zile', 'livrare', 'livrarea', 'curier', 'posta', 'poștă', 'transport', 'expediere', 'trimiteți', 'ajunge', 'primire', 'cash', 'putem', 'livra', 'direct', 'adresa', 'comodă', 'sună', 'înțelege', 'din', 'lei', 'fel', 'chișinău', 'posibilă', 'preluarea', 'comenzii', 'oficiu', 'luni', 'până', 'vineri', 'feredeului', 'intervalul', 'orelor', 'cum', 'vă', 'este', 'mai', 'comod', 'cu', 'sau', 'preluare', 'pentru', 'a', 'avem', 'nevoie', 'câteva', 'date', 'numele', 'prenumele', 'nr', 'contact', 'ne', 'puteți', 'expedia', 'rugăm', 'logoul', 'au', 'fost', 'detectate', 'detaliile', 'clientului', 'salvează', 'salvați'}
+
+# extract_name candidate priority -> trace rule name
+NAME_RULES = {1: "two_words", 2: "multi_word", 3: "single_word"}
+
+# Extractors skipped because the caller already has the field settled (see AggregationRecord.settled_fields)
+_skip_counts: Counter = Counter()
+
+
+def get_skip_counts() -> dict[str, int]:
+    """Per-extractor count of calls skipped for settled fields."""
+    return dict(_skip_counts)
 
-def parse_customer_message(text: str, location_context: Optional[str] = None, specific_location: Optional[str] = None) -> ParsedMessage:
+
+def parse_customer_message(text: str, location_context: Optional[str] = None, specific_location: Optional[str] = None,
+                           settled_fields: frozenset[str] = frozenset(), trace: bool = False) -> ParsedMessage:
     """
     Parse a customer message and extract entities.
     
     Args:
         text: Message text to parse
         location_context: Optional location context from webhook (e.g., "CHISINAU", "BALTI", "OTHER_MD")
+        settled_fields: Fields the pending record already has final values for
+            ("full_name"); their extractors are skipped when no candidate in the
+            message could replace the value on merge (see _settled_name_holds)
+        trace: Record the rule behind each field, rejected candidates and per-step
+            timings on ParsedMessage.trace (see trace.py). A PARSE_TRACE_SAMPLE_RATE
+            share of calls is traced and logged regardless.
     
     Returns ParsedMessage with extracted fields and confidence score.
     """
+    sampled = should_sample()
+    if not (trace or sampled):
+        return _parse_message(text, location_context, specific_location, settled_fields, None)
+    
+    parse_trace, token = start_trace()
+    start = time.perf_counter_ns()
+    try:
+        parsed = _parse_message(text, location_context, specific_location, settled_fields, parse_trace)
+    finally:
+        parse_trace.total_ns = time.perf_counter_ns() - start
+        end_trace(token)
+    parsed.trace = parse_trace
+    if sampled:
+        log_trace(parse_trace, parsed.raw_message, parsed.confidence)
+    return parsed
+
+
+def _parse_message(text: str, location_context: Optional[str], specific_location: Optional[str],
+                   settled_fields: frozenset[str], trace: Optional[ParseTrace]) -> ParsedMessage:
     if not text or not text.strip():
         return ParsedMessage(raw_message=text or "", confidence=0.0)
     
+    raw_text = text
+    
+    # Drop bot-template lines the customer pasted back, keep their filled-in values
+    text = timed(trace, "template_strip", strip_template_lines, text)
+    if not text.strip():
+        logger.debug(f"Skipping echoed bot template: {raw_text[:100]}...")
+        note_rule("template_strip", "echoed_template")
+        return ParsedMessage(raw_message=raw_text, confidence=0.0)
+    
     # Skip parsing if this looks like a system message
-    if is_likely_system_message(text):
+    if timed(trace, "system_check", is_likely_system_message, text):
         logger.debug(f"Skipping system message: {text[:100]}...")
-        return ParsedMessage(raw_message=text, confidence=0.0)
+        note_rule("system_check", "system_message")
+        return ParsedMessage(raw_message=raw_text, confidence=0.0)
     
     # Extract entities (order matters: phone/postal first, then address, then location, then name)
-    phone = extract_phone(text)
-    postal_code = extract_postal_code(text)
-    street_address = extract_street_address(text)  # Extract address before name
-    location = extract_location(text, location_context=location_context, specific_location=specific_location)  # Extract location before name
-    name = extract_name(text)  # Extract name last to avoid conflicts
+    phones = timed(trace, "contact_number", scan_phones, text)
+    phone = phones[0] if phones else None
+    postal_code = timed(trace, "postal_code", extract_postal_code, text)
+    street_address = timed(trace, "street_address", extract_street_address, text)  # Extract address before name
+    location = timed(trace, "location", extract_location, text, location_context=location_context, specific_location=specific_location)  # Extract location before name
+    if "full_name" in settled_fields and _settled_name_holds(text, phone is not None):
+        _skip_counts["extract_name"] += 1
+        note_rule("full_name", "settled")
+        name = None
+    else:
+        name = timed(trace, "full_name", extract_name, text)  # Extract name last to avoid conflicts
     
     # Post-extraction validation: Check if extracted name or location is actually a delivery method keyword
     # This prevents "Poșta", "Curier", etc. from being extracted as customer data
     if name and name.lower() in DELIVERY_METHOD_KEYWORDS_RO:
         logger.debug(f"Rejecting extracted name '{name}' - it's a delivery method keyword")
+        note_rejected("full_name", name, "delivery_keyword")
         name = None
     
     if location and location.lower() in DELIVERY_METHOD_KEYWORDS_RO:
         logger.debug(f"Rejecting extracted location '{location}' - it's a delivery method keyword")
+        note_rejected("location", location, "delivery_keyword")
         location = None
     
     # Calculate confidence
@@ -153,39 +240,83 @@ def parse_customer_message(text: str, location_context: Optional[str] = None, sp
     
     address_block = AddressBlock(
         street_address=street_address,
+        street_parts=timed(trace, "street_parts", tokenize_address, street_address) if street_address else None,
         location=location,
         postal_code=postal_code
     )
+    if postal_code:
+        timed(trace, "postal_lookup", apply_postal_lookup, address_block, text)
     
     return ParsedMessage(
         full_name=name,
         contact_number=phone,
+        alternate_numbers=tuple(phones[1:]),
         address_block=address_block,
-        raw_message=text,
+        raw_message=raw_text,
         confidence=confidence
     )
 
 
+def _settled_name_holds(text: str, has_phone: bool) -> bool:
+    """
+    True if no name extract_name finds in text could replace a settled name on merge.
+    
+    A settled name has two or more words. AggregationRecord.merge replaces it with a
+    name of more words, or of as many words when confidence is above 0.8, which
+    takes a phone in the same message. Names of three or more words only come from
+    the "numele" patterns or from a line of at most 30 characters with three or
+    more alphabetic tokens.
+    """
+    if has_phone or 'numele' in text.lower():
+        return False
+    for line in text.split('\n'):
+        if len(line.strip()) <= 30 and sum(1 for t in extract_tokens(line) if t.isalpha()) >= 3:
+            return False
+    return True
+
+
 def extract_phone(text: str) -> Optional[str]:
-    """Extract and normalize phone number from text."""
-    matches = PHONE_PATTERN.findall(text)
-    
-    for match in matches:
-        normalized = normalize_phone_md(match)
-        if normalized:
-            logger.debug(f"Found phone: {match} -> {normalized}")
-            return normalized
-    
-    # Also try to find phone numbers that might not match the strict pattern
-    # Look for 8-9 digit numbers starting with 06 or 07
-    phone_candidates = re.findall(r'\b0[67]\d{6,7}\b', text)
-    for candidate in phone_candidates:
-        normalized = normalize_phone_md(candidate)
-        if normalized:
-            logger.debug(f"Found phone (fallback): {candidate} -> {normalized}")
-            return normalized
+    """Extract and normalize the best phone number from text."""
+    phones = scan_phones(text)
+    return phones[0] if phones else None
+
+
+def scan_phones(text: str) -> list[str]:
+    """
+    Find every Moldovan phone number in text in a single regex pass.
     
-    return None
+    Each match is normalized inline (separators stripped, +373 prepended) without
+    further regex calls. Returns unique E.164 numbers, best first: numbers preceded
+    by a contact keyword ("tel:", "nr.", "тел") rank above bare ones, then by position.
+    """
+    candidates = []
+    seen = set()
+    lowered = None
+    
+    for match in PHONE_SCAN_PATTERN.finditer(text):
+        digits = match.group(1).translate(_PHONE_SEPARATORS)
+        normalized = f"+373{digits}"
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        
+        start = match.start()
+        if lowered is None:
+            lowered = text.lower()
+        window = lowered[max(0, start - PHONE_CONTEXT_WINDOW):start]
+        has_context = any(kw in window for kw in PHONE_CONTEXT_KEYWORDS)
+        candidates.append((0 if has_context else 1, start, normalized))
+    
+    if not candidates:
+        return []
+    
+    candidates.sort()
+    phones = [normalized for _, _, normalized in candidates]
+    logger.debug(f"Found phones: {phones}")
+    note_rule("contact_number", "contact_keyword" if candidates[0][0] == 0 else "first_in_text")
+    for alternate in phones[1:]:
+        note_rejected("contact_number", alternate, "alternate")
+    return phones
 
 
 def extract_postal_code(text: str) -> Optional[str]:
@@ -194,10 +325,36 @@ def extract_postal_code(text: str) -> Optional[str]:
     if match:
         code = match.group(1)  # Extract just the digits
         logger.debug(f"Found postal code: {code}")
+        note_rule("postal_code", "md_prefix" if match.group(0)[0] in 'mM' else "four_digits")
         return code
     return None
 
 
+def apply_postal_lookup(address_block: AddressBlock, text: str) -> None:
+    """
+    Fill or cross-check location from the postal code table.
+    
+    Runs after confidence is computed: a location derived from the code adds no
+    evidence that the message carries customer data. A code whose area the
+    message contradicts fills nothing; which of the two is wrong is not known,
+    so the mismatch is only reported.
+    """
+    area = resolve_postal_code(address_block.postal_code, text, address_block.location)
+    if area is None:
+        return
+    if is_postal_mismatch(area, text):
+        note_rejected("postal_lookup", area.name, "names_other_area")
+        logger.warning(
+            f"Postal code {address_block.postal_code} belongs to {area.name}, "
+            f"but the message names another area"
+        )
+        return
+    if address_block.location is None:
+        address_block.location = area.label
+        logger.debug(f"Location from postal code {address_block.postal_code}: {area.label}")
+        note_rule("location", "postal_table")
+
+
 def extract_name(text: str) -> Optional[str]:
     """
     Extract full name from text.
@@ -214,6 +371,7 @@ def extract_name(text: str) -> Optional[str]:
     # Skip if text contains product keywords (very conservative)
     if has_product_keywords(text):
         logger.debug(f"Skipping text with product keywords: {text[:50]}...")
+        note_rejected("full_name", text, "product_keywords")
         return None
     
     # Handle "Numele meu este <name>" pattern (RO)
@@ -227,6 +385,7 @@ def extract_name(text: str) -> Optional[str]:
         if clean_tokens:
             name = ' '.join(clean_tokens)
             logger.debug(f"Found name via 'Numele meu este' pattern: {name}")
+            note_rule("full_name", "numele_meu_este")
             return name
     
     # Handle "Numele <name>" pattern (RO)
@@ -240,6 +399,7 @@ def extract_name(text: str) -> Optional[str]:
         if clean_tokens:
             name = ' '.join(clean_tokens)
             logger.debug(f"Found name via 'Numele' pattern: {name}")
+            note_rule("full_name", "numele")
             return name
     
     # Split text into lines for better segmentation
@@ -251,43 +411,49 @@ def extract_name(text: str) -> Optional[str]:
     for line in lines:
         # Skip lines with clear address/location keywords
         if has_address_keywords(line) or has_location_keywords(line):
+            note_rejected("full_name", line, "address_or_location")
             continue
         
         # Skip lines with delivery method keywords
         if has_delivery_method_keywords(line):
             logger.debug(f"Skipping delivery method line: {line}")
+            note_rejected("full_name", line, "delivery_keyword")
             continue
         
         # Skip lines with greeting keywords
         if has_greeting_keywords(line):
             logger.debug(f"Skipping greeting line: {line}")
+            note_rejected("full_name", line, "greeting")
             continue
         
         # Skip lines with product keywords
         if has_product_keywords(line):
             logger.debug(f"Skipping product line: {line}")
+            note_rejected("full_name", line, "product_keywords")
             continue
         
         # Skip lines with system message keywords
         if has_system_message_keywords(line):
             logger.debug(f"Skipping system message line: {line}")
+            note_rejected("full_name", line, "system_keywords")
             continue
         
         # Skip lines that look like locations (comma-separated capitalized words)
         if ',' in line and len([t for t in line.split(',') if t.strip() and t.strip()[0].isupper()]) >= 2:
             logger.debug(f"Skipping location-like line: {line}")
+            note_rejected("full_name", line, "location_like")
             continue
         
         # Skip lines that are too long (likely conversation text)
         if len(line.strip()) > 30:
             logger.debug(f"Skipping long line (likely conversation): {line}")
+            note_rejected("full_name", line, "too_long")
             continue
         
         # Skip lines with common conversation words (use word boundaries to avoid false positives)
-        conversation_words = ['vreau', 'vrea', 'poate', 'poți', 'pot', 'să', 'și', 'cu', 'la', 'în', 'pe', 'de', 'pentru', 'că', 'când', 'cum', 'unde', 'ce', 'care']
-        conversation_pattern = r'\b(?:' + '|'.join(conversation_words) + r')\b'
-        if re.search(conversation_pattern, line.lower()):
+        if NAME_CONVERSATION_PATTERN.search(line.lower()):
             logger.debug(f"Skipping conversation line: {line}")
+            note_rejected("full_name", line, "conversation")
             continue
         
         # Extract word sequences
@@ -310,18 +476,20 @@ def extract_name(text: str) -> Optional[str]:
             # Check if both words start with capital letters
             if first_word[0].isupper() and second_word[0].isupper():
                 # Check if they're not common words that might be mistaken for names
-                common_words = {'lampa', 'poza', 'poză', 'fotografie', 'imagine', 'produs', 'serviciu', 'comanda', 'comandă', 'elaborare', 'timp', 'zile', 'livrare', 'livrarea', 'curier', 'posta', 'poștă', 'transport', 'expediere', 'trimiteți', 'ajunge', 'primire', 'cash', 'putem', 'livra', 'direct', 'adresa', 'comodă', 'sună', 'înțelege', 'din', 'lei', 'fel', 'chișinău', 'posibilă', 'preluarea', 'comenzii', 'oficiu', 'luni', 'până', 'vineri', 'feredeului', 'intervalul', 'orelor', 'cum', 'vă', 'este', 'mai', 'comod', 'cu', 'sau', 'preluare', 'pentru', 'a', 'avem', 'nevoie', 'câteva', 'date', 'numele', 'prenumele', 'nr', 'contact', 'ne', 'puteți', 'expedia', 'rugăm', 'logoul', 'au', 'fost', 'detectate', 'detaliile', 'clientului', 'salvează', 'salvați'}
                 
-                if first_word.lower() not in common_words and second_word.lower() not in common_words:
+                if first_word.lower() not in NAME_COMMON_WORDS and second_word.lower() not in NAME_COMMON_WORDS:
                     name_candidates.append((' '.join(clean_tokens), 1))
+                else:
+                    note_rejected("full_name", line, "common_word")
         elif len(clean_tokens) >= 3 and all(len(t) >= 3 for t in clean_tokens):
             # Multi-word name - high priority, but be more careful
             # Only accept if all words are capitalized and not common words
             if all(t[0].isupper() for t in clean_tokens):
-                common_words = {'lampa', 'poza', 'poză', 'fotografie', 'imagine', 'produs', 'serviciu', 'comanda', 'comandă', 'elaborare', 'timp', 'zile', 'livrare', 'livrarea', 'curier', 'posta', 'poștă', 'transport', 'expediere', 'trimiteți', 'ajunge', 'primire', 'cash', 'putem', 'livra', 'direct', 'adresa', 'comodă', 'sună', 'înțelege', 'din', 'lei', 'fel', 'chișinău', 'posibilă', 'preluarea', 'comenzii', 'oficiu', 'luni', 'până', 'vineri', 'feredeului', 'intervalul', 'orelor', 'cum', 'vă', 'este', 'mai', 'comod', 'cu', 'sau', 'preluare', 'pentru', 'a', 'avem', 'nevoie', 'câteva', 'date', 'numele', 'prenumele', 'nr', 'contact', 'ne', 'puteți', 'expedia', 'rugăm', 'logoul', 'au', 'fost', 'detectate', 'detaliile', 'clientului', 'salvează', 'salvați'}
                 
-                if not any(t.lower() in common_words for t in clean_tokens):
+                if not any(t.lower() in NAME_COMMON_WORDS for t in clean_tokens):
                     name_candidates.append((' '.join(clean_tokens), 2))
+                else:
+                    note_rejected("full_name", line, "common_word")
         elif len(clean_tokens) == 1 and len(clean_tokens[0]) >= 4:  # Increased minimum length
             # Single word name - lower priority (avoid street names and common names)
             # Only accept if it's not a common street/address word and is long enough
@@ -331,12 +499,17 @@ def extract_name(text: str) -> Optional[str]:
             if (clean_tokens[0].lower() not in street_words and 
                 clean_tokens[0].lower() not in common_names):
                 name_candidates.append((clean_tokens[0], 3))
+            else:
+                note_rejected("full_name", clean_tokens[0], "street_or_common_name")
     
     # Return the best candidate (shortest priority number)
     if name_candidates:
         name_candidates.sort(key=lambda x: x[1])  # Sort by priority
-        best_name = name_candidates[0][0]
+        best_name, priority = name_candidates[0]
         logger.debug(f"Found name: {best_name}")
+        note_rule("full_name", NAME_RULES[priority])
+        for candidate, _ in name_candidates[1:]:
+            note_rejected("full_name", candidate, "lower_priority")
         return best_name
     
     return None
@@ -368,6 +541,7 @@ def extract_street_address(text: str) -> Optional[str]:
             
             if clean:
                 logger.debug(f"Found street address (with keywords): {clean}")
+                note_rule("street_address", "keyword")
                 return clean
     
     # Fallback: Look for lines that look like street addresses (word + number)
@@ -384,6 +558,7 @@ def extract_street_address(text: str) -> Optional[str]:
             clean = clean.strip()
             if clean and len(clean) > 3:  # At least 3 characters
                 logger.debug(f"Found street address (fallback): {clean}")
+                note_rule("street_address", "word_number")
                 return clean
     
     return None
@@ -406,15 +581,18 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
         if location_context == "CHISINAU":
             context_location = "Chișinău"
             logger.debug(f"Using location context: {context_location}")
+            note_rule("location", "context")
             return context_location
         elif location_context == "BALTI":
             context_location = "Bălți"
             logger.debug(f"Using location context: {context_location}")
+            note_rule("location", "context")
             return context_location
         elif location_context == "OTHER_MD":
             # For other locations, use the specific location if available
             if specific_location:
                 logger.debug(f"Using specific location: {specific_location}")
+                note_rule("location", "specific_location")
                 return specific_location
             else:
                 # For other locations, we still need to extract from text
@@ -424,6 +602,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
         else:
             # Unknown location context, use as-is
             logger.debug(f"Using location context: {location_context}")
+            note_rule("location", "context")
             return location_context
     
     # Special case: Look for "Chișinău" as a direct response (high priority)
@@ -436,6 +615,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
     for pattern in chisinau_patterns:
         if re.search(pattern, text, re.IGNORECASE):
             logger.debug(f"Found Chișinău in text: {text}")
+            note_rule("location", "chisinau_pattern")
             return "Chișinău"
     
     all_keywords = LOCATION_KEYWORDS_RO + LOCATION_KEYWORDS_RU
@@ -452,11 +632,13 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
         # Skip if this line has delivery method keywords (highest priority)
         if has_delivery_method_keywords(line):
             logger.debug(f"Skipping delivery method line for location: {line}")
+            note_rejected("location", line, "delivery_keyword")
             continue
         
         # Skip if this line has greeting keywords
         if has_greeting_keywords(line):
             logger.debug(f"Skipping greeting line for location: {line}")
+            note_rejected("location", line, "greeting")
             continue
             
         # Skip if this line has street/address keywords (prioritize street address)
@@ -476,6 +658,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
             
             if clean:
                 logger.debug(f"Found location: {clean}")
+                note_rule("location", "keyword")
                 return clean
         
         # Fallback heuristic: line with postal code + comma-separated capitalized words
@@ -497,6 +680,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
     
     if fallback_candidate:
         logger.debug(f"Found location (fallback): {fallback_candidate}")
+        note_rule("location", "postal_with_commas")
         return fallback_candidate
     
     # Final fallback: Look for capitalized words that might be location names
@@ -533,6 +717,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
             name_patterns = ['Alexandru', 'Alexandru', 'Maria', 'Ion', 'Ana', 'Cristina', 'Mihai', 'Andrei', 'Elena', 'Vlad', 'Diana', 'Radu', 'Ioana', 'Bogdan', 'Alina', 'Catalin', 'Roxana', 'Florin', 'Gabriela', 'Adrian', 'Filip', 'Vasile', 'Nicolae', 'Gheorghe', 'Constantin', 'Petru', 'Alexandru', 'Viorel', 'Iurie', 'Ion', 'Dumitru', 'Valeriu', 'Sergei', 'Vladimir', 'Igor', 'Oleg', 'Andrei', 'Dmitri', 'Mikhail']
             if capitalized[0] in name_patterns:
                 logger.debug(f"Skipping likely name: {capitalized[0]}")
+                note_rejected("location", capitalized[0], "common_name")
                 continue
         
         # Consider single capitalized words that are longer than 3 characters
@@ -544,6 +729,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
             clean = clean.strip()
             if clean and len(clean) > 3:
                 logger.debug(f"Found location (final fallback): {clean}")
+                note_rule("location", "capitalized_word")
                 return clean
     
     # If we have location context but couldn't extract specific location from this message,
@@ -551,6 +737,7 @@ def extract_location(text: str, location_context: Optional[str] = None, specific
     # we should return a generic indication that location was mentioned earlier
     if has_location_context:
         logger.debug("Location context indicates user mentioned location earlier, but couldn't extract specific location from current message")
+        note_rule("location", "other_md_context")
         return "Moldova (other location)"
     
     return None
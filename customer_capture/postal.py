@@ -0,0 +1,212 @@
+"""
+Moldovan postal code (MD-xxxx) to municipality/raion lookup.
+
+Poșta Moldovei assigns codes in blocks of one hundred per municipality or
+raion (MD-20xx Chișinău, MD-31xx Bălți, MD-71xx Ocnița, ...). The table below
+is bundled as code ranges and expanded at import into a 10,000-entry byte
+array indexed by the numeric code, so a lookup is a single array read.
+Finer ranges (individual settlements) can be appended to POSTAL_RANGES;
+later entries override earlier ones.
+"""
+import re
+import unicodedata
+from array import array
+from typing import NamedTuple, Optional
+
+
+class PostalArea(NamedTuple):
+    """Area a postal code belongs to."""
+    name: str
+    kind: str  # "municipiu" or "raion"
+
+    @property
+    def label(self) -> str:
+        """Value used to fill Location when the message names no place."""
+        return self.name if self.kind == "municipiu" else f"r. {self.name}"
+
+
+# (first_code, last_code, name, kind)
+POSTAL_RANGES = [
+    (2000, 2099, "Chișinău", "municipiu"),
+    (3000, 3099, "Soroca", "raion"),
+    (3100, 3199, "Bălți", "municipiu"),
+    (3200, 3299, "Bender", "municipiu"),
+    (3300, 3399, "Tiraspol", "municipiu"),
+    (3400, 3499, "Hîncești", "raion"),
+    (3500, 3599, "Orhei", "raion"),
+    (3600, 3699, "Ungheni", "raion"),
+    (3700, 3799, "Strășeni", "raion"),
+    (3800, 3899, "Comrat", "raion"),
+    (3900, 3999, "Cahul", "raion"),
+    (4100, 4199, "Cimișlia", "raion"),
+    (4200, 4299, "Ștefan Vodă", "raion"),
+    (4300, 4399, "Căușeni", "raion"),
+    (4400, 4499, "Călărași", "raion"),
+    (4600, 4699, "Edineț", "raion"),
+    (4700, 4799, "Briceni", "raion"),
+    (4800, 4899, "Criuleni", "raion"),
+    (4900, 4999, "Glodeni", "raion"),
+    (5000, 5099, "Florești", "raion"),
+    (5100, 5199, "Dondușeni", "raion"),
+    (5200, 5299, "Drochia", "raion"),
+    (5300, 5399, "Vulcănești", "raion"),
+    (5400, 5499, "Rezina", "raion"),
+    (5500, 5599, "Rîbnița", "raion"),
+    (5600, 5699, "Rîșcani", "raion"),
+    (5800, 5899, "Telenești", "raion"),
+    (5900, 5999, "Fălești", "raion"),
+    (6100, 6199, "Ceadîr-Lunga", "raion"),
+    (6200, 6299, "Sîngerei", "raion"),
+    (6300, 6399, "Leova", "raion"),
+    (6400, 6499, "Nisporeni", "raion"),
+    (6500, 6599, "Anenii Noi", "raion"),
+    (6700, 6799, "Basarabeasca", "raion"),
+    (6800, 6899, "Ialoveni", "raion"),
+    (7100, 7199, "Ocnița", "raion"),
+    (7200, 7299, "Șoldănești", "raion"),
+    (7300, 7399, "Cantemir", "raion"),
+    (7400, 7499, "Taraclia", "raion"),
+]
+
+# Codes in this block are indistinguishable from years ("în 2025"); require the MD prefix
+YEAR_LIKE_RANGE = range(2000, 2100)
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics (ș -> s, ă -> a) for comparisons."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _build_table() -> tuple[array, list[PostalArea]]:
+    areas: list[PostalArea] = []
+    index: dict[PostalArea, int] = {}
+    table = array('B', bytes(10000))  # 0 = unknown
+    for first, last, name, kind in POSTAL_RANGES:
+        area = PostalArea(name, kind)
+        if area not in index:
+            areas.append(area)
+            index[area] = len(areas)  # 1-based; 0 stays "unknown"
+        for code in range(first, last + 1):
+            table[code] = index[area]
+    return table, areas
+
+
+_CODE_TABLE, _AREAS = _build_table()
+
+# One pattern for every area name, matched against folded text
+_AREA_NAME_PATTERN = re.compile(
+    r'\b(' + '|'.join(sorted({re.escape(fold(a.name)) for a in _AREAS}, key=len, reverse=True)) + r')\b'
+)
+
+
+# Street type markers (address.STREET_TYPES, folded; address imports this module).
+# An area name right after one is a street ("str. Orhei"), not the place.
+_STREET_MARKER_BEFORE = re.compile(
+    r'\b(?:str|strada|strad|bd|bul|bulevardul|sos|soseaua|ul|ул|улица|бул|бульвар|пр|проспект|пер|переулок|шос|шоссе)'
+    r'\.?\s*$'
+)
+
+# A place written with its settlement prefix ("s. Sauca", "or. Orhei", "с. Ларга"), ending right there
+_PREFIXED_PLACE_BEFORE = re.compile(
+    r'\b(?:s|sat|satul|com|comuna|or|oras|orasul|mun|r|raion|raionul|с|село|г|город|пгт)\.?\s+'
+    r'[^\W\d_]+(?:[- ][^\W\d_]+)?$'
+)
+
+# Phrases that introduce a postal code, matched against folded text right before the number
+_POSTAL_KEYWORD_BEFORE = re.compile(
+    r'(?:\bcod(?:ul)?\s+postal|\bc\.\s?p\.|\bindex|\bиндекс|\bпочтовыи\s+(?:индекс|код))\W{0,3}$'
+)
+
+# A number followed by one of these is an amount, not a code ("3500 lei")
+_CURRENCY_AFTER = re.compile(r'\s*(?:lei|leu|mdl|euro|eur|usd|лей|леи|леев|€|\$)', re.IGNORECASE)
+
+_AREA_NAMES = sorted({fold(a.name) for a in _AREAS}, key=len, reverse=True)
+
+
+def lookup_postal_code(code: str) -> Optional[PostalArea]:
+    """Return the area for a 4-digit postal code, or None if unknown."""
+    if len(code) != 4 or not code.isdigit():
+        return None
+    slot = _CODE_TABLE[int(code)]
+    return _AREAS[slot - 1] if slot else None
+
+
+def _next_to_place(folded: str, start: int, end: int, places: list[str]) -> bool:
+    """True if folded[start:end] is directly preceded or followed by one of places (not a street name)."""
+    before = folded[:start].rstrip(' ,;')
+    after = folded[end:].lstrip(' ,;')
+    if _PREFIXED_PLACE_BEFORE.search(before):
+        return True
+    for place in places:
+        if before.endswith(place) and not (len(before) > len(place) and before[-len(place) - 1].isalnum()):
+            if not _STREET_MARKER_BEFORE.search(before[:-len(place)]):
+                return True
+        if after.startswith(place) and not (len(after) > len(place) and after[len(place)].isalnum()):
+            return True
+    return False
+
+
+def has_postal_context(code: str, text: str, location: Optional[str] = None) -> bool:
+    """
+    True if code reads as a postal code in text, not as any 4-digit number.
+
+    That is: written with the MD prefix, introduced as one ("cod poștal",
+    "индекс"), or right next to a place: location, a known municipality/raion
+    or a name with a settlement prefix ("Orhei 3500", "s. Sauca, 7133"). A
+    number followed by a currency ("3500 lei") never is.
+    """
+    folded = fold(text)
+    places = _AREA_NAMES
+    if location:
+        # "s. Sauca" -> "sauca": the place name without its settlement prefix
+        name = re.sub(r'^\w{1,4}\.\s*', '', fold(location)).strip()
+        if name:
+            places = [name, *places]
+    for match in re.finditer(r'\b(md-?)?' + code + r'\b', folded):
+        if match.group(1):
+            return True
+        if _CURRENCY_AFTER.match(folded, match.end()):
+            continue
+        if _POSTAL_KEYWORD_BEFORE.search(folded, 0, match.start()):
+            return True
+        if _next_to_place(folded, match.start(), match.end(), places):
+            return True
+    return False
+
+
+def resolve_postal_code(code: str, text: str, location: Optional[str] = None) -> Optional[PostalArea]:
+    """
+    Look up a postal code found in text.
+
+    The number must read as a postal code (has_postal_context); codes that
+    could be years (MD-20xx) only count when written with the MD prefix.
+    """
+    area = lookup_postal_code(code)
+    if area is None:
+        return None
+    if int(code) in YEAR_LIKE_RANGE and not re.search(r'\bMD-?' + code + r'\b', text, re.IGNORECASE):
+        return None
+    if not has_postal_context(code, text, location):
+        return None
+    return area
+
+
+def mentioned_areas(text: str) -> set[str]:
+    """Folded names of known municipalities/raions mentioned in text, street names excepted."""
+    folded = fold(text)
+    return {
+        match.group(1) for match in _AREA_NAME_PATTERN.finditer(folded)
+        if not _STREET_MARKER_BEFORE.search(folded, 0, match.start())
+    }
+
+
+def is_postal_mismatch(area: PostalArea, text: str) -> bool:
+    """
+    True if the message names other known areas but not the one the code belongs to.
+
+    Village names alone are not in the table, so "Sauca, 7133" is not a mismatch;
+    "Bălți, MD-2001" is.
+    """
+    named = mentioned_areas(text)
+    return bool(named) and fold(area.name) not in named
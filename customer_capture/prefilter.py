@@ -0,0 +1,71 @@
+"""
+Cheap prefilter in front of the capture parser.
+
+Most DMs ("Bună", "Mulțumesc", "Cât costă?") carry no lead data. Every field the
+parser can score needs one of a few cheap signals: a digit (phone, postal code,
+house number), an address keyword or "numele", or a short line shaped like a
+name. has_candidate_data computes those signals with one tokenizer pass per line
+and set lookups, and only messages that show one go on to parse_customer_message.
+
+The rules are a superset of what extract_name/extract_street_address accept, so
+the filter should only drop messages the parser would drop anyway; run
+benchmarks/bench_prefilter.py to check precision/recall after changing either side.
+"""
+import re
+from collections import Counter
+
+from .parser import NAME_CONVERSATION_PATTERN, NAME_EXCLUSIONS
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+DIGIT_PATTERN = re.compile(r'\d')
+
+# Tokens (lowercase) that make extract_street_address or the "Numele" rule fire
+PREFILTER_KEYWORDS = frozenset({
+    'str', 'strada', 'bd', 'bulevardul', 'bloc', 'ap', 'apartament', 'sc', 'scara',
+    'nr', 'numărul', 'ул', 'улица', 'дом', 'д', 'кв', 'квартира', 'подъезд',
+    'numele',
+})
+
+# extract_name ignores longer lines as conversation text
+NAME_LINE_MAX_LENGTH = 30
+
+_stats: Counter = Counter()
+
+
+def _has_name_shape(segment: str) -> bool:
+    """Same token-count/capitalization rules as extract_name, without the word lists."""
+    segment = segment.strip()
+    if not segment or len(segment) > NAME_LINE_MAX_LENGTH:
+        return False
+    if NAME_CONVERSATION_PATTERN.search(segment.lower()):
+        return False
+    clean = [t for t in TOKEN_PATTERN.findall(segment) if t.isalpha() and t.lower() not in NAME_EXCLUSIONS]
+    if len(clean) == 1:
+        return len(clean[0]) >= 4
+    if len(clean) >= 2:
+        return all(len(t) >= 3 and t[0].isupper() for t in clean)
+    return False
+
+
+def has_candidate_data(text: str) -> bool:
+    """True if text may contain name, phone or address data worth parsing."""
+    if DIGIT_PATTERN.search(text):
+        _stats["passed"] += 1
+        return True
+
+    for line in text.split('\n'):
+        if not PREFILTER_KEYWORDS.isdisjoint(TOKEN_PATTERN.findall(line.lower())):
+            _stats["passed"] += 1
+            return True
+        # Long "Label: value" lines (pasted forms) are cut down to the value by template stripping
+        if _has_name_shape(line) or (':' in line and _has_name_shape(line.rsplit(':', 1)[1])):
+            _stats["passed"] += 1
+            return True
+
+    _stats["rejected"] += 1
+    return False
+
+
+def get_prefilter_stats() -> dict[str, int]:
+    """Messages passed to / kept away from the parser since startup."""
+    return {"passed": _stats["passed"], "rejected": _stats["rejected"]}
@@ -0,0 +1,96 @@
+"""
+Circuit breaker for calls to an external dependency (Redis).
+
+closed     calls go through; `failure_threshold` consecutive failures open it
+open       calls are refused at once (no socket timeout to wait out) until
+           `reset_timeout` seconds have passed
+half_open  one trial call is let through: success closes the breaker,
+           failure opens it for another reset_timeout
+"""
+import threading
+import time
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with latency and outcome counters."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        # Counters
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.opened = 0
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """True if a call may go through now; counts it as short-circuited otherwise."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if now is None:
+                now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, latency_ms: float = 0.0) -> None:
+        with self._lock:
+            self.successes += 1
+            self.latency_total_ms += latency_ms
+            self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._trial_running = False
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic() if now is None else now
+            self._trial_running = False
+
+    def release_trial(self) -> None:
+        """End a call that neither succeeded nor failed; frees the half-open trial slot."""
+        with self._lock:
+            self._trial_running = False
+    
+    def trip(self, now: Optional[float] = None) -> None:
+        """Open the breaker right away (e.g. the dependency was unreachable at startup)."""
+        with self._lock:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic() if now is None else now
+            self._trial_running = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "opened": self.opened,
+            "latency_mean_ms": round(self.latency_total_ms / self.successes, 3) if self.successes else 0.0,
+            "latency_max_ms": round(self.latency_max_ms, 3),
+        }
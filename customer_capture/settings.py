@@ -12,6 +12,26 @@ class Settings:
     def _get_redis_url(cls) -> Optional[str]:
         return os.getenv("REDIS_URL")
     
+    @classmethod
+    def _get_redis_socket_timeout(cls) -> float:
+        return float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+    
+    @classmethod
+    def _get_redis_max_connections(cls) -> int:
+        return int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+    
+    @classmethod
+    def _get_redis_breaker_threshold(cls) -> int:
+        return int(os.getenv("REDIS_BREAKER_THRESHOLD", "3"))
+    
+    @classmethod
+    def _get_redis_breaker_reset_seconds(cls) -> float:
+        return float(os.getenv("REDIS_BREAKER_RESET_SECONDS", "10"))
+    
+    @classmethod
+    def _get_capture_sqlite_path(cls) -> Optional[str]:
+        return os.getenv("CAPTURE_SQLITE_PATH")
+    
     @classmethod
     def _get_cooldown_seconds(cls) -> int:
         return int(os.getenv("COOLDOWN_SECONDS", "90"))
@@ -20,6 +40,10 @@ class Settings:
     def _get_finalize_after_both_seconds(cls) -> int:
         return int(os.getenv("FINALIZE_AFTER_BOTH_SECONDS", "20"))
     
+    @classmethod
+    def _get_cleanup_interval_seconds(cls) -> int:
+        return int(os.getenv("CLEANUP_INTERVAL_SECONDS", "30"))
+    
     @classmethod
     def _get_gsheet_spreadsheet_id(cls) -> Optional[str]:
         # Support both old and new variable names
@@ -44,11 +68,39 @@ class Settings:
             return False
         return os.getenv("DRY_RUN", "0") == "1"
     
+    @classmethod
+    def _get_parse_trace_sample_rate(cls) -> float:
+        return float(os.getenv("PARSE_TRACE_SAMPLE_RATE", "0"))
+    
+    @classmethod
+    def _get_compact_raw_messages(cls) -> bool:
+        return os.getenv("COMPACT_RAW_MESSAGES", "").lower() in ("true", "1", "yes")
+    
     # Properties that read from environment each time
     @property
     def REDIS_URL(self) -> Optional[str]:
         return self._get_redis_url()
     
+    @property
+    def REDIS_SOCKET_TIMEOUT(self) -> float:
+        return self._get_redis_socket_timeout()
+    
+    @property
+    def REDIS_MAX_CONNECTIONS(self) -> int:
+        return self._get_redis_max_connections()
+    
+    @property
+    def REDIS_BREAKER_THRESHOLD(self) -> int:
+        return self._get_redis_breaker_threshold()
+    
+    @property
+    def REDIS_BREAKER_RESET_SECONDS(self) -> float:
+        return self._get_redis_breaker_reset_seconds()
+    
+    @property
+    def CAPTURE_SQLITE_PATH(self) -> Optional[str]:
+        return self._get_capture_sqlite_path()
+    
     @property
     def COOLDOWN_SECONDS(self) -> int:
         return self._get_cooldown_seconds()
@@ -57,6 +109,10 @@ class Settings:
     def FINALIZE_AFTER_BOTH_SECONDS(self) -> int:
         return self._get_finalize_after_both_seconds()
     
+    @property
+    def CLEANUP_INTERVAL_SECONDS(self) -> int:
+        return self._get_cleanup_interval_seconds()
+    
     @property
     def GSHEET_SPREADSHEET_ID(self) -> Optional[str]:
         return self._get_gsheet_spreadsheet_id()
@@ -73,6 +129,14 @@ class Settings:
     def DRY_RUN(self) -> bool:
         return self._get_dry_run()
     
+    @property
+    def PARSE_TRACE_SAMPLE_RATE(self) -> float:
+        return self._get_parse_trace_sample_rate()
+    
+    @property
+    def COMPACT_RAW_MESSAGES(self) -> bool:
+        return self._get_compact_raw_messages()
+    
     def validate(self) -> None:
         """Validate required settings for production use."""
         if not self.DRY_RUN:
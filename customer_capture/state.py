@@ -1,33 +1,184 @@
 """
 Aggregation store for customer data per platform_user_id.
-Supports Redis (if REDIS_URL set) with in-memory fallback.
+Supports Redis (if REDIS_URL set) with in-memory fallback: ResilientStore
+switches to memory while a circuit breaker says Redis is down and goes back
+to Redis once it answers again. Without Redis, CAPTURE_SQLITE_PATH keeps the
+records in a local SQLite file (SqliteStore) so they survive restarts.
+
+In Redis a record is a hash of its scalar fields plus a capped list of raw
+messages, so a DM only writes the fields its merge changed.
 """
+import atexit
 import json
 import logging
+import math
+import sqlite3
+import threading
 import time
+import zlib
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Optional, Dict
-from .models import CustomerDetails, ParsedMessage
+from typing import Iterable, Optional
+from .address import amend_address, tokenize_address
+from .models import AddressBlock, CustomerDetails, ParsedMessage
+from .locking import StripedLock
+from .resilience import OPEN, CircuitBreaker
 from .settings import settings
 from .utils import generate_record_id
 
 logger = logging.getLogger(__name__)
 
+MAX_ALTERNATE_NUMBERS = 3
+MAX_RAW_MESSAGES = 10
+# Oldest raw messages are dropped past this many characters (the newest one is always kept)
+MAX_RAW_CHARS = 4000
+# Joins a record's raw messages into one string; removed from message text
+_RAW_SEPARATOR = "\x1e"
+
+
+def _stamp() -> int:
+    """Now in whole epoch seconds, rounded up: deadlines counted from it never come early."""
+    return math.ceil(time.time())
+
+
+def _raw_hash(text: str) -> int:
+    # str hashes are cached on the string; the array is rebuilt after a load, never stored
+    return hash(text) & 0xFFFFFFFF
+
+# Optimistic update attempts (WATCH/MULTI) before RedisStore.update gives up
+UPDATE_RETRIES = 10
+
+# Sorted set of pending user IDs scored by next_finalize_at(), shared by all workers
+DUE_QUEUE_KEY = "customer_capture:due"
+# A claimed lead is handed to another worker if not exported or rescheduled by then
+DUE_CLAIM_LEASE_SECONDS = 120
+
+# KEYS[1] = due set; ARGV = now, lease until, limit. Moves due members to the lease
+# time and returns them with the time they were due (id, score, id, score, ...),
+# so each due lead goes to exactly one caller.
+_CLAIM_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[3])
+for i = 1, #due, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[2], due[i])
+end
+return due
+"""
+
+# SqliteStore commits its open transaction after this many writes or this long
+SQLITE_COMMIT_BATCH = 64
+SQLITE_COMMIT_INTERVAL_SECONDS = 0.05
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS capture_records ("
+    "user_id TEXT PRIMARY KEY, last_update INTEGER NOT NULL, data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS capture_records_last_update ON capture_records (last_update)",
+)
+_SQL_GET = "SELECT data FROM capture_records WHERE user_id = ?"
+_SQL_SET = "INSERT OR REPLACE INTO capture_records (user_id, last_update, data) VALUES (?, ?, ?)"
+_SQL_DELETE = "DELETE FROM capture_records WHERE user_id = ?"
+_SQL_CLEANUP = "DELETE FROM capture_records WHERE last_update < ?"
+_SQL_ALL = "SELECT data FROM capture_records ORDER BY last_update"
+_SQL_COUNT = "SELECT COUNT(*) FROM capture_records"
+
+# Rule 3 of should_finalize: name + phone and this long since the last message
+MIN_DATA_IDLE_SECONDS = 30
+
+SETTLED_NAME = frozenset({"full_name"})
+
 
 class AggregationRecord:
-    """Pending customer record being aggregated."""
+    """
+    Pending customer record being aggregated.
+    
+    A campaign can leave tens of thousands of these pending in one worker, so
+    the layout is compact: slots instead of a __dict__, integer epoch seconds
+    (rounded up, so cooldowns are never cut short) instead of a datetime and
+    floats, and the raw messages joined into one string with a hash per
+    message for dedup (see raw_messages).
+    """
+    
+    __slots__ = (
+        'platform_user_id', 'full_name', 'contact_number', 'alternate_numbers',
+        'adress', 'location', 'postal_code', '_raw_text', '_raw_hashes',
+        'created_ts', 'last_update', 'last_field_update', '_stored', '_stored_raw',
+    )
     
     def __init__(self, platform_user_id: str):
+        now = _stamp()
         self.platform_user_id = platform_user_id
         self.full_name: Optional[str] = None
         self.contact_number: Optional[str] = None
+        self.alternate_numbers: tuple[str, ...] = ()  # other numbers the customer gave, best first
         self.adress: Optional[str] = None
         self.location: Optional[str] = None
         self.postal_code: Optional[str] = None
-        self.raw_messages: list[str] = []
-        self.created_at: datetime = datetime.now(timezone.utc)
-        self.last_update: float = time.time()
-        self.last_field_update: float = time.time()  # When last new field was added
+        self._raw_text = ""  # raw messages, oldest first, joined by _RAW_SEPARATOR
+        self._raw_hashes: Optional[array] = None  # _raw_hash of each raw message, built on first merge
+        self.created_ts: int = now
+        self.last_update: int = now
+        self.last_field_update: int = now  # When last new field was added
+        # Hash fields and raw messages as last read from / written to Redis (RedisStore only)
+        self._stored: Optional[dict[str, str]] = None
+        self._stored_raw: list[str] = []
+    
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts, timezone.utc)
+    
+    @created_at.setter
+    def created_at(self, value: datetime) -> None:
+        self.created_ts = int(value.timestamp())
+    
+    @property
+    def raw_messages(self) -> list[str]:
+        """Kept raw messages, oldest first (a new list on every access)."""
+        return self._raw_text.split(_RAW_SEPARATOR) if self._raw_text else []
+    
+    @raw_messages.setter
+    def raw_messages(self, messages: Iterable[str]) -> None:
+        messages = list(messages)
+        text = _RAW_SEPARATOR.join(messages)
+        if messages and text.count(_RAW_SEPARATOR) >= len(messages):
+            messages = [message.replace(_RAW_SEPARATOR, " ") for message in messages]
+            text = _RAW_SEPARATOR.join(messages)
+        if len(messages) > MAX_RAW_MESSAGES or len(text) > MAX_RAW_CHARS:
+            messages = messages[-MAX_RAW_MESSAGES:]
+            while len(messages) > 1 and sum(map(len, messages)) + len(messages) - 1 > MAX_RAW_CHARS:
+                del messages[0]
+            text = _RAW_SEPARATOR.join(messages)
+        self._raw_text = text
+        self._raw_hashes = None
+    
+    def _keep_raw_message(self, text: str, add: bool) -> None:
+        """
+        Make text the newest raw message: moved to the end if already kept,
+        else appended if add. The oldest ones go once over MAX_RAW_MESSAGES
+        or MAX_RAW_CHARS.
+        """
+        if _RAW_SEPARATOR in text:
+            text = text.replace(_RAW_SEPARATOR, " ")
+        digest = _raw_hash(text)
+        hashes = self._raw_hashes
+        if hashes is None:
+            hashes = self._raw_hashes = array('I', map(_raw_hash, self.raw_messages))
+        if digest in hashes:
+            messages = self.raw_messages
+            i = hashes.index(digest)
+            if messages[i] == text:  # not just a hash collision
+                if i < len(messages) - 1:
+                    del messages[i], hashes[i]
+                    messages.append(text)
+                    hashes.append(digest)
+                    self._raw_text = _RAW_SEPARATOR.join(messages)
+                return
+        if not add:
+            return
+        self._raw_text = f"{self._raw_text}{_RAW_SEPARATOR}{text}" if self._raw_text else text
+        hashes.append(digest)
+        while len(hashes) > MAX_RAW_MESSAGES or (len(hashes) > 1 and len(self._raw_text) > MAX_RAW_CHARS):
+            self._raw_text = self._raw_text[self._raw_text.index(_RAW_SEPARATOR) + 1:]
+            del hashes[0]
     
     def merge(self, parsed: ParsedMessage) -> bool:
         """
@@ -35,7 +186,7 @@ class AggregationRecord:
         Returns True if new fields were added.
         Enhanced to handle multiple messages and prioritize name + phone.
         """
-        now = time.time()
+        now = _stamp()
         self.last_update = now
         had_changes = False
         
@@ -67,8 +218,21 @@ class AggregationRecord:
                 # Only replace if new phone has higher confidence or is more complete
                 if parsed.confidence > 0.8:
                     logger.debug(f"[{self.platform_user_id}] Upgrading phone: {self.contact_number} -> {parsed.contact_number}")
+                    previous = self.contact_number
                     self.contact_number = parsed.contact_number
+                    if parsed.contact_number in self.alternate_numbers:
+                        # An alternate became the primary: listed once, as the primary
+                        self.alternate_numbers = tuple(n for n in self.alternate_numbers
+                                                       if n != parsed.contact_number)
+                    self._add_alternate_number(previous)
                     had_changes = True
+                else:
+                    # Keep it as an alternate instead of dropping it
+                    had_changes |= self._add_alternate_number(parsed.contact_number)
+        
+        # Keep the other numbers from the same message as alternates
+        for number in parsed.alternate_numbers:
+            had_changes |= self._add_alternate_number(number)
         
         # Merge address fields: accept any new valid data
         if parsed.address_block.street_address:
@@ -77,10 +241,10 @@ class AggregationRecord:
                 had_changes = True
                 logger.debug(f"[{self.platform_user_id}] Set address: {parsed.address_block.street_address}")
             else:
-                # Replace if new address is longer/more complete
-                if len(parsed.address_block.street_address) > len(self.adress):
-                    logger.debug(f"[{self.platform_user_id}] Upgrading address: {self.adress} -> {parsed.address_block.street_address}")
-                    self.adress = parsed.address_block.street_address
+                merged = self._merge_address(parsed.address_block)
+                if merged != self.adress:
+                    logger.debug(f"[{self.platform_user_id}] Upgrading address: {self.adress} -> {merged}")
+                    self.adress = merged
                     had_changes = True
         
         if parsed.address_block.location:
@@ -110,22 +274,105 @@ class AggregationRecord:
         if had_changes:
             self.last_field_update = now
         
-        # Store raw message if it contributed new data
+        # Store raw message if it contributed new data; a repeated one just moves to the end
         raw_text = (parsed.raw_message or "").strip()
         if raw_text:
-            # Keep only unique messages, preserve order
-            if raw_text in self.raw_messages:
-                # Move to end to reflect most recent version
-                self.raw_messages.remove(raw_text)
-                self.raw_messages.append(raw_text)
-            elif had_changes or parsed.confidence >= 0.8:
-                self.raw_messages.append(raw_text)
-                # Keep a reasonable history size
-                if len(self.raw_messages) > 10:
-                    self.raw_messages = self.raw_messages[-10:]
+            self._keep_raw_message(raw_text, add=had_changes or parsed.confidence >= 0.8)
         
         return had_changes
     
+    def absorb(self, other: 'AggregationRecord') -> bool:
+        """
+        Fold in a copy of the same lead kept elsewhere, e.g. in memory while
+        Redis was down. other's fields go through the merge rules as one
+        message (newer data upgrades, nothing known here is dropped) and its
+        raw messages are appended. Returns True if fields changed.
+        """
+        last_update, last_field_update = self.last_update, self.last_field_update
+        changed = self.merge(ParsedMessage(
+            full_name=other.full_name,
+            contact_number=other.contact_number,
+            alternate_numbers=tuple(other.alternate_numbers),
+            address_block=AddressBlock(
+                street_address=other.adress,
+                location=other.location,
+                postal_code=other.postal_code,
+            ),
+        ))
+        for text in other.raw_messages:
+            self._keep_raw_message(text, add=True)
+        # Times of the messages themselves, not of this fold
+        self.created_ts = min(self.created_ts, other.created_ts)
+        self.last_update = max(last_update, other.last_update)
+        self.last_field_update = max(last_field_update, other.last_field_update) if changed else last_field_update
+        return changed
+    
+    def copy(self) -> 'AggregationRecord':
+        """Detached copy, e.g. of the live record InMemoryStore hands out, to export from."""
+        rec = AggregationRecord.__new__(AggregationRecord)
+        for name in self.__slots__:
+            setattr(rec, name, getattr(self, name))
+        rec._raw_hashes = None  # the only mutable slot merge() changes in place
+        return rec
+    
+    def changed_since(self, snapshot: 'AggregationRecord') -> bool:
+        """
+        True if a message was merged into this record after snapshot, an earlier
+        copy of the same lead, was taken: a later last_update, or a kept raw
+        message snapshot does not have (every merge that changes a field keeps
+        its message).
+        """
+        if self.last_update > snapshot.last_update:
+            return True
+        if self._raw_text == snapshot._raw_text:
+            return False
+        kept = set(map(_raw_hash, snapshot.raw_messages))
+        return any(_raw_hash(text) not in kept for text in self.raw_messages)
+    
+    def _merge_address(self, block: AddressBlock) -> str:
+        """
+        Combine the stored address with a newly parsed one, component by component.
+        
+        Same street (or a follow-up with no street, e.g. "ap. 12"): components from the
+        new message fill or correct the stored ones, written into the stored text so
+        nothing else the customer wrote is lost (see amend_address). Different street:
+        the one with more components wins, the newer one on a tie. Falls back to keeping
+        the longer string when either side has no recognisable components.
+        """
+        new_text = block.street_address
+        current = tokenize_address(self.adress)
+        new = block.street_parts or tokenize_address(new_text)
+        
+        if not current.component_count() or not new.component_count():
+            return new_text if len(new_text) > len(self.adress) else self.adress
+        
+        if new.street is None or current.street is None or current.same_street(new):
+            return amend_address(self.adress, current, new)
+        
+        return new_text if new.component_count() >= current.component_count() else self.adress
+    
+    def _add_alternate_number(self, number: Optional[str]) -> bool:
+        """Remember an extra phone number. Returns True if it was new."""
+        if not number or number == self.contact_number or number in self.alternate_numbers:
+            return False
+        self.alternate_numbers = (*self.alternate_numbers, number)[-MAX_ALTERNATE_NUMBERS:]
+        logger.debug(f"[{self.platform_user_id}] Added alternate phone: {number}")
+        return True
+    
+    def settled_fields(self) -> frozenset[str]:
+        """
+        Fields final enough that the parser can skip their extractors.
+        
+        Once the record has a multi-word name and a normalized phone, later messages
+        are mostly answers about the address. The parser still skips the name only
+        for messages that cannot produce a name merge() would take (see
+        parser._settled_name_holds); phones are always scanned, as merge() keeps
+        corrected and extra numbers.
+        """
+        if self.contact_number and self.full_name and len(self.full_name.split()) >= 2:
+            return SETTLED_NAME
+        return frozenset()
+    
     def has_minimum_data(self) -> bool:
         """Check if we have the minimum required data (name + phone)."""
         return bool(self.full_name and self.contact_number)
@@ -156,21 +403,37 @@ class AggregationRecord:
                 return True
             
             # Rule 3: Have name + phone + 30s since last message (shorter wait for complete data)
-            if idle_time >= 30:  # 30 seconds since last message
+            if idle_time >= MIN_DATA_IDLE_SECONDS:
                 logger.debug(f"[{self.platform_user_id}] Finalizing: have name+phone, {idle_time:.1f}s since last message")
                 return True
         
         return False
     
+    def next_finalize_at(self) -> float:
+        """
+        Epoch time at which should_finalize() turns True if no further message arrives.
+        
+        The same three rules, as deadlines: the earliest one that applies wins.
+        """
+        due = self.last_update + settings.COOLDOWN_SECONDS
+        if self.has_minimum_data():
+            due = min(
+                due,
+                self.last_field_update + settings.FINALIZE_AFTER_BOTH_SECONDS,
+                self.last_update + MIN_DATA_IDLE_SECONDS,
+            )
+        return due
+    
     def to_customer_details(self) -> CustomerDetails:
         """Convert to final CustomerDetails for export."""
-        raw_combined = "\n".join(self.raw_messages)
+        raw_combined = self._raw_text.replace(_RAW_SEPARATOR, "\n")
         record_id = generate_record_id(self.platform_user_id, self.contact_number)
         
         return CustomerDetails(
             platform_user_id=self.platform_user_id,
             full_name=self.full_name,
             contact_number=self.contact_number,
+            alternate_numbers=list(self.alternate_numbers),
             adress=self.adress,
             location=self.location,
             postal_code=self.postal_code,
@@ -185,11 +448,12 @@ class AggregationRecord:
             'platform_user_id': self.platform_user_id,
             'full_name': self.full_name,
             'contact_number': self.contact_number,
+            'alternate_numbers': list(self.alternate_numbers),
             'adress': self.adress,
             'location': self.location,
             'postal_code': self.postal_code,
             'raw_messages': self.raw_messages,
-            'created_at': self.created_at.isoformat(),
+            'created_at': self.created_ts,
             'last_update': self.last_update,
             'last_field_update': self.last_field_update,
         }
@@ -200,98 +464,717 @@ class AggregationRecord:
         rec = cls(data['platform_user_id'])
         rec.full_name = data.get('full_name')
         rec.contact_number = data.get('contact_number')
+        rec.alternate_numbers = tuple(data.get('alternate_numbers', ()))
         rec.adress = data.get('adress')
         rec.location = data.get('location')
         rec.postal_code = data.get('postal_code')
-        rec.raw_messages = data.get('raw_messages', [])
-        rec.created_at = datetime.fromisoformat(data['created_at'])
-        rec.last_update = data['last_update']
-        rec.last_field_update = data['last_field_update']
+        rec.raw_messages = data.get('raw_messages', ())
+        created = data['created_at']
+        if isinstance(created, str):
+            rec.created_at = datetime.fromisoformat(created)  # written before epoch seconds
+        else:
+            rec.created_ts = int(created)
+        rec.last_update = int(data['last_update'])
+        rec.last_field_update = int(data['last_field_update'])
+        return rec
+    
+    def to_hash(self) -> dict[str, str]:
+        """Scalar fields as Redis hash values (raw messages are stored separately)."""
+        data = {
+            'full_name': self.full_name,
+            'contact_number': self.contact_number,
+            'alternate_numbers': ','.join(self.alternate_numbers),
+            'adress': self.adress,
+            'location': self.location,
+            'postal_code': self.postal_code,
+            'created_at': str(self.created_ts),
+            'last_update': str(self.last_update),
+            'last_field_update': str(self.last_field_update),
+        }
+        return {name: value for name, value in data.items() if value}
+    
+    @classmethod
+    def from_hash(cls, platform_user_id: str, data: dict[str, str], raw_messages: list[str]) -> 'AggregationRecord':
+        """Inverse of to_hash; epoch seconds instead of ISO strings keep this cheap."""
+        rec = cls(platform_user_id)
+        rec.full_name = data.get('full_name')
+        rec.contact_number = data.get('contact_number')
+        alternates = data.get('alternate_numbers')
+        rec.alternate_numbers = tuple(alternates.split(',')) if alternates else ()
+        rec.adress = data.get('adress')
+        rec.location = data.get('location')
+        rec.postal_code = data.get('postal_code')
+        rec.raw_messages = raw_messages
+        # float() first: records written before the switch to whole seconds hold fractions
+        rec.created_ts = int(float(data['created_at']))
+        rec.last_update = int(float(data['last_update']))
+        rec.last_field_update = int(float(data['last_field_update']))
         return rec
 
 
 class InMemoryStore:
-    """In-memory storage with TTL cleanup."""
+    """
+    In-memory storage with TTL cleanup.
+    
+    Records are kept in the order they were last saved, which is their
+    last_update order (merge stamps last_update right before the save), so
+    the stalest record is always first and cleanup only touches expired ones.
+    """
     
     def __init__(self):
-        self.store: Dict[str, AggregationRecord] = {}
+        self.store: OrderedDict[str, AggregationRecord] = OrderedDict()
+        self._lock = threading.Lock()  # the cleanup tick and finalizer run on their own threads
+        self._stripes = StripedLock()
+        self.journal = None  # called as journal(user_id, record dict or None) on changes
     
     def get(self, user_id: str) -> Optional[AggregationRecord]:
         return self.store.get(user_id)
     
+    def update(self, user_id: str, fn) -> Optional[AggregationRecord]:
+        """
+        Atomic read-modify-write: save fn(current record or None) unless it returns None.
+        
+        Updates of the same user serialize on its lock stripe, so concurrent
+        merges never lose each other's fields.
+        """
+        with self._stripes(user_id):
+            record = fn(self.store.get(user_id))
+            if record is not None:
+                self.set(user_id, record)
+            return record
+    
     def set(self, user_id: str, record: AggregationRecord) -> None:
-        self.store[user_id] = record
+        with self._lock:
+            self.store[user_id] = record
+            self.store.move_to_end(user_id)
+            if self.journal is not None:
+                self.journal(user_id, record.to_dict())
     
     def delete(self, user_id: str) -> None:
-        self.store.pop(user_id, None)
+        with self._lock:
+            if self.store.pop(user_id, None) is not None and self.journal is not None:
+                self.journal(user_id, None)
+    
+    def delete_if_unchanged(self, user_id: str, record: AggregationRecord) -> bool:
+        """
+        Delete user's record unless a message was merged into it after record,
+        a copy taken before the export, was made (see AggregationRecord.changed_since).
+        
+        Holds the user's stripe, so no update() is half way through. Returns
+        False, keeping the record, if it changed.
+        """
+        with self._stripes(user_id):
+            current = self.store.get(user_id)
+            if current is not None and current.changed_since(record):
+                return False
+            self.delete(user_id)
+        return True
+    
+    def dump(self) -> list[tuple[str, dict]]:
+        """(user_id, to_dict()) pairs, stalest first."""
+        with self._lock:
+            return [(uid, rec.to_dict()) for uid, rec in self.store.items()]
+    
+    def restore(self, items: Iterable[tuple[str, Optional[dict]]]) -> None:
+        """Put back dumped or journaled (user_id, to_dict()) pairs in order; None removes the record."""
+        with self._lock:
+            for user_id, data in items:
+                self.store.pop(user_id, None)  # re-inserted at the most recent end
+                if data is not None:
+                    self.store[user_id] = AggregationRecord.from_dict(data)
     
     def cleanup_stale(self) -> None:
-        """Remove records older than 2x COOLDOWN_SECONDS."""
-        max_age = settings.COOLDOWN_SECONDS * 2
-        now = time.time()
-        stale = [
-            uid for uid, rec in self.store.items()
-            if (now - rec.last_update) > max_age
-        ]
-        for uid in stale:
-            logger.debug(f"Cleaning up stale record: {uid}")
-            del self.store[uid]
+        """Remove records older than 2x COOLDOWN_SECONDS, oldest first, stopping at the first fresh one."""
+        cutoff = time.time() - settings.COOLDOWN_SECONDS * 2
+        store = self.store
+        with self._lock:
+            while store:
+                uid, rec = next(iter(store.items()))
+                if rec.last_update >= cutoff:
+                    break
+                logger.debug(f"Cleaning up stale record: {uid}")
+                store.popitem(last=False)
+                if self.journal is not None:
+                    self.journal(uid, None)  # else the next start restores and exports it again
+    
+    def stats(self) -> dict:
+        return {"backend": "memory", "records": len(self.store)}
+
+
+class SqliteStore:
+    """
+    SQLite-backed storage: pending leads survive a restart without Redis.
+    
+    One row per user holding to_dict() as JSON, with last_update in its own
+    indexed column so cleanup_stale is a single range delete. The database
+    runs in WAL mode with synchronous=NORMAL. Writes go into one open
+    transaction, committed after SQLITE_COMMIT_BATCH writes or
+    SQLITE_COMMIT_INTERVAL_SECONDS, whichever comes first (and on exit), so
+    a crash loses at most that window. Statements are fixed strings, prepared
+    once by the connection's statement cache and reused.
+    
+    Like InMemoryStore, update() is atomic within one process only.
+    """
+    
+    def __init__(self, path: str, commit_batch: int = SQLITE_COMMIT_BATCH,
+                 commit_interval: float = SQLITE_COMMIT_INTERVAL_SECONDS):
+        self.path = path
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+        # Autocommit mode: transactions are opened and committed here, in batches
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        for sql in _SQLITE_SCHEMA:
+            self._db.execute(sql)
+        self._lock = threading.Lock()  # one connection, shared by request, finalizer and cleanup threads
+        self._stripes = StripedLock()
+        self._pending = 0  # writes in the open transaction
+        self._dirty = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.commits = 0
+        atexit.register(self.close)
+    
+    def get(self, user_id: str) -> Optional[AggregationRecord]:
+        with self._lock:
+            row = self._db.execute(_SQL_GET, (user_id,)).fetchone()
+        return AggregationRecord.from_dict(json.loads(row[0])) if row else None
+    
+    def update(self, user_id: str, fn) -> Optional[AggregationRecord]:
+        """Atomic read-modify-write: save fn(current record or None) unless it returns None."""
+        with self._stripes(user_id):
+            record = fn(self.get(user_id))
+            if record is not None:
+                self.set(user_id, record)
+            return record
+    
+    def set(self, user_id: str, record: AggregationRecord) -> None:
+        data = json.dumps(record.to_dict(), separators=(",", ":"), ensure_ascii=False)
+        self._write(_SQL_SET, (user_id, record.last_update, data))
+    
+    def delete(self, user_id: str) -> None:
+        self._write(_SQL_DELETE, (user_id,))
+    
+    def delete_if_unchanged(self, user_id: str, record: AggregationRecord) -> bool:
+        """Delete user's record unless a message was merged in since record was read; see InMemoryStore."""
+        with self._stripes(user_id):
+            current = self.get(user_id)
+            if current is not None and current.changed_since(record):
+                return False
+            self.delete(user_id)
+        return True
+    
+    def cleanup_stale(self) -> None:
+        """Remove records older than 2x COOLDOWN_SECONDS (an index range on last_update)."""
+        self._write(_SQL_CLEANUP, (int(time.time()) - settings.COOLDOWN_SECONDS * 2,))
+    
+    def records(self) -> list[AggregationRecord]:
+        """Every stored record, stalest first."""
+        with self._lock:
+            rows = self._db.execute(_SQL_ALL).fetchall()
+        return [AggregationRecord.from_dict(json.loads(data)) for data, in rows]
+    
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            if self._db is None:
+                raise sqlite3.ProgrammingError("SqliteStore is closed")
+            if not self._db.in_transaction:
+                # Also after SQLite rolled a failed batch back on its own
+                self._pending = 0
+                self._db.execute("BEGIN")
+            try:
+                self._db.execute(sql, params)
+            except sqlite3.Error:
+                # Earlier writes of the batch stay queued; an empty transaction is not left open
+                if not self._pending and self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+            self._pending += 1
+            if self._pending >= self.commit_batch:
+                self._commit()
+                return
+        self._dirty.set()
+        if self._flusher is None:
+            self._start_flusher()
+    
+    def _commit(self) -> None:
+        # Caller holds _lock
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+            self.commits += 1
+        self._pending = 0
+    
+    def flush(self) -> None:
+        """Commit the open transaction now."""
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+    
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="capture-sqlite-commit", daemon=True)
+            self._flusher.start()
+    
+    def _flush_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            # Let the rest of the batch arrive, then commit what the window collected
+            time.sleep(self.commit_interval)
+            self._dirty.clear()
+            if self._db is None:
+                return
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.exception(f"SQLite commit failed: {e}")
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._commit()
+            self._db.close()
+            self._db = None
+        self._dirty.set()  # let the flusher exit
+    
+    def stats(self) -> dict:
+        with self._lock:
+            records = self._db.execute(_SQL_COUNT).fetchone()[0] if self._db is not None else 0
+        return {"backend": "sqlite", "path": self.path, "records": records,
+                "commits": self.commits, "uncommitted": self._pending}
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# First byte of a zlib-compressed raw message (never present in message text)
+_COMPRESSED_MARK = b"\x00"
+
+
+def encode_raw_message(text: str, compact: bool) -> bytes:
+    """Raw message as stored in Redis; compact zlib-compresses it when that is smaller."""
+    data = text.encode()
+    if compact:
+        packed = _COMPRESSED_MARK + zlib.compress(data, 9)
+        if len(packed) < len(data):
+            return packed
+    return data
+
+
+def decode_raw_message(value) -> str:
+    if isinstance(value, bytes) and value.startswith(_COMPRESSED_MARK):
+        return zlib.decompress(value[1:]).decode()
+    return _decode(value)
 
 
 class RedisStore:
-    """Redis-backed storage."""
+    """
+    Redis-backed storage: hash "customer_capture:{id}" + list "customer_capture:{id}:raw".
+    
+    get() reads both in one pipelined round trip; set() writes only the hash fields
+    that differ from what was read, appends new raw messages (LTRIM keeps the cap)
+    and refreshes the TTLs, again in one pipeline.
+    
+    update() is the same read and write as an optimistic transaction: both keys
+    are WATCHed while the record is read and merged, and the write is retried if
+    another worker changed them before EXEC.
+    
+    Every save also puts the user in the DUE_QUEUE_KEY sorted set at its
+    next_finalize_at(). claim_due() hands out the leads that are due, each to
+    exactly one worker, so idle leads are exported before their keys expire.
+    """
     
     def __init__(self, redis_client):
         self.redis = redis_client
         self.ttl = settings.COOLDOWN_SECONDS * 2  # Auto-expire
+        self._stripes = StripedLock()  # threads of this process queue up instead of retrying
+        self.conflicts = 0
+        self._claim_due = redis_client.register_script(_CLAIM_DUE_LUA)
     
     def get(self, user_id: str) -> Optional[AggregationRecord]:
         key = f"customer_capture:{user_id}"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(key)
+        pipe.lrange(f"{key}:raw", 0, -1)
+        try:
+            data, raw = pipe.execute()
+        except Exception as e:
+            if "WRONGTYPE" not in str(e):
+                raise
+            return self._migrate_json(key)
+        return self._record(user_id, data, raw)
+    
+    def _record(self, user_id: str, data: dict, raw: list) -> Optional[AggregationRecord]:
+        if not data:
+            return None
+        fields = {_decode(name): _decode(value) for name, value in data.items()}
+        record = AggregationRecord.from_hash(user_id, fields, [decode_raw_message(v) for v in raw])
+        record._stored = fields
+        record._stored_raw = record.raw_messages
+        return record
+    
+    def update(self, user_id: str, fn) -> Optional[AggregationRecord]:
+        """
+        Atomic read-modify-write: save fn(current record or None) unless it returns None.
+        
+        fn may run more than once (on a fresh read each time) if another worker
+        writes the record concurrently.
+        """
+        from redis.exceptions import WatchError
+        key = f"customer_capture:{user_id}"
+        raw_key = f"{key}:raw"
+        with self._stripes(user_id):
+            for _ in range(UPDATE_RETRIES):
+                with self.redis.pipeline() as pipe:
+                    try:
+                        pipe.watch(key, raw_key)
+                        try:
+                            record = self._record(user_id, pipe.hgetall(key), pipe.lrange(raw_key, 0, -1))
+                        except Exception as e:
+                            if "WRONGTYPE" not in str(e):
+                                raise
+                            pipe.unwatch()
+                            migrated = self._migrate_json(key)
+                            if migrated is not None:
+                                self.set(user_id, migrated)
+                            continue
+                        record = fn(record)
+                        if record is None:
+                            return None
+                        pipe.multi()
+                        fields = self._queue_set(pipe, user_id, record)
+                        pipe.execute()
+                    except WatchError:
+                        self.conflicts += 1
+                        continue
+                record._stored = fields
+                record._stored_raw = record.raw_messages
+                return record
+        raise RuntimeError(f"[{user_id}] Record kept changing, gave up after {UPDATE_RETRIES} attempts")
+    
+    def _migrate_json(self, key: str) -> Optional[AggregationRecord]:
+        """Read a record written by the old JSON layout; the next set() writes it as a hash."""
         data = self.redis.get(key)
-        if data:
-            return AggregationRecord.from_dict(json.loads(data))
-        return None
+        self.redis.delete(key)
+        return AggregationRecord.from_dict(json.loads(data)) if data else None
     
     def set(self, user_id: str, record: AggregationRecord) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        fields = self._queue_set(pipe, user_id, record)
+        pipe.execute()
+        
+        record._stored = fields
+        record._stored_raw = record.raw_messages
+    
+    def _queue_set(self, pipe, user_id: str, record: AggregationRecord) -> dict[str, str]:
+        """Queue the writes for record on pipe; returns the hash fields it will hold."""
         key = f"customer_capture:{user_id}"
-        data = json.dumps(record.to_dict())
-        self.redis.setex(key, self.ttl, data)
+        raw_key = f"{key}:raw"
+        fields = record.to_hash()
+        stored = record._stored or {}
+        changed = {name: value for name, value in fields.items() if stored.get(name) != value}
+        removed = [name for name in stored if name not in fields]
+        
+        if changed:
+            pipe.hset(key, mapping=changed)
+        if removed:
+            pipe.hdel(key, *removed)
+        self._queue_raw_messages(pipe, raw_key, record._stored_raw, record.raw_messages)
+        pipe.expire(key, self.ttl)
+        if record.raw_messages:
+            pipe.expire(raw_key, self.ttl)
+        pipe.zadd(DUE_QUEUE_KEY, {user_id: record.next_finalize_at()})
+        return fields
+    
+    def _queue_raw_messages(self, pipe, raw_key: str, old: list[str], new: list[str]) -> None:
+        """Queue the list commands turning old into new: usually one RPUSH (+ LTRIM)."""
+        if new == old:
+            return
+        compact = settings.COMPACT_RAW_MESSAGES
+        # Longest tail of old that new starts with; the rest of new was appended
+        for start in range(len(old) + 1):
+            kept = len(old) - start
+            if new[:kept] == old[start:]:
+                break
+        if kept == 0 and old:
+            pipe.delete(raw_key)  # reordered (a repeated message moved to the end)
+        appended = new[kept:]
+        if appended:
+            pipe.rpush(raw_key, *(encode_raw_message(text, compact) for text in appended))
+        if start and kept:
+            pipe.ltrim(raw_key, -len(new), -1)
     
     def delete(self, user_id: str) -> None:
         key = f"customer_capture:{user_id}"
-        self.redis.delete(key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(key, f"{key}:raw")
+        pipe.zrem(DUE_QUEUE_KEY, user_id)
+        pipe.execute()
+    
+    def delete_if_unchanged(self, user_id: str, record: AggregationRecord) -> bool:
+        """
+        Delete user's record unless it was saved since record was read from here.
+        
+        Returns False, keeping the record and its place in the due queue, if
+        another worker merged a message into it meanwhile.
+        """
+        from redis.exceptions import WatchError
+        key = f"customer_capture:{user_id}"
+        raw_key = f"{key}:raw"
+        with self._stripes(user_id), self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key, raw_key)
+                current = self._record(user_id, pipe.hgetall(key), pipe.lrange(raw_key, 0, -1))
+                if current is not None and (current._stored != record._stored
+                                            or current.raw_messages != record._stored_raw):
+                    return False
+                pipe.multi()
+                pipe.delete(key, raw_key)
+                pipe.zrem(DUE_QUEUE_KEY, user_id)
+                pipe.execute()
+            except WatchError:
+                self.conflicts += 1
+                return False
+        return True
+    
+    def claim_due(self, now: Optional[float] = None, limit: int = 100) -> dict[str, float]:
+        """User IDs whose finalize time has passed -> that time, leased to this caller alone."""
+        if now is None:
+            now = time.time()
+        due = self._claim_due(keys=[DUE_QUEUE_KEY], args=[now, now + DUE_CLAIM_LEASE_SECONDS, limit])
+        return {_decode(due[i]): float(due[i + 1]) for i in range(0, len(due), 2)}
+    
+    def reschedule(self, user_id: str, due_at: float) -> None:
+        """Move user to due_at in the due queue, keeping the record alive until then."""
+        key = f"customer_capture:{user_id}"
+        ttl = max(self.ttl, int(due_at - time.time()) + self.ttl)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(DUE_QUEUE_KEY, {user_id: due_at})
+        pipe.expire(key, ttl)
+        pipe.expire(f"{key}:raw", ttl)
+        pipe.execute()
+    
+    def next_due(self) -> Optional[float]:
+        """Earliest finalize time in the due queue, None if it is empty."""
+        first = self.redis.zrange(DUE_QUEUE_KEY, 0, 0, withscores=True)
+        return first[0][1] if first else None
     
     def cleanup_stale(self) -> None:
         """Redis handles TTL automatically."""
         pass
 
 
+class ResilientStore:
+    """
+    RedisStore behind a circuit breaker, with an InMemoryStore as fallback tier.
+    
+    Connection errors and timeouts count against the breaker and the call is
+    served from memory instead of raising into the webhook; while the breaker
+    is open Redis is not tried at all. After the reset timeout one trial call
+    goes to Redis again and, if it succeeds, Redis is used from then on.
+    
+    Records saved in memory during an outage are still found by get(), folded
+    into the copy Redis kept from before (AggregationRecord.absorb), and are
+    merged into Redis the same way on their next save, in one WATCHed update.
+    """
+    
+    def __init__(self, primary: RedisStore, fallback: Optional[InMemoryStore] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        import redis
+        self.primary = primary
+        self.fallback = fallback if fallback is not None else InMemoryStore()
+        self.breaker = breaker if breaker is not None else CircuitBreaker(
+            settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET_SECONDS
+        )
+        # Outages only: other Redis errors (bad commands, data) still surface
+        self._outage_errors = (redis.ConnectionError, redis.TimeoutError, OSError)
+        self.fallback_calls = 0
+    
+    def _call(self, fn, *args):
+        """Run fn on Redis if the breaker allows; (True, result) on success, (False, None) otherwise."""
+        if not self.breaker.allow():
+            self.fallback_calls += 1
+            return False, None
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = fn(*args)
+            succeeded = True
+        except self._outage_errors as e:
+            self.breaker.record_failure()
+            self.fallback_calls += 1
+            logger.warning(f"Redis {fn.__name__} failed ({type(e).__name__}), using in-memory store; "
+                           f"breaker {self.breaker.state}")
+            return False, None
+        finally:
+            if not succeeded:
+                # Other errors (ResponseError, update retries exhausted) mean Redis answered:
+                # neither success nor failure, but a half-open trial must not stay taken
+                self.breaker.release_trial()
+        self.breaker.record_success((time.perf_counter() - start) * 1000)
+        return True, result
+    
+    def get(self, user_id: str) -> Optional[AggregationRecord]:
+        _, record = self._call(self.primary.get, user_id)
+        local = self.fallback.get(user_id)
+        if record is None:
+            return local
+        if local is not None:
+            record.absorb(local)  # a fresh copy from Redis: safe to fold into
+        return record
+    
+    def _promote(self, user_id: str, record: AggregationRecord) -> AggregationRecord:
+        """Merge a record kept in memory into the Redis copy (if any) atomically; returns the result."""
+        def fold(current: Optional[AggregationRecord]) -> AggregationRecord:
+            if current is None:
+                record._stored = None  # written as new
+                record._stored_raw = []
+                return record
+            current.absorb(record)
+            return current
+        return self.primary.update(user_id, fold)
+    
+    def _save_from_fallback(self, user_id: str, record: AggregationRecord) -> AggregationRecord:
+        ok, merged = self._call(self._promote, user_id, record)
+        if not ok:
+            self.fallback.set(user_id, record)
+            return record
+        self.fallback.delete(user_id)  # promoted back to Redis
+        return merged
+    
+    def set(self, user_id: str, record: AggregationRecord) -> None:
+        if self.fallback.get(user_id) is not None:
+            self._save_from_fallback(user_id, record)
+            return
+        ok, _ = self._call(self.primary.set, user_id, record)
+        if not ok:
+            self.fallback.set(user_id, record)
+    
+    def update(self, user_id: str, fn) -> Optional[AggregationRecord]:
+        if self.fallback.get(user_id) is None:
+            ok, record = self._call(self.primary.update, user_id, fn)
+            if ok:
+                return record
+        # Redis is down, or the record has lived in memory since it was: merge there, then promote
+        record = self.fallback.update(user_id, fn)
+        if record is None:
+            return None
+        return self._save_from_fallback(user_id, record)
+    
+    def delete(self, user_id: str) -> None:
+        self._call(self.primary.delete, user_id)
+        self.fallback.delete(user_id)
+    
+    def in_redis(self, user_id: str) -> bool:
+        """True if user's record is kept in Redis (and so in its due queue) right now."""
+        return self.breaker.state != OPEN and self.fallback.get(user_id) is None
+    
+    def delete_if_unchanged(self, user_id: str, record: AggregationRecord) -> bool:
+        """
+        Delete user's record unless a newer save reached it (see RedisStore.delete_if_unchanged).
+        
+        A record kept in memory since an outage is compared there; a copy Redis
+        still holds from before goes with it if that one is unchanged too.
+        """
+        if self.fallback.get(user_id) is not None:
+            if not self.fallback.delete_if_unchanged(user_id, record):
+                return False
+            self._call(self.primary.delete_if_unchanged, user_id, record)
+            return True
+        ok, deleted = self._call(self.primary.delete_if_unchanged, user_id, record)
+        return bool(ok and deleted)
+    
+    def claim_due(self, now: Optional[float] = None, limit: int = 100) -> dict[str, float]:
+        ok, due = self._call(self.primary.claim_due, now, limit)
+        return due if ok else {}
+    
+    def reschedule(self, user_id: str, due_at: float) -> bool:
+        ok, _ = self._call(self.primary.reschedule, user_id, due_at)
+        return ok
+    
+    def next_due(self) -> Optional[float]:
+        _, due_at = self._call(self.primary.next_due)
+        return due_at
+    
+    def cleanup_stale(self) -> None:
+        self.fallback.cleanup_stale()  # Redis expires its own keys
+    
+    def stats(self) -> dict:
+        return {
+            "backend": "memory" if self.breaker.state == OPEN else "redis",
+            "breaker": self.breaker.stats(),
+            "fallback_calls": self.fallback_calls,
+            "fallback_records": len(self.fallback.store),
+            "update_conflicts": self.primary.conflicts,
+        }
+
+
+def _redis_client():
+    """Client on a bounded, shared connection pool; reconnects lazily after errors."""
+    import redis
+    timeout = settings.REDIS_SOCKET_TIMEOUT
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=timeout,  # wait for a free connection at most this long
+        socket_timeout=timeout,
+        socket_connect_timeout=timeout,
+        health_check_interval=30,
+    )
+    # Raw bytes: compact raw messages are binary; RedisStore decodes text itself
+    return redis.Redis(connection_pool=pool)
+
+
 # === Global Store Instance ===
-_store: Optional[InMemoryStore | RedisStore] = None
+_store: Optional[InMemoryStore | ResilientStore | SqliteStore] = None
+_cleanup_thread: Optional[threading.Thread] = None
 
 
-def get_store() -> InMemoryStore | RedisStore:
+def get_store() -> InMemoryStore | ResilientStore | SqliteStore:
     """Get or initialize the global store instance."""
     global _store
     
     if _store is not None:
         return _store
     
-    # Try Redis first
+    # Redis first, behind a circuit breaker with the in-memory tier as fallback
     if settings.REDIS_URL:
         try:
-            import redis
-            client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-            client.ping()  # Test connection
-            _store = RedisStore(client)
-            logger.info(f"Using Redis store: {settings.REDIS_URL}")
-            return _store
+            client = _redis_client()
         except Exception as e:
-            logger.warning(f"Redis connection failed, falling back to in-memory: {e}")
+            logger.warning(f"Redis unavailable, falling back to in-memory: {e}")
+        else:
+            store = ResilientStore(RedisStore(client))
+            try:
+                client.ping()
+                logger.info("Using Redis store")
+            except Exception as e:
+                # Not fatal: the breaker retries Redis after its reset timeout
+                store.breaker.trip()
+                logger.warning(f"Redis connection failed, in-memory until it answers: {e}")
+            _store = store
+            start_cleanup_tick()  # for the fallback tier
+            return _store
+    
+    # Durable local file when there is no Redis
+    if settings.CAPTURE_SQLITE_PATH:
+        try:
+            _store = SqliteStore(settings.CAPTURE_SQLITE_PATH)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite store unavailable, falling back to in-memory: {e}")
+        else:
+            logger.info(f"Using SQLite store at {settings.CAPTURE_SQLITE_PATH}")
+            start_cleanup_tick()
+            return _store
     
     # Fallback to in-memory
     _store = InMemoryStore()
     logger.info("Using in-memory store")
+    start_cleanup_tick()
     return _store
 
 
@@ -307,6 +1190,12 @@ def save_pending_record(record: AggregationRecord) -> None:
     store.set(record.platform_user_id, record)
 
 
+def update_pending_record(user_id: str, fn) -> Optional[AggregationRecord]:
+    """Atomically save fn(pending record or None) for user; see InMemoryStore.update."""
+    store = get_store()
+    return store.update(user_id, fn)
+
+
 def delete_pending_record(user_id: str) -> None:
     """Delete pending record."""
     store = get_store()
@@ -318,3 +1207,26 @@ def cleanup_stale_records() -> None:
     store = get_store()
     store.cleanup_stale()
 
+
+def _cleanup_loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            cleanup_stale_records()
+        except Exception as e:
+            logger.exception(f"Stale record cleanup failed: {e}")
+
+
+def start_cleanup_tick() -> None:
+    """Run cleanup_stale_records every CLEANUP_INTERVAL_SECONDS on a daemon thread (once per process)."""
+    global _cleanup_thread
+    if _cleanup_thread is not None:
+        return
+    _cleanup_thread = threading.Thread(
+        target=_cleanup_loop,
+        args=(settings.CLEANUP_INTERVAL_SECONDS,),
+        name="capture-cleanup",
+        daemon=True,
+    )
+    _cleanup_thread.start()
+
@@ -0,0 +1,125 @@
+"""
+Fingerprint index of outbound bot templates.
+
+Customers often paste our own messages back (delivery forms, offer text) with
+their details filled in. The index stores hashes of every template line and of
+its word shingles, so echoed lines can be recognised and stripped in a single
+pass over the message before the parser runs.
+
+Usage (webhook.py, once at import time):
+    from customer_capture.templates import register_templates
+    register_templates([OFFER_TEXT_RO, DELIVERY_FORM_OTHER_MD_POST, ...])
+"""
+import logging
+import re
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+SHINGLE_SIZE = 3
+# Share of a line's shingles that must come from templates to drop the whole line
+SHINGLE_MATCH_RATIO = 0.8
+# Longest template line (in words) tried as a "label: value" prefix
+MAX_PREFIX_WORDS = 6
+
+_VALUE_STRIP = ' \t:;-–—.,'
+
+
+def _shingles(words: list[str]) -> list[int]:
+    return [hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+class TemplateIndex:
+    """Hashes of template lines and word shingles."""
+
+    def __init__(self):
+        self.line_hashes: set[int] = set()
+        self.shingle_hashes: set[int] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.line_hashes)
+
+    def add(self, template: str) -> None:
+        """Index every non-empty line of a template."""
+        for line in template.split('\n'):
+            words = WORD_PATTERN.findall(line.lower())
+            if not words:
+                continue
+            self.line_hashes.add(hash(tuple(words)))
+            self.shingle_hashes.update(_shingles(words))
+
+    def strip(self, text: str) -> str:
+        """
+        Remove template lines from text, keeping customer-supplied values.
+
+        - Lines identical to a template line (ignoring case/punctuation) are dropped.
+        - "Template label: value" lines keep only the value.
+        - Lines whose shingles mostly come from templates are dropped.
+
+        Blank lines are dropped too, so the line-count heuristics in
+        is_likely_system_message only see what the customer wrote.
+        """
+        if not self.line_hashes:
+            return text
+
+        kept = []
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            matches = list(WORD_PATTERN.finditer(line.lower()))
+            if not matches:
+                kept.append(line)
+                continue
+            words = [m.group() for m in matches]
+
+            if hash(tuple(words)) in self.line_hashes:
+                continue
+
+            # Filled-in form line: longest template-line prefix wins
+            value = None
+            for n in range(min(MAX_PREFIX_WORDS, len(words) - 1), 0, -1):
+                if hash(tuple(words[:n])) in self.line_hashes:
+                    value = line[matches[n - 1].end():].strip(_VALUE_STRIP)
+                    break
+            if value is not None:
+                if value:
+                    kept.append(value)
+                continue
+
+            if len(words) >= SHINGLE_SIZE:
+                shingles = _shingles(words)
+                hits = sum(1 for h in shingles if h in self.shingle_hashes)
+                if hits / len(shingles) >= SHINGLE_MATCH_RATIO:
+                    continue
+
+            kept.append(line)
+
+        return '\n'.join(kept)
+
+
+# === Global index ===
+_index = TemplateIndex()
+_registered: list[str] = []  # the texts behind _index, for processes that rebuild it (batch workers)
+
+
+def register_templates(templates: Iterable[str]) -> None:
+    """Add outbound templates to the global index."""
+    count = 0
+    for template in templates:
+        if template:
+            _index.add(template)
+            _registered.append(template)
+            count += 1
+    logger.info(f"Registered {count} bot templates ({len(_index.line_hashes)} lines)")
+
+
+def registered_templates() -> tuple[str, ...]:
+    """Every template registered in this process so far."""
+    return tuple(_registered)
+
+
+def strip_template_lines(text: str) -> str:
+    """Strip echoed bot-template lines from a customer message."""
+    return _index.strip(text)
@@ -0,0 +1,74 @@
+"""
+Parser trace mode: which rule produced each field, what was rejected, and timings.
+
+parse_customer_message(text, trace=True) returns the trace on ParsedMessage.trace.
+With PARSE_TRACE_SAMPLE_RATE > 0 a random share of production parses is traced
+too and logged as one JSON line ("PARSE_TRACE {...}") for offline tuning. The
+logged line carries no message text: rejected candidates appear there only as
+(length, reason).
+
+Extractors report through note_rule/note_rejected, which are no-ops unless a
+trace is active for the current context.
+"""
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from .models import ParseTrace
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+_active_trace: ContextVar[Optional[ParseTrace]] = ContextVar("parse_trace", default=None)
+
+
+def note_rule(step: str, rule: str) -> None:
+    """Record the rule that produced a step's value."""
+    trace = _active_trace.get()
+    if trace is not None:
+        trace.step(step).rule = rule
+
+
+def note_rejected(step: str, candidate: str, reason: str) -> None:
+    """Record a candidate a step looked at and discarded."""
+    trace = _active_trace.get()
+    if trace is not None:
+        trace.step(step).rejected.append((candidate.strip()[:80], reason))
+
+
+def timed(trace: Optional[ParseTrace], step: str, fn: Callable, *args, **kwargs):
+    """Call fn, adding its wall time to the step when tracing."""
+    if trace is None:
+        return fn(*args, **kwargs)
+    start = time.perf_counter_ns()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        trace.step(step).elapsed_ns += time.perf_counter_ns() - start
+
+
+def start_trace() -> tuple[ParseTrace, object]:
+    """Activate a new trace; pass the token to end_trace."""
+    trace = ParseTrace()
+    return trace, _active_trace.set(trace)
+
+
+def end_trace(token) -> None:
+    _active_trace.reset(token)
+
+
+def should_sample() -> bool:
+    """Random draw against PARSE_TRACE_SAMPLE_RATE."""
+    rate = settings.PARSE_TRACE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def log_trace(trace: ParseTrace, text: str, confidence: float) -> None:
+    """Emit a sampled trace as a single JSON log line (no message text, candidates as lengths)."""
+    payload = trace.to_dict(redact=True)
+    payload["chars"] = len(text)
+    payload["confidence"] = round(confidence, 2)
+    logger.info("PARSE_TRACE %s", json.dumps(payload, ensure_ascii=False))
@@ -0,0 +1,396 @@
+"""
+Time-windowed dedup for webhook events (message MIDs, comment IDs).
+
+ExpiringSet keeps keys in insertion order next to their timestamps. Keys are
+never refreshed, so the oldest key is always at the front: expiring is a pop
+from the front until the first key still inside the window, and insert,
+lookup and expiry are all O(1) amortized instead of a sweep of every key.
+
+For MIDs at high volume RotatingBloomFilter trades exactness for a fixed
+memory budget (time-rotated Bloom generations, O(k) per lookup), optionally
+in Redis so every worker shares it. With several workers and Redis, exact
+dedup uses RedisExpiringSet (one SET NX EX key per MID) so a retried webhook
+landing on another worker is still caught; create_mid_filter picks one from
+the env. Redis-backed sets sit behind a circuit breaker (ResilientMidFilter)
+and fall back to their in-memory counterpart while Redis is unreachable.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from customer_capture.resilience import CircuitBreaker
+from customer_capture.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiringSet:
+    """Set of keys that each expire ttl_sec after they were added."""
+
+    def __init__(self, ttl_sec: float, max_entries: Optional[int] = None):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries  # hard cap for bursts; oldest keys go first
+        self._keys: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.journal = None  # called as journal(key, added_at) on each add (see persistence.py)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return self.seen(key)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key was added less than ttl_sec ago."""
+        if now is None:
+            now = time.time()
+        added = self._keys.get(key)
+        return added is not None and now - added < self.ttl_sec
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key is a duplicate within the window; otherwise adds it and returns False."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._keys:
+                return True
+            self._keys[key] = now
+            if self.journal is not None:
+                self.journal(key, now)
+            if self.max_entries is not None and len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+            return False
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """Drop keys older than ttl_sec."""
+        with self._lock:
+            self._expire(time.time() if now is None else now)
+
+    def dump(self) -> list[tuple[str, float]]:
+        """(key, added_at) pairs, oldest first."""
+        with self._lock:
+            return list(self._keys.items())
+
+    def restore(self, items: Iterable[tuple[str, Optional[float]]]) -> None:
+        """Re-add (key, added_at) pairs, oldest first, keeping their timestamps; None removes the key."""
+        keys = self._keys
+        with self._lock:
+            for key, added_at in items:
+                if added_at is None:
+                    keys.pop(key, None)
+                elif key not in keys:
+                    keys[key] = added_at
+
+    def _expire(self, now: float) -> None:
+        keys = self._keys
+        cutoff = now - self.ttl_sec
+        while keys:
+            oldest = next(iter(keys.values()))
+            if oldest > cutoff:
+                break
+            keys.popitem(last=False)
+
+
+class RedisExpiringSet:
+    """ExpiringSet shared by all workers: one Redis key per entry, set with NX and a TTL."""
+
+    def __init__(self, client, ttl_sec: float, prefix: str = "mid:"):
+        self.redis = client
+        self.ttl_sec = ttl_sec
+        self.prefix = prefix
+        self._ex = max(1, math.ceil(ttl_sec))
+
+    def __contains__(self, key: str) -> bool:
+        return self.seen(key)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key was added less than ttl_sec ago (Redis' clock; now is ignored)."""
+        return bool(self.redis.exists(f"{self.prefix}{key}"))
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key is a duplicate within the window; otherwise adds it and returns False."""
+        return not self.redis.set(f"{self.prefix}{key}", 1, nx=True, ex=self._ex)
+
+
+# KEYS[1] = current generation, KEYS[2..] = older ones; ARGV[1] = expire sec, ARGV[2..] = bit offsets.
+# Returns 1 if the key was (probably) seen, else sets its bits in the current generation.
+_BLOOM_CHECK_AND_ADD_LUA = """
+for g = 2, #KEYS do
+    local all = true
+    for i = 2, #ARGV do
+        if redis.call('GETBIT', KEYS[g], ARGV[i]) == 0 then
+            all = false
+            break
+        end
+    end
+    if all then
+        return 1
+    end
+end
+local present = 1
+for i = 2, #ARGV do
+    if redis.call('SETBIT', KEYS[1], ARGV[i], 1) == 0 then
+        present = 0
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return present
+"""
+
+
+def bloom_size(capacity: int, error_rate: float) -> tuple[int, int]:
+    """Bits and hash count for capacity keys at error_rate (standard Bloom sizing)."""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class RotatingBloomFilter:
+    """
+    Probabilistic ExpiringSet with a fixed memory budget.
+
+    Time is cut into periods of ttl_sec / (generations - 1); each period gets
+    its own Bloom filter and the last `generations` of them are checked, so a
+    key is remembered for at least ttl_sec (and at most one period longer).
+
+    capacity is the number of keys expected per period. Up to that load the
+    false-positive rate (a new key reported as a duplicate) is at most
+    error_rate: each generation is sized for error_rate / generations. Past
+    capacity the rate climbs; estimated_error_rate() reports it from the
+    actual fill. There are no false negatives inside the window.
+    """
+
+    def __init__(self, ttl_sec: float, capacity: int, error_rate: float = 1e-4, generations: int = 2):
+        if generations < 2:
+            raise ValueError("generations must be at least 2")
+        self.ttl_sec = ttl_sec
+        self.generations = generations
+        self.period = ttl_sec / (generations - 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits, self.hashes = bloom_size(capacity, error_rate / generations)
+        self._filters: dict[int, bytearray] = {}  # period number -> bit array
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes the bit arrays take once all generations exist."""
+        return self.generations * ((self.bits + 7) // 8)
+
+    def _positions(self, key: str) -> list[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        bits = self.bits
+        h1 = int.from_bytes(digest[:8], "little") % bits
+        h2 = (int.from_bytes(digest[8:], "little") | 1) % bits  # reduced first: small-int arithmetic below
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def _rotate(self, current: int) -> bytearray:
+        filters = self._filters
+        for number in [n for n in filters if n <= current - self.generations]:
+            del filters[number]
+        bits = filters.get(current)
+        if bits is None:
+            bits = filters[current] = bytearray((self.bits + 7) // 8)
+        return bits
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key was (probably) added within the window; does not add it."""
+        if now is None:
+            now = time.time()
+        positions = self._positions(key)
+        oldest = int(now // self.period) - self.generations
+        return any(
+            number > oldest and all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+            for number, bits in list(self._filters.items())
+        )
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        """True if key was (probably) seen within the window; otherwise adds it and returns False."""
+        if now is None:
+            now = time.time()
+        positions = self._positions(key)
+        with self._lock:
+            current = int(now // self.period)
+            bits = self._rotate(current)
+            for number, older in self._filters.items():
+                if number != current and all(older[p >> 3] & (1 << (p & 7)) for p in positions):
+                    return True
+            present = True
+            for p in positions:
+                byte = p >> 3
+                mask = 1 << (p & 7)
+                old = bits[byte]
+                if not old & mask:
+                    bits[byte] = old | mask
+                    present = False
+            return present
+
+    def estimated_error_rate(self) -> float:
+        """False-positive rate implied by how full the generations are."""
+        miss = 1.0
+        for bits in self._filters.values():
+            fill = int.from_bytes(bits, "little").bit_count() / self.bits
+            miss *= 1.0 - fill ** self.hashes
+        return 1.0 - miss
+
+
+class RedisBloomFilter(RotatingBloomFilter):
+    """RotatingBloomFilter kept in Redis bitmaps (SETBIT/GETBIT), shared by all workers."""
+
+    def __init__(self, client, ttl_sec: float, capacity: int, error_rate: float = 1e-4,
+                 generations: int = 2, prefix: str = "mid_bloom:"):
+        super().__init__(ttl_sec, capacity, error_rate, generations)
+        self.redis = client
+        self.prefix = prefix
+        self._check_and_add = client.register_script(_BLOOM_CHECK_AND_ADD_LUA)
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        current = int(now // self.period)
+        keys = [f"{self.prefix}{current - age}" for age in range(self.generations)]
+        expire = math.ceil(self.period * self.generations)
+        return bool(self._check_and_add(keys=keys, args=[expire, *self._positions(key)]))
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        current = int(now // self.period)
+        positions = self._positions(key)
+        pipe = self.redis.pipeline(transaction=False)
+        for age in range(self.generations):
+            for p in positions:
+                pipe.getbit(f"{self.prefix}{current - age}", p)
+        found = pipe.execute()
+        k = len(positions)
+        return any(all(found[g * k:(g + 1) * k]) for g in range(self.generations))
+
+    def estimated_error_rate(self) -> float:
+        current = int(time.time() // self.period)
+        miss = 1.0
+        for age in range(self.generations):
+            fill = self.redis.bitcount(f"{self.prefix}{current - age}") / self.bits
+            miss *= 1.0 - fill ** self.hashes
+        return 1.0 - miss
+
+
+class ResilientMidFilter:
+    """
+    Redis-backed MID set behind a circuit breaker, with an in-memory one as fallback.
+
+    Connection errors and timeouts count against the breaker and the MID is
+    checked in memory instead of failing the webhook request; while the breaker
+    is open Redis is not tried. MIDs added in memory during an outage are still
+    reported as duplicates for ttl_sec once Redis is back.
+    """
+
+    def __init__(self, primary: RedisExpiringSet | RedisBloomFilter,
+                 fallback: ExpiringSet | RotatingBloomFilter, breaker: Optional[CircuitBreaker] = None):
+        import redis
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker if breaker is not None else CircuitBreaker(
+            settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET_SECONDS
+        )
+        self._outage_errors = (redis.ConnectionError, redis.TimeoutError, OSError)
+        self._fallback_until = 0.0  # the fallback holds MIDs still inside their window until then
+        self.fallback_calls = 0
+
+    def _call(self, fn, *args):
+        """Run fn on Redis if the breaker allows; (True, result) on success, (False, None) otherwise."""
+        if not self.breaker.allow():
+            self.fallback_calls += 1
+            return False, None
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = fn(*args)
+            succeeded = True
+        except self._outage_errors as e:
+            self.breaker.record_failure()
+            self.fallback_calls += 1
+            logger.warning(f"Redis MID {fn.__name__} failed ({type(e).__name__}), using memory; "
+                           f"breaker {self.breaker.state}")
+            return False, None
+        finally:
+            if not succeeded:
+                self.breaker.release_trial()
+        self.breaker.record_success((time.perf_counter() - start) * 1000)
+        return True, result
+
+    def __contains__(self, key: str) -> bool:
+        return self.seen(key)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        ok, found = self._call(self.primary.seen, key, now)
+        if found:
+            return True
+        return (not ok or now < self._fallback_until) and self.fallback.seen(key, now)
+
+    def check_and_add(self, key: str, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        ok, duplicate = self._call(self.primary.check_and_add, key, now)
+        if not ok:
+            self._fallback_until = now + self.fallback.ttl_sec
+            return self.fallback.check_and_add(key, now)
+        return duplicate or (now < self._fallback_until and self.fallback.seen(key, now))
+
+
+def _shared(primary, fallback: ExpiringSet | RotatingBloomFilter, name: str) -> ResilientMidFilter:
+    """primary behind a breaker; tripped at once if Redis does not answer now."""
+    store = ResilientMidFilter(primary, fallback)
+    try:
+        primary.redis.ping()
+        logger.info(f"Using Redis {name} for MID dedup")
+    except Exception as e:
+        # Not fatal: the breaker retries Redis after its reset timeout
+        store.breaker.trip()
+        logger.warning(f"Redis connection failed, MID dedup in memory until it answers: {e}")
+    return store
+
+
+def _redis_client(redis_url: str):
+    """Redis client for redis_url, or None (logged) if it cannot be created."""
+    try:
+        import redis
+        return redis.from_url(redis_url, decode_responses=True, socket_timeout=2)
+    except Exception as e:
+        logger.warning(f"Redis unavailable, MID dedup in memory: {e}")
+        return None
+
+
+def create_mid_filter(ttl_sec: float) -> ExpiringSet | RotatingBloomFilter | ResilientMidFilter:
+    """
+    MID dedup set chosen by MID_DEDUP_MODE: "exact" (default) keeps every MID
+    in an ExpiringSet, or in Redis (RedisExpiringSet) when REDIS_URL is set
+    and WEB_CONCURRENCY runs several workers; "bloom" uses a
+    RotatingBloomFilter sized by MID_BLOOM_CAPACITY / MID_BLOOM_ERROR_RATE,
+    in Redis when REDIS_URL is set. Redis-backed sets fall back to memory
+    while Redis is unreachable (ResilientMidFilter).
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if os.getenv("MID_DEDUP_MODE", "exact").lower() != "bloom":
+        # One worker sees every retry itself: a local set is exact and needs no round trip
+        if redis_url and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            client = _redis_client(redis_url)
+            if client is not None:
+                return _shared(RedisExpiringSet(client, ttl_sec), ExpiringSet(ttl_sec), "set")
+        return ExpiringSet(ttl_sec)
+    capacity = int(os.getenv("MID_BLOOM_CAPACITY", "100000"))
+    error_rate = float(os.getenv("MID_BLOOM_ERROR_RATE", "0.0001"))
+    if redis_url:
+        client = _redis_client(redis_url)
+        if client is not None:
+            return _shared(RedisBloomFilter(client, ttl_sec, capacity, error_rate),
+                           RotatingBloomFilter(ttl_sec, capacity, error_rate), "Bloom filter")
+    return RotatingBloomFilter(ttl_sec, capacity, error_rate)
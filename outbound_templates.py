@@ -0,0 +1,204 @@
+"""
+Textele trimise de bot în DM-uri (ofertă, livrare, formulare, plată).
+
+Fără efecte la import: webhook.py le trimite, iar customer capture le
+înregistrează (OUTBOUND_TEMPLATES) ca să ignore liniile copiate înapoi de
+client. Și customer_capture.batch le importă de aici, fără să pornească
+aplicația Flask.
+"""
+
+# === Texte ofertă ===
+OFFER_TEXT_RO = (
+    
+    "❤️ Facem o astfel de lucrare după poza trimisă de dvs 😊\n\n"
+    "💖 Se realizează o schiță a pozei cu toate detaliile. \n\n"
+    "📸 La necesitate pot fi introduse careva corectări în desen \n\n"
+    "💡 Lampa este multicoloră, 16 nuanțe și o telecomandă !✨\n\n"
+    "⚡ Oferim garanție la toată electronica \n\n"
+    "🎁 Împachetăm sub formă de cadou\n\n"
+    "💰 Toate acestea la doar 779 lei !\n\n"
+    "👉 Dacă aveți o poză, vă putem face un desen pentru ca să vedeți ce se poate primi !\n\n"
+    " Dumneavoastră ați ales poza ?"
+)
+
+OFFER_TEXT_RU = (
+   
+    "❤️ Мы делаем такую работу по фотографии, которую вы отправляете 😊\n\n"
+    "💖 Создаётся эскиз вашего фото с всеми деталями.\n\n"
+    "📸 При необходимости можно внести некоторые корректировки в рисунок\n\n"
+    "💡 Лампа многоцветная, 16 оттенков и пульт дистанционного управления! ✨\n\n"
+    "⚡ Мы предоставляем гарантию на всю электронику\n\n"
+    "🎁 Упаковываем в подарочную упаковку\n\n"
+    "💰 Всё это всего за 779 лей!\n\n"
+    "👉 Если у вас есть фотография, мы можем сделать рисунок, чтобы вы увидели, что можно получить!\n\n"
+    " Вы выбрали фотографию?"
+)
+
+# === Neon sign messages ===
+NEON_SIGN_TEXT_RO = (
+    "✨ Realizăm panouri din neon personalizate!\n\n"
+    "💡 Prețul la aceste lucrări se formează în baza mărimii dorite și designului ales.\n\n"
+    "📏 Putem crea orice design dorit - text, logo-uri, forme personalizate.\n\n"
+    "🎨 Disponibile la alegerea dumneavoastră 10 culori diferite.\n\n"
+    "👉 D-voastră ați ales dimensiunea și designul dorit pentru a vă realiza o ofertă ?"
+)
+
+NEON_SIGN_TEXT_RU = (
+    "✨ Мы изготавливаем персонализированные неоновые вывески!\n\n"
+    "💡 Цена на эти работы формируется на основе желаемого размера и выбранного дизайна.\n\n"
+    "📏 Мы можем создать любой желаемый вами дизайн - текст, логотипы, персонализированные формы.\n\n"
+    "🎨 Доступны на ваш выбор 10 различных цветов.\n\n"
+    "👉 Вы выбрали размер и желаемый дизайн, чтобы мы могли подготовить вам предложение?"
+)
+
+# === Termen de execuție și livrare (ETA) ===
+ETA_TEXT = (
+    "Lucrarea se elaborează timp de 3-4 zile lucrătoare\n\n"
+    "Livrarea durează de la o zi până la trei zile independent de metodă și locație\n\n"
+    "Ați avea nevoie de produs pentru o anumită dată?\n\n"
+    "Unde va trebui de livrat produsul?"
+)
+
+ETA_TEXT_RU = (
+    "Изготовление изделия занимает 3-4 рабочих дня\n\n"
+    "Доставка длится от одного до трёх дней, в зависимости от метода и локации\n\n"
+    "Вам нужен продукт к определённой дате?\n\n"
+    "Куда необходимо будет доставить заказ?"
+)
+
+# === LIVRARE ===
+DELIVERY_TEXT = (
+    "Livrăm în toată Moldova 📦\n\n"
+    "✅ În Chișinău și Bălți: prin curier personal, timp de o zi lucrătoare, din moment ce este gata comanda, direct la adresă. Cost livrare: 65 lei.\n\n"
+    "✅ În alte localități:\n"
+    "• Prin poștă — ajunge în 3 zile lucrătoare, plata la primire (cash), 65 lei livrarea.\n"
+    "• Prin curier — 1/2 zile lucrătoare din momentul expedierii, plata pentru comandă se face în prealabil pe card, 68 lei livrarea.\n\n"
+    "Cum ați prefera să facem livrarea?"
+)
+
+DELIVERY_TEXT_RU = (
+    "Доставляем по всей Молдове 📦\n\n"
+    "✅ В Кишинёве и Бельцах: курьером лично, в течение 1 рабочего дня после готовности заказа, прямо по адресу. Стоимость доставки: 65 лей.\n\n"
+    "✅ В другие населённые пункты:\n"
+    "• Почтой — доставка за 3 рабочих дня, оплата при получении (наличными), 65 лей доставка.\n"
+    "• Курьером — 1/2 рабочих дня с момента отправки, оплата заказа предварительно на карту, доставка 68 лей.\n\n"
+    "Как вам было бы удобнее получить заказ?"
+)
+
+# === LOCATION DETECTION ===
+# Location-specific delivery messages
+LOCATION_DELIVERY_CHISINAU = (
+    "Putem livra prin curier\n\n"
+    "Livrează timp de o zi lucrătoare\n\n"
+    "Direct la adresa comodă\n\n"
+    "Sună și se înțelege din timp\n\n"
+    "Livrarea e 65 lei\n\n"
+    "La fel din Chișinău este posibilă preluarea comenzii din oficiu\n\n"
+    "De luni până vineri la adresa Feredeului 4/4\n\n"
+    "În intervalul orelor 9:00-16:00\n\n"
+    "Cum vă este mai comod ?\n"
+    "Cu livrare sau preluare din oficiu?"
+)
+
+LOCATION_DELIVERY_BALTI = (
+    "Putem livra prin curier personal, timp de o zi lucrătoare, din moment ce este gata comanda, direct la adresă. Livrarea costă 65 lei."
+)
+
+LOCATION_DELIVERY_OTHER_MD = (
+    "Se poate livra prin poștă — ajunge în 3 zile lucrătoare, plata la primire (cash), 65 lei livrarea.\n\n"
+    "Prin curier — 1/2 zile lucrătoare din momentul expedierii, plata pentru comandă se face în prealabil pe card, 68 lei livrarea.\n\n"
+    "Cum ați prefera să facem livrarea?"
+)
+
+# === DELIVERY METHOD FORMS ===
+# Form messages for different delivery method choices
+DELIVERY_FORM_OTHER_MD_COURIER = (
+    "Pentru a expedia comanda prin curier, avem nevoie de câteva date:\n\n"
+    "Numele Prenumele\n\n"
+    "Adresa și localitatea\n\n"
+    "Nr de contact"
+)
+
+DELIVERY_FORM_OTHER_MD_POST = (
+    "Pentru a expedia comanda prin poștă, avem nevoie de câteva date:\n\n"
+    "Numele Prenumele\n\n"
+    "Adresa\n\n"
+    "Codul poștal și localitatea\n\n"
+    "Nr de contact"
+)
+
+DELIVERY_FORM_CHISINAU_COURIER = (
+    "Pentru a livra comanda prin curier, avem nevoie de câteva date:\n\n"
+    "Numele Prenumele\n\n"
+    "Adresa\n\n"
+    "Nr de contact"
+)
+
+DELIVERY_FORM_BALTI_COURIER = (
+    "Pentru a livra comanda prin curier, avem nevoie de câteva date:\n\n"
+    "Numele Prenumele\n\n"
+    "Adresa\n\n"
+    "Nr de contact"
+)
+
+# === FOLLOW-UP: când clientul spune că se gândește și revine ===
+FOLLOWUP_TEXT_RO = (
+    "Dacă apar careva întrebări privitor la produsele noastre sau aveți nevoie de mai multe informații,"
+    "vă puteți adresa, noi mereu suntem dispuși pentru a reveni cu un răspuns explicit 😊\n\n"
+    "Pentru o comandă cu termen limită rugăm să ne apelați din timp!"
+)
+
+FOLLOWUP_TEXT_RU = (
+    "Если появятся вопросы по нашим товарам или возможно вам нужно больше информации,"
+    "вы можете обращаться — мы всегда готовы дать подробный ответ 😊\n\n"
+    "Для заказа с ограниченным сроком просим связаться с нами заранее!"
+)
+
+# === ACHITARE / PAYMENT ===
+PAYMENT_TEXT_RO = (
+    "De obicei, achitarea se face la primirea comenzii. "
+    "Totuși, pentru lucrările personalizate, este necesar un avans de 200 lei."
+)
+
+PAYMENT_TEXT_RU = (
+    "Обычно оплата при получении, но для персонализированных работ требуется предоплата (аванс) в размере 200 лей."
+)
+
+# === ADVANCE PAYMENT DETAILS: separate message for payment methods ===
+ADVANCE_DETAILS_TEXT_RO = (
+    "Avansul se poate achita prin transfer pe card.\n\n"
+    "5397 0200 6122 9082 cont MAIB\n\n"
+    "069177031 MIA plăți instant\n\n"
+    "După transfer, expediați o poză a chitanței, pentru confirmarea transferului."
+)
+
+ADVANCE_DETAILS_TEXT_RU = (
+    "Предоплата может быть внесена переводом на карту: "
+    "5397 0200 6122 9082 (счёт MAIB) или через MIA мгновенные платежи по номеру 062176586. "
+    "После перевода, пожалуйста, отправьте фото квитанции для подтверждения."
+)
+
+# — AVANS / PREPAY exact amount —
+ADVANCE_TEXT_RO = (
+    "Avansul e în sumă de 200 lei, se achită doar pentru lucrările personalizate!"
+)
+
+ADVANCE_TEXT_RU = (
+    "Предоплата составляет 200 лей и требуется только для персонализированных работ!"
+)
+
+
+# === Template-uri trimise de bot — customer capture le ignoră când clientul le copiază înapoi ===
+OUTBOUND_TEMPLATES = (
+    OFFER_TEXT_RO, OFFER_TEXT_RU,
+    NEON_SIGN_TEXT_RO, NEON_SIGN_TEXT_RU,
+    ETA_TEXT, ETA_TEXT_RU,
+    DELIVERY_TEXT, DELIVERY_TEXT_RU,
+    LOCATION_DELIVERY_CHISINAU, LOCATION_DELIVERY_BALTI, LOCATION_DELIVERY_OTHER_MD,
+    DELIVERY_FORM_OTHER_MD_COURIER, DELIVERY_FORM_OTHER_MD_POST,
+    DELIVERY_FORM_CHISINAU_COURIER, DELIVERY_FORM_BALTI_COURIER,
+    FOLLOWUP_TEXT_RO, FOLLOWUP_TEXT_RU,
+    PAYMENT_TEXT_RO, PAYMENT_TEXT_RU,
+    ADVANCE_TEXT_RO, ADVANCE_TEXT_RU,
+    ADVANCE_DETAILS_TEXT_RO, ADVANCE_DETAILS_TEXT_RU,
+)
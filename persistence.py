@@ -0,0 +1,288 @@
+"""
+Optional crash-safe persistence for the webhook's in-memory state.
+
+Without Redis, a deploy or crash of the worker used to wipe the MID dedup
+set, every conversation's anti-spam flags and the pending customer capture
+leads. With STATE_JOURNAL_DIR set, StateJournal keeps them on local disk:
+
+  journal.<generation>   every mutation is appended as one framed record
+                         (length, crc32, JSON [store, key, value]) with a
+                         single unbuffered write, so it survives the process
+  snapshot               one frame per store holding all of its entries,
+                         rewritten atomically (tmp + fsync + rename) by
+                         compaction, which then starts a new journal
+                         generation and deletes the old ones
+
+On startup the snapshot is read through mmap (one json.loads per store)
+and the newer journals are replayed on top; a torn last record (crash
+mid-write) fails its checksum and is ignored. Journal records hold
+absolute values, not deltas, so a record that is both in a snapshot and in
+the journal replayed after it leaves the same state.
+
+A store takes part by providing dump() -> [(key, value)], restore() of
+such pairs in order (value None deletes) and a `journal` attribute it
+calls as journal(key, value) on every change; expire(), when present, runs
+after loading. Redis-backed stores need none of this and are skipped.
+"""
+import atexit
+import fcntl
+import gc
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_JOURNAL_DIR = os.getenv("STATE_JOURNAL_DIR", "")
+STATE_SNAPSHOT_INTERVAL_SEC = float(os.getenv("STATE_SNAPSHOT_INTERVAL_SEC", "300"))
+STATE_JOURNAL_MAX_BYTES = int(os.getenv("STATE_JOURNAL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_FRAME = struct.Struct("<II")  # payload length, crc32 of payload
+_SNAPSHOT = "snapshot"
+_JOURNAL_PREFIX = "journal."
+
+
+def encode_frame(payload: object) -> bytes:
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    return _FRAME.pack(len(data), zlib.crc32(data)) + data
+
+
+def iter_frames(buf) -> Iterator[object]:
+    """Decoded payloads of buf, stopping at the first short or corrupt frame."""
+    offset, end = 0, len(buf)
+    header = _FRAME.size
+    while offset + header <= end:
+        length, crc = _FRAME.unpack_from(buf, offset)
+        start = offset + header
+        data = buf[start:start + length]
+        if len(data) < length or zlib.crc32(data) != crc:
+            logger.warning(f"State journal: ignoring {end - offset} bytes of a torn record")
+            return
+        yield json.loads(data)
+        offset = start + length
+
+
+def _read_frames(path: str) -> list:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return list(iter_frames(buf))
+
+
+class StateJournal:
+    """Append-only journal plus periodic snapshot for a set of named stores."""
+
+    def __init__(self, directory: str, snapshot_interval: float = STATE_SNAPSHOT_INTERVAL_SEC,
+                 max_journal_bytes: int = STATE_JOURNAL_MAX_BYTES):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.max_journal_bytes = max_journal_bytes
+        self.stores: dict[str, object] = {}
+        self.generation = 0
+        self.journal_bytes = 0
+        self.appended = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._compact_now = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_file = None
+
+    def attach(self, name: str, store) -> bool:
+        """Persist store under name if it supports it; call before open()."""
+        if not all(hasattr(store, attr) for attr in ("dump", "restore", "journal")):
+            return False
+        self.stores[name] = store
+        return True
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _journal_generations(self) -> list[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_JOURNAL_PREFIX) and name[len(_JOURNAL_PREFIX):].isdigit():
+                generations.append(int(name[len(_JOURNAL_PREFIX):]))
+        return sorted(generations)
+
+    def open(self) -> dict:
+        """Lock the directory, restore every attached store, start journaling. Returns load stats."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(self._path("lock"), "w")
+        # One writer per directory: a second worker would interleave its records with ours
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise
+        stats = self.load()
+        # Fold what was loaded into a fresh snapshot: drops torn tails and replayed journals
+        self.compact()
+        for name, store in self.stores.items():
+            store.journal = self._recorder(name)
+        self._thread = threading.Thread(target=self._run, name="state-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return stats
+
+    def load(self) -> dict:
+        """Apply the snapshot and newer journals to the attached stores."""
+        # Loading allocates only live objects: cyclic GC passes would just slow it down
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _load(self) -> dict:
+        start = time.perf_counter()
+        entries = 0
+        snapshot_generation = 0
+        snapshot = self._path(_SNAPSHOT)
+        if os.path.exists(snapshot):
+            frames = _read_frames(snapshot)
+            if frames:
+                snapshot_generation = frames[0]["generation"]
+                for name, items in frames[1:]:
+                    store = self.stores.get(name)
+                    if store is not None:
+                        store.restore(items)
+                        entries += len(items)
+        # Journal records keep their order within each store; stores are independent
+        pending: dict[str, list] = {name: [] for name in self.stores}
+        for generation in self._journal_generations():
+            self.generation = max(self.generation, generation)
+            if generation < snapshot_generation:
+                continue
+            for name, key, value in _read_frames(self._path(f"{_JOURNAL_PREFIX}{generation}")):
+                if name in pending:
+                    pending[name].append((key, value))
+        replayed = 0
+        for name, items in pending.items():
+            self.stores[name].restore(items)
+            replayed += len(items)
+        self.generation = max(self.generation, snapshot_generation)
+        for store in self.stores.values():
+            expire = getattr(store, "expire", None)
+            if expire is not None:
+                expire()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"State journal: restored {entries} snapshot entries and replayed "
+                    f"{replayed} journal records in {elapsed_ms:.1f} ms")
+        return {"snapshot_entries": entries, "journal_records": replayed, "ms": round(elapsed_ms, 2)}
+
+    def _recorder(self, name: str):
+        def record(key: str, value: object) -> None:
+            self.append(name, key, value)
+        return record
+
+    def append(self, name: str, key: str, value: object) -> None:
+        frame = encode_frame([name, key, value])
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(frame)
+            self.journal_bytes += len(frame)
+            self.appended += 1
+            if self.journal_bytes > self.max_journal_bytes:
+                self._compact_now.set()
+
+    def compact(self) -> None:
+        """Write a snapshot of every store, then drop the journals it covers."""
+        # Switch journals first: whatever changes from here on lands in the new
+        # generation, so the snapshot taken after the switch loses nothing
+        with self._lock:
+            self.generation += 1
+            generation = self.generation
+            old_file = self._file
+            self._file = open(self._path(f"{_JOURNAL_PREFIX}{generation}"), "ab", buffering=0)
+            self.journal_bytes = 0
+        if old_file is not None:
+            old_file.close()
+
+        frames = [encode_frame({"generation": generation})]
+        for name, store in self.stores.items():
+            frames.append(encode_frame([name, store.dump()]))
+        tmp = self._path(_SNAPSHOT + ".tmp")
+        with open(tmp, "wb") as f:
+            f.writelines(frames)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(_SNAPSHOT))
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        for old in self._journal_generations():
+            if old < generation:
+                os.remove(self._path(f"{_JOURNAL_PREFIX}{old}"))
+
+    def _run(self) -> None:
+        while True:
+            self._compact_now.wait(self.snapshot_interval)
+            self._compact_now.clear()
+            if self._file is None:
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                logger.exception(f"State snapshot failed: {e}")
+
+    def close(self) -> None:
+        """Final snapshot and stop journaling."""
+        if self._file is None:
+            return
+        try:
+            self.compact()
+        except Exception as e:
+            logger.exception(f"State snapshot on shutdown failed: {e}")
+        for store in self.stores.values():
+            store.journal = None
+        with self._lock:
+            self._file.close()
+            self._file = None
+        self._compact_now.set()
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "generation": self.generation,
+            "journal_bytes": self.journal_bytes,
+            "appended": self.appended,
+            "stores": sorted(self.stores),
+        }
+
+
+def open_state_journal(stores: dict[str, object]) -> Optional[StateJournal]:
+    """
+    StateJournal over the stores that support it, restored and running, when
+    STATE_JOURNAL_DIR is set; None otherwise or if the directory is unusable.
+    """
+    if not STATE_JOURNAL_DIR:
+        return None
+    journal = StateJournal(STATE_JOURNAL_DIR)
+    for name, store in stores.items():
+        journal.attach(name, store)
+    if not journal.stores:
+        return None
+    try:
+        journal.open()
+    except BlockingIOError:
+        logger.warning(f"State journal in {STATE_JOURNAL_DIR} is used by another worker; "
+                       "this one keeps its state in memory only")
+        return None
+    except OSError as e:
+        logger.warning(f"State journal unavailable, state in memory only: {e}")
+        return None
+    logger.info(f"State journal enabled for {', '.join(sorted(journal.stores))}")
+    return journal
@@ -0,0 +1,104 @@
+"""
+Concurrent DMs of the same user while their lead is being exported.
+
+Worker threads run process_customer_message for the interleaved DMs of many
+users (one field per DM) while another thread keeps exporting whatever each
+user has pending. No merged field may be lost: each one must end up in an
+export or still be pending. benchmarks/bench_capture_concurrency.py races the
+merges alone at scale.
+"""
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from customer_capture import state
+from customer_capture.finalizer import Finalizer
+from customer_capture.integrations import flask_hook
+from customer_capture.integrations.flask_hook import process_customer_message
+from customer_capture.state import InMemoryStore, RedisStore, ResilientStore, SqliteStore
+
+# One field per DM, each parsed with enough confidence to be merged
+DMS = ["Ion Popescu", "069123456", "str. Mihai Viteazu 25, ap. 12", "mun. Bălți"]
+FIELDS = ("full_name", "contact_number", "adress", "location")
+USERS = [f"1784150{i:08d}" for i in range(40)]
+WORKERS = 8
+
+
+class _ManualFinalizer(Finalizer):
+    """Collects deadlines without a background thread; the test exports on its own."""
+
+    def start(self) -> None:
+        pass
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    """Customers passed to export_customer, per user."""
+    exported = defaultdict(list)
+    lock = threading.Lock()
+
+    def export_customer(customer) -> bool:
+        time.sleep(0.001)  # the Sheets call: DMs keep merging meanwhile
+        with lock:
+            exported[customer.platform_user_id].append(customer)
+        return True
+
+    monkeypatch.setattr(flask_hook, "export_customer", export_customer)
+    monkeypatch.setattr(flask_hook, "FINALIZER", _ManualFinalizer(flask_hook._finalize_due))
+    return exported
+
+
+def _memory():
+    return InMemoryStore()
+
+
+def _sqlite(tmp_path):
+    return SqliteStore(str(tmp_path / "capture.db"))
+
+
+def _redis(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    return ResilientStore(RedisStore(fakeredis.FakeRedis()))
+
+
+@pytest.mark.parametrize("make_store", [lambda tmp_path: _memory(), _sqlite, _redis],
+                         ids=["memory", "sqlite", "redis"])
+def test_no_field_lost_to_a_concurrent_export(make_store, tmp_path, monkeypatch, exports):
+    store = make_store(tmp_path)
+    monkeypatch.setattr(state, "_store", store)
+    work = [(uid, text) for uid in USERS for text in DMS]
+    random.Random(0).shuffle(work)
+    done = threading.Event()
+
+    def exporter() -> None:
+        while not done.is_set():
+            for uid in USERS:
+                record = store.get(uid)
+                if record is not None:
+                    flask_hook._finalize_and_export(record)
+
+    export_thread = threading.Thread(target=exporter)
+    export_thread.start()
+    try:
+        with ThreadPoolExecutor(WORKERS) as pool:
+            list(pool.map(lambda job: process_customer_message(*job), work))
+    finally:
+        done.set()
+        export_thread.join()
+
+    missing = {}
+    for uid in USERS:
+        pending = store.get(uid)
+        for field in FIELDS:
+            values = [getattr(customer, field) for customer in exports[uid]]
+            if pending is not None:
+                values.append(getattr(pending, field))
+            if not any(values):
+                missing.setdefault(uid, []).append(field)
+    assert missing == {}
+    if isinstance(store, SqliteStore):
+        store.close()
@@ -0,0 +1,93 @@
+"""
+Reply guards and MID dedup under concurrency: each sender's claim / claim_cooldown
+and each MID must be won by exactly one worker.
+
+Workers are threads; with fakeredis each one has its own client on a shared
+server, as separate gunicorn workers would. benchmarks/bench_conversation_claims.py
+times the same race at scale.
+"""
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conversation_state import ConversationStore, RedisConversationStore
+from dedup import ExpiringSet, RedisExpiringSet
+
+SENDERS = [f"1784140{i:08d}" for i in range(300)]
+MIDS = [f"mid.{sid}" for sid in SENDERS]
+WORKERS = 8
+COOLDOWN_SEC = 3600
+
+
+def race(make_store) -> tuple[Counter, Counter]:
+    """Every worker claims the offer and the greeting of every sender, in its own order."""
+    def worker(n: int) -> tuple[list[str], list[str]]:
+        store = make_store()
+        order = SENDERS[:]
+        random.Random(n).shuffle(order)
+        offers = [sid for sid in order if store.claim(sid, "offer_sent")]
+        greetings = [sid for sid in order if store.claim_cooldown(sid, "greeting_sent_at", COOLDOWN_SEC)]
+        return offers, greetings
+
+    offers, greetings = Counter(), Counter()
+    with ThreadPoolExecutor(WORKERS) as pool:
+        for won_offers, won_greetings in pool.map(worker, range(WORKERS)):
+            offers.update(won_offers)
+            greetings.update(won_greetings)
+    return offers, greetings
+
+
+def race_mids(make_filter) -> Counter:
+    """Every worker gets every MID (webhook retries); MIDs it accepted as new, counted."""
+    def worker(n: int) -> list[str]:
+        seen = make_filter()
+        order = MIDS[:]
+        random.Random(n).shuffle(order)
+        return [mid for mid in order if not seen.check_and_add(mid)]
+
+    accepted = Counter()
+    with ThreadPoolExecutor(WORKERS) as pool:
+        for won in pool.map(worker, range(WORKERS)):
+            accepted.update(won)
+    return accepted
+
+
+def assert_each_once(wins: Counter, keys: list[str]) -> None:
+    assert {key: wins[key] for key in keys if wins[key] != 1} == {}
+
+
+@pytest.fixture
+def fake_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+def _fake_client(server):
+    import fakeredis
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+def test_memory_claims_won_once():
+    store = ConversationStore()
+    offers, greetings = race(lambda: store)
+    assert_each_once(offers, SENDERS)
+    assert_each_once(greetings, SENDERS)
+
+
+def test_redis_claims_won_once(fake_server):
+    offers, greetings = race(lambda: RedisConversationStore(_fake_client(fake_server)))
+    assert_each_once(offers, SENDERS)
+    assert_each_once(greetings, SENDERS)
+
+
+def test_memory_mids_won_once():
+    # One process: its workers (threads) share one set
+    seen = ExpiringSet(COOLDOWN_SEC)
+    assert_each_once(race_mids(lambda: seen), MIDS)
+
+
+def test_redis_mids_won_once(fake_server):
+    accepted = race_mids(lambda: RedisExpiringSet(_fake_client(fake_server), COOLDOWN_SEC))
+    assert_each_once(accepted, MIDS)
@@ -7,6 +7,7 @@ import logging
 import re
 import random
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Iterable, Tuple
 from flask import Flask, request, abort, jsonify
 
@@ -17,10 +18,31 @@ from send_message import (
     send_instagram_images,            # pentru galeria de imagini
 
 )
+from conversation_state import CONVERSATIONS, claim_cooldown, claim_flag, get_conversation
+from dedup import ExpiringSet, create_mid_filter
+from persistence import STATE_JOURNAL_DIR, open_state_journal
+from outbound_templates import (
+    OFFER_TEXT_RO, OFFER_TEXT_RU,
+    NEON_SIGN_TEXT_RO, NEON_SIGN_TEXT_RU,
+    ETA_TEXT, ETA_TEXT_RU,
+    DELIVERY_TEXT, DELIVERY_TEXT_RU,
+    LOCATION_DELIVERY_CHISINAU, LOCATION_DELIVERY_BALTI, LOCATION_DELIVERY_OTHER_MD,
+    DELIVERY_FORM_OTHER_MD_COURIER, DELIVERY_FORM_OTHER_MD_POST,
+    DELIVERY_FORM_CHISINAU_COURIER, DELIVERY_FORM_BALTI_COURIER,
+    FOLLOWUP_TEXT_RO, FOLLOWUP_TEXT_RU,
+    PAYMENT_TEXT_RO, PAYMENT_TEXT_RU,
+    ADVANCE_TEXT_RO, ADVANCE_TEXT_RU,
+    ADVANCE_DETAILS_TEXT_RO, ADVANCE_DETAILS_TEXT_RU,
+    OUTBOUND_TEMPLATES,
+)
 
 # === Customer capture integration (non-breaking) ===
 try:
-    from customer_capture.integrations.flask_hook import process_customer_message
+    from customer_capture.integrations.flask_hook import process_customer_message, resume_pending_records
+    from customer_capture.parser import get_skip_counts as get_parser_skip_counts
+    from customer_capture.prefilter import get_prefilter_stats
+    from customer_capture.state import get_store as get_capture_store
+    from customer_capture.templates import register_templates
     CUSTOMER_CAPTURE_ENABLED = True
 except ImportError:
     CUSTOMER_CAPTURE_ENABLED = False
@@ -35,67 +57,50 @@ MY_IG_USER_ID = os.getenv("IG_ID", "").strip()
 PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").strip()
 
 # === Dedup DM (MID) — 5 minute ===
-SEEN_MIDS: Dict[str, float] = {}
 DEDUP_TTL_SEC = 300
+# Cu mai mulți workeri și REDIS_URL, MID-urile stau în Redis (comune tuturor workerilor);
+# MID_DEDUP_MODE=bloom pentru volum mare
+SEEN_MIDS = create_mid_filter(DEDUP_TTL_SEC)
 
 # === Anti-spam ofertă (o singură replică per user într-un interval) ===
 OFFER_COOLDOWN_SEC = int(os.getenv("OFFER_COOLDOWN_SEC", "180"))  # default 3 min
-LAST_OFFER_AT: Dict[str, float] = {}  # sender_id -> epoch
 
 # === Dedup comentarii — 1 oră ===
-PROCESSED_COMMENTS: Dict[str, float] = {}
 COMMENT_TTL = 3600  # 1 oră în secunde
+PROCESSED_COMMENTS = ExpiringSet(COMMENT_TTL)
+
+# === Stare per conversație ===
+# Toate flag-urile anti-spam (ofertă, salut, livrare, plată, ...) și alegerile de livrare
+# stau într-un singur ConversationState per sender: get_conversation(sender_id).
+# Vezi conversation_state.py.
+
+# === Customer capture pe thread pool (opțional) ===
+# CAPTURE_WORKERS > 0: parsarea + exportul lead-urilor nu mai țin request-ul webhook-ului.
+# Merge-urile aceluiași user sunt serializate în store (update atomic), deci e sigur.
+CAPTURE_WORKERS = int(os.getenv("CAPTURE_WORKERS", "0"))
+CAPTURE_POOL = (
+    ThreadPoolExecutor(CAPTURE_WORKERS, thread_name_prefix="capture")
+    if CUSTOMER_CAPTURE_ENABLED and CAPTURE_WORKERS > 0 else None
+)
 
-# Separate anti-spam for different payment question types (one reply per conversation)
-PAYMENT_GENERAL_REPLIED: Dict[str, bool] = {}  # General payment questions
-ADVANCE_AMOUNT_REPLIED: Dict[str, bool] = {}  # Amount questions  
-ADVANCE_METHOD_REPLIED: Dict[str, bool] = {}  # Method questions
+# === Persistență locală (opțional, STATE_JOURNAL_DIR) ===
+# Fără Redis, dedup-ul MID, flag-urile anti-spam și lead-urile în curs se pierdeau la fiecare
+# deploy/crash. Cu STATE_JOURNAL_DIR setat, sunt jurnalizate pe disc și restaurate la pornire.
+# Store-urile din Redis sunt sărite automat. Vezi persistence.py.
+_persisted = {"mids": SEEN_MIDS, "comments": PROCESSED_COMMENTS, "conversations": CONVERSATIONS}
+if CUSTOMER_CAPTURE_ENABLED and STATE_JOURNAL_DIR:
+    _persisted["leads"] = get_capture_store()
+STATE_JOURNAL = open_state_journal(_persisted)
+if CUSTOMER_CAPTURE_ENABLED and (STATE_JOURNAL is not None or os.getenv("REDIS_URL")
+                                 or os.getenv("CAPTURE_SQLITE_PATH")):
+    # lead-urile restaurate (jurnal, fișier SQLite) sau rămase în coada Redis se exportă când devin due
+    resume_pending_records()
 
 REPLY_DELAY_MIN_SEC = float(os.getenv("REPLY_DELAY_MIN_SEC", "4.0"))
 REPLY_DELAY_MAX_SEC = float(os.getenv("REPLY_DELAY_MAX_SEC", "7.0"))
 
-# === Texte ofertă ===
-OFFER_TEXT_RO = (
-    
-    "❤️ Facem o astfel de lucrare după poza trimisă de dvs 😊\n\n"
-    "💖 Se realizează o schiță a pozei cu toate detaliile. \n\n"
-    "📸 La necesitate pot fi introduse careva corectări în desen \n\n"
-    "💡 Lampa este multicoloră, 16 nuanțe și o telecomandă !✨\n\n"
-    "⚡ Oferim garanție la toată electronica \n\n"
-    "🎁 Împachetăm sub formă de cadou\n\n"
-    "💰 Toate acestea la doar 779 lei !\n\n"
-    "👉 Dacă aveți o poză, vă putem face un desen pentru ca să vedeți ce se poate primi !\n\n"
-    " Dumneavoastră ați ales poza ?"
-)
-OFFER_TEXT_RU = (
-   
-    "❤️ Мы делаем такую работу по фотографии, которую вы отправляете 😊\n\n"
-    "💖 Создаётся эскиз вашего фото с всеми деталями.\n\n"
-    "📸 При необходимости можно внести некоторые корректировки в рисунок\n\n"
-    "💡 Лампа многоцветная, 16 оттенков и пульт дистанционного управления! ✨\n\n"
-    "⚡ Мы предоставляем гарантию на всю электронику\n\n"
-    "🎁 Упаковываем в подарочную упаковку\n\n"
-    "💰 Всё это всего за 779 лей!\n\n"
-    "👉 Если у вас есть фотография, мы можем сделать рисунок, чтобы вы увидели, что можно получить!\n\n"
-    " Вы выбрали фотографию?"
-)
-
-# === Neon sign messages ===
-NEON_SIGN_TEXT_RO = (
-    "✨ Realizăm panouri din neon personalizate!\n\n"
-    "💡 Prețul la aceste lucrări se formează în baza mărimii dorite și designului ales.\n\n"
-    "📏 Putem crea orice design dorit - text, logo-uri, forme personalizate.\n\n"
-    "🎨 Disponibile la alegerea dumneavoastră 10 culori diferite.\n\n"
-    "👉 D-voastră ați ales dimensiunea și designul dorit pentru a vă realiza o ofertă ?"
-)
+# === Textele trimise de bot (ofertă, livrare, formulare, plată) stau în outbound_templates.py ===
 
-NEON_SIGN_TEXT_RU = (
-    "✨ Мы изготавливаем персонализированные неоновые вывески!\n\n"
-    "💡 Цена на эти работы формируется на основе желаемого размера и выбранного дизайна.\n\n"
-    "📏 Мы можем создать любой желаемый вами дизайн - текст, логотипы, персонализированные формы.\n\n"
-    "🎨 Доступны на ваш выбор 10 различных цветов.\n\n"
-    "👉 Вы выбрали размер и желаемый дизайн, чтобы мы могли подготовить вам предложение?"
-)
 # === Mesaj public scurt sub comentariu ===
 ACK_PUBLIC_RO = "Bună 👋 V-am răspuns în privat 💌"
 ACK_PUBLIC_RU = "Здравствуйте 👋\nОтветили в личные сообщения 💌"
@@ -168,20 +173,6 @@ RU_PRICE_REGEX = re.compile(
 )
 
 
-ETA_TEXT = (
-    "Lucrarea se elaborează timp de 3-4 zile lucrătoare\n\n"
-    "Livrarea durează de la o zi până la trei zile independent de metodă și locație\n\n"
-    "Ați avea nevoie de produs pentru o anumită dată?\n\n"
-    "Unde va trebui de livrat produsul?"
-)
-
-ETA_TEXT_RU = (
-    "Изготовление изделия занимает 3-4 рабочих дня\n\n"
-    "Доставка длится от одного до трёх дней, в зависимости от метода и локации\n\n"
-    "Вам нужен продукт к определённой дате?\n\n"
-    "Куда необходимо будет доставить заказ?"
-)
-
 # === Regex pentru întrebări despre timp/termen (RO + RU) ===
 ETA_PATTERNS_RO = [
     r"\bîn\s+c[âa]t\s+timp\b",
@@ -314,28 +305,7 @@ ETA_PATTERNS_RU = [
 
 ETA_REGEX = re.compile("|".join(ETA_PATTERNS_RO + ETA_PATTERNS_RU), re.IGNORECASE)
 
-# === Anti-spam ETA: răspunde o singură dată per conversație (per user) ===
-ETA_REPLIED: Dict[str, bool] = {} 
-
-# === LIVRARE: text + trigger intent (RO+RU) ===
-DELIVERY_TEXT = (
-    "Livrăm în toată Moldova 📦\n\n"
-    "✅ În Chișinău și Bălți: prin curier personal, timp de o zi lucrătoare, din moment ce este gata comanda, direct la adresă. Cost livrare: 65 lei.\n\n"
-    "✅ În alte localități:\n"
-    "• Prin poștă — ajunge în 3 zile lucrătoare, plata la primire (cash), 65 lei livrarea.\n"
-    "• Prin curier — 1/2 zile lucrătoare din momentul expedierii, plata pentru comandă se face în prealabil pe card, 68 lei livrarea.\n\n"
-    "Cum ați prefera să facem livrarea?"
-)
-
-DELIVERY_TEXT_RU = (
-    "Доставляем по всей Молдове 📦\n\n"
-    "✅ В Кишинёве и Бельцах: курьером лично, в течение 1 рабочего дня после готовности заказа, прямо по адресу. Стоимость доставки: 65 лей.\n\n"
-    "✅ В другие населённые пункты:\n"
-    "• Почтой — доставка за 3 рабочих дня, оплата при получении (наличными), 65 лей доставка.\n"
-    "• Курьером — 1/2 рабочих дня с момента отправки, оплата заказа предварительно на карту, доставка 68 лей.\n\n"
-    "Как вам было бы удобнее получить заказ?"
-)
-
+# === LIVRARE: trigger intent (RO+RU) ===
 # Cuvinte-cheie/întrebări pentru livrare (intenție explicită), fără a include executarea/ETA
 DELIVERY_PATTERNS_RO = [
     r"\bcum\s+se\s+face\s+livrarea\b",
@@ -416,73 +386,7 @@ NEON_SIGN_PATTERNS_RU = [
 
 NEON_SIGN_REGEX = re.compile("|".join(NEON_SIGN_PATTERNS_RO + NEON_SIGN_PATTERNS_RU), re.IGNORECASE)
 
-# Anti-spam livrare: STRICT - o singură dată per conversație (nu mai trimite niciodată după prima dată)
-DELIVERY_REPLIED: Dict[str, bool] = {}
-
-# Anti-spam formulare livrare: STRICT - o singură dată per conversație
-DELIVERY_FORM_REPLIED: Dict[str, bool] = {}
-
-# Track user's location and delivery method choice
-USER_LOCATION_CHOICE: Dict[str, str] = {}  # sender_id -> location (CHISINAU, BALTI, OTHER_MD)
-USER_SPECIFIC_LOCATION: Dict[str, str] = {}  # sender_id -> specific location name (e.g., "Telenești")
-USER_DELIVERY_METHOD: Dict[str, str] = {}  # sender_id -> method (curier, posta)
-
 # === LOCATION DETECTION ===
-# Location-specific delivery messages
-LOCATION_DELIVERY_CHISINAU = (
-    "Putem livra prin curier\n\n"
-    "Livrează timp de o zi lucrătoare\n\n"
-    "Direct la adresa comodă\n\n"
-    "Sună și se înțelege din timp\n\n"
-    "Livrarea e 65 lei\n\n"
-    "La fel din Chișinău este posibilă preluarea comenzii din oficiu\n\n"
-    "De luni până vineri la adresa Feredeului 4/4\n\n"
-    "În intervalul orelor 9:00-16:00\n\n"
-    "Cum vă este mai comod ?\n"
-    "Cu livrare sau preluare din oficiu?"
-)
-
-LOCATION_DELIVERY_BALTI = (
-    "Putem livra prin curier personal, timp de o zi lucrătoare, din moment ce este gata comanda, direct la adresă. Livrarea costă 65 lei."
-)
-
-LOCATION_DELIVERY_OTHER_MD = (
-    "Se poate livra prin poștă — ajunge în 3 zile lucrătoare, plata la primire (cash), 65 lei livrarea.\n\n"
-    "Prin curier — 1/2 zile lucrătoare din momentul expedierii, plata pentru comandă se face în prealabil pe card, 68 lei livrarea.\n\n"
-    "Cum ați prefera să facem livrarea?"
-)
-
-# === DELIVERY METHOD FORMS ===
-# Form messages for different delivery method choices
-DELIVERY_FORM_OTHER_MD_COURIER = (
-    "Pentru a expedia comanda prin curier, avem nevoie de câteva date:\n\n"
-    "Numele Prenumele\n\n"
-    "Adresa și localitatea\n\n"
-    "Nr de contact"
-)
-
-DELIVERY_FORM_OTHER_MD_POST = (
-    "Pentru a expedia comanda prin poștă, avem nevoie de câteva date:\n\n"
-    "Numele Prenumele\n\n"
-    "Adresa\n\n"
-    "Codul poștal și localitatea\n\n"
-    "Nr de contact"
-)
-
-DELIVERY_FORM_CHISINAU_COURIER = (
-    "Pentru a livra comanda prin curier, avem nevoie de câteva date:\n\n"
-    "Numele Prenumele\n\n"
-    "Adresa\n\n"
-    "Nr de contact"
-)
-
-DELIVERY_FORM_BALTI_COURIER = (
-    "Pentru a livra comanda prin curier, avem nevoie de câteva date:\n\n"
-    "Numele Prenumele\n\n"
-    "Adresa\n\n"
-    "Nr de contact"
-)
-
 # Location detection patterns
 CHISINAU_PATTERNS = [
     r"\bchisinau\b", r"\bchișinău\b", r"\bchisinău\b", r"\bchișinau\b",
@@ -542,30 +446,10 @@ CHISINAU_REGEX = re.compile("|".join(CHISINAU_PATTERNS), re.IGNORECASE)
 BALTI_REGEX = re.compile("|".join(BALTI_PATTERNS), re.IGNORECASE)
 OTHER_MD_REGEX = re.compile("|".join(OTHER_MD_PATTERNS), re.IGNORECASE)
 
-# Anti-spam for location-specific delivery messages
-LOCATION_DELIVERY_REPLIED: Dict[str, str] = {}  # sender_id -> location_category
-
 # Anti-spam thank you: răspunde cu cooldown pentru a evita spam-ul
-THANK_YOU_REPLIED: Dict[str, float] = {}  # sender_id -> timestamp
 THANK_YOU_COOLDOWN_SEC = 30  # 30 seconds cooldown between thank you responses
 
-# Anti-spam goodbye: răspunde o singură dată per conversație
-GOODBYE_REPLIED: Dict[str, bool] = {}
-
-# === Galeria de imagini - o singură dată per conversație ===
-GALLERY_SENT: Dict[str, bool] = {}
-
-# === Galeria de imagini neon - o singură dată per conversație ===
-NEON_GALLERY_SENT: Dict[str, bool] = {}
-
-# === Ofertă text - o singură dată per conversație ===
-OFFER_SENT: Dict[str, bool] = {}
-
-# === Neon sign - o singură dată per conversație ===
-NEON_SIGN_SENT: Dict[str, bool] = {}
-
 # === Greeting logic - răspunde cu cooldown de 6 ore pentru a evita spam-ul ===
-GREETING_SENT: Dict[str, float] = {}  # sender_id -> timestamp
 GREETING_COOLDOWN_SEC = 6 * 60 * 60  # 6 hours in seconds
 
 # === Manual greeting detection patterns ===
@@ -909,22 +793,6 @@ FOLLOWUP_PATTERNS_RU = [
 FOLLOWUP_REGEX = re.compile("|".join(FOLLOWUP_PATTERNS_RO + FOLLOWUP_PATTERNS_RU), re.IGNORECASE)
 
 
-# Anti-spam: răspunde doar o dată pe conversație
-FOLLOWUP_REPLIED: Dict[str, bool] = {}
-
-# === FOLLOW-UP: când clientul spune că se gândește și revine ===
-FOLLOWUP_TEXT_RO = (
-    "Dacă apar careva întrebări privitor la produsele noastre sau aveți nevoie de mai multe informații,"
-    "vă puteți adresa, noi mereu suntem dispuși pentru a reveni cu un răspuns explicit 😊\n\n"
-    "Pentru o comandă cu termen limită rugăm să ne apelați din timp!"
-)
-
-FOLLOWUP_TEXT_RU = (
-    "Если появятся вопросы по нашим товарам или возможно вам нужно больше информации,"
-    "вы можете обращаться — мы всегда готовы дать подробный ответ 😊\n\n"
-    "Для заказа с ограниченным сроком просим связаться с нами заранее!"
-)
-
 # === THANK YOU RESPONSE ===
 THANK_YOU_TEXT = "Cu mare drag 💜⚡️"
 
@@ -1085,31 +953,7 @@ GOODBYE_PATTERNS_RU = [
 
 GOODBYE_REGEX = re.compile("|".join(GOODBYE_PATTERNS_RO + GOODBYE_PATTERNS_RU), re.IGNORECASE)
 
-# === ACHITARE / PAYMENT: text + trigger intent (RO+RU) ===
-PAYMENT_TEXT_RO = (
-    "De obicei, achitarea se face la primirea comenzii. "
-    "Totuși, pentru lucrările personalizate, este necesar un avans de 200 lei."
-)
-
-PAYMENT_TEXT_RU = (
-    "Обычно оплата при получении, но для персонализированных работ требуется предоплата (аванс) в размере 200 лей."
-)
-
-# === ADVANCE PAYMENT DETAILS: separate message for payment methods ===
-ADVANCE_DETAILS_TEXT_RO = (
-    "Avansul se poate achita prin transfer pe card.\n\n"
-    "5397 0200 6122 9082 cont MAIB\n\n"
-    "069177031 MIA plăți instant\n\n"
-    "După transfer, expediați o poză a chitanței, pentru confirmarea transferului."
-)
-
-ADVANCE_DETAILS_TEXT_RU = (
-    "Предоплата может быть внесена переводом на карту: "
-    "5397 0200 6122 9082 (счёт MAIB) или через MIA мгновенные платежи по номеру 062176586. "
-    "После перевода, пожалуйста, отправьте фото квитанции для подтверждения."
-)
-
-
+# === ACHITARE / PAYMENT: trigger intent (RO+RU) ===
 
 # RO — întrebări / fraze despre plată/achitare (GENERAL, nu specific pentru avans)
 PAYMENT_PATTERNS_RO = [
@@ -1184,10 +1028,6 @@ PAYMENT_PATTERNS_RU = [
 PAYMENT_REGEX = re.compile("|".join(PAYMENT_PATTERNS_RO + PAYMENT_PATTERNS_RU), re.IGNORECASE)
 
 # Anti-spam plată: o singură dată per user/conversație
-# — AVANS / PREPAY exact amount —
-ADVANCE_TEXT_RO = (
-    "Avansul e în sumă de 200 lei, se achită doar pentru lucrările personalizate!"
-)
 
 # === Helpers: stricter gating to avoid accidental payment replies ===
 def _is_explicit_payment_question(text: str) -> bool:
@@ -1207,10 +1047,6 @@ def _is_explicit_payment_question(text: str) -> bool:
         return True
     return bool(PAYMENT_REGEX.search(text) or ADVANCE_REGEX.search(text) or ADVANCE_AMOUNT_REGEX.search(text))
 
-ADVANCE_TEXT_RU = (
-    "Предоплата составляет 200 лей и требуется только для персонализированных работ!"
-)
-
 # RO — întrebări specifice despre avans (doar generale, nu sumă/metodă)
 ADVANCE_PATTERNS_RO = [
     r"\beste\s+nevoie\s+de\s+avans\b",
@@ -1507,6 +1343,10 @@ def _select_payment_message(lang: str, text: str, sender_id: str = None) -> str:
     return PAYMENT_TEXT_RU if has_cyr or lang == "RU" else PAYMENT_TEXT_RO
 
 
+# === Template-uri trimise de bot — customer capture le ignoră când clientul le copiază înapoi ===
+if CUSTOMER_CAPTURE_ENABLED:
+    register_templates(OUTBOUND_TEMPLATES)
+
 # ---------- Helpers comune ----------
 def _verify_signature() -> bool:
     """Verifică X-Hub-Signature-256 dacă APP_SECRET e setat."""
@@ -1520,23 +1360,13 @@ def _verify_signature() -> bool:
 
 def _is_duplicate_mid(mid: str) -> bool:
     """Dedup DM după MID (5 min)."""
-    now = time.time()
-    last = SEEN_MIDS.get(mid, 0.0)
-    if now - last < DEDUP_TTL_SEC:
-        return True
-    SEEN_MIDS[mid] = now
-    # curățare ocazională
-    for k, ts in list(SEEN_MIDS.items()):
-        if now - ts > DEDUP_TTL_SEC:
-            SEEN_MIDS.pop(k, None)
-    return False
+    # expirarea scoate doar MID-urile vechi din capul cozii, fără să parcurgă tot
+    return SEEN_MIDS.check_and_add(mid)
 
 def _should_send_offer(sender_id: str) -> bool:
     """Anti-spam: o singură ofertă per user per conversație (o singură dată)."""
-    if OFFER_SENT.get(sender_id):
-        return False
-    OFFER_SENT[sender_id] = True  # set BEFORE sending to prevent race conditions
-    return True
+    # test-and-set atomic: doar primul request (din orice worker) primește True
+    return claim_flag(sender_id, "offer_sent")
 
 def _detect_neon_sign_lang(text: str) -> str | None:
     """
@@ -1560,10 +1390,7 @@ def _detect_neon_sign_lang(text: str) -> str | None:
 
 def _should_send_neon_sign(sender_id: str) -> bool:
     """Anti-spam: o singură dată per user per conversație (o singură dată)."""
-    if NEON_SIGN_SENT.get(sender_id):
-        return False
-    NEON_SIGN_SENT[sender_id] = True  # set BEFORE sending to prevent race conditions
-    return True
+    return claim_flag(sender_id, "neon_sign_sent")
 
 def _is_manual_greeting(text: str) -> bool:
     """
@@ -1585,18 +1412,11 @@ def _should_send_greeting(sender_id: str, text: str) -> str | None:
     if not text:
         return None
     
-    import time
-    now = time.time()
-    
-    # Verifică dacă a trecut suficient timp de la ultimul salut
-    last_greeting = GREETING_SENT.get(sender_id, 0.0)
-    if now - last_greeting < GREETING_COOLDOWN_SEC:
+    # Verifică și setează atomic timestamp-ul (înainte de trimitere) dacă a trecut cooldown-ul
+    if not claim_cooldown(sender_id, "greeting_sent_at", GREETING_COOLDOWN_SEC):
         app.logger.info(f"[GREETING_COOLDOWN] sender={sender_id} - cooldown active, skipping")
         return None
     
-    # Setează timestamp-ul înainte de trimitere pentru a preveni race conditions
-    GREETING_SENT[sender_id] = now
-    
     # Determină limba bazată pe textul primit
     lang = "RU" if CYRILLIC_RE.search(text) else "RO"
     
@@ -1810,6 +1630,7 @@ def _handle_multiple_intents(sender_id: str, intents: list[tuple[str, str]], tex
         return
     
     app.logger.info("[MULTI_INTENT_PROCESSING] sender=%s intents=%s", sender_id, intents)
+    conv = get_conversation(sender_id)
     
     # Ordonează intențiile în funcție de ordinea în care apar în text
     ordered_intents = _order_intents_by_text_position(intents, text)
@@ -1827,11 +1648,11 @@ def _handle_multiple_intents(sender_id: str, intents: list[tuple[str, str]], tex
                     app.logger.info("[MULTI_INTENT_OFFER] sender=%s lang=%s", sender_id, lang)
                     
                     # Galeria de imagini pentru ofertă
-                    if not GALLERY_SENT.get(sender_id):
+                    if not conv.gallery_sent:
                         media_list = OFFER_MEDIA_RU if lang == "RU" else OFFER_MEDIA_RO
                         if PUBLIC_BASE_URL.startswith("https://") and all(u.endswith((".jpg",".jpeg",".png",".webp")) for u in media_list):
-                            GALLERY_SENT[sender_id] = True
-                            _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
+                            if claim_flag(sender_id, "gallery_sent"):  # set BEFORE scheduling, atomic
+                                _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
             
             elif intent_type == 'delivery':
                 # Folosește logica originală pentru livrare
@@ -1860,7 +1681,7 @@ def _handle_multiple_intents(sender_id: str, intents: list[tuple[str, str]], tex
             elif intent_type == 'delivery_method_choice':
                 # Handle delivery method choice (curier/poștă)
                 # STRICT ANTI-SPAM: O singură dată per conversație
-                if DELIVERY_FORM_REPLIED.get(sender_id):
+                if conv.delivery_form_replied:
                     app.logger.info("[MULTI_INTENT_DELIVERY_FORM_BLOCKED] sender=%s - delivery form already sent in this conversation", sender_id)
                 else:
                     delivery_choice = _detect_delivery_method_choice(sender_id, text)
@@ -1882,8 +1703,9 @@ def _handle_multiple_intents(sender_id: str, intents: list[tuple[str, str]], tex
                         else:
                             continue
                         
-                        # STRICT: Marchează că am trimis un formular de livrare
-                        DELIVERY_FORM_REPLIED[sender_id] = True
+                        # STRICT: Marchează atomic că am trimis un formular de livrare
+                        if not claim_flag(sender_id, "delivery_form_replied"):
+                            continue
                         _send_dm_delayed(sender_id, form_msg[:900], seconds=delay_seconds)
                         app.logger.info("[MULTI_INTENT_DELIVERY_FORM] sender=%s location=%s method=%s", sender_id, location_category, method)
             
@@ -1940,12 +1762,12 @@ def _handle_multiple_intents(sender_id: str, intents: list[tuple[str, str]], tex
                     app.logger.info("[MULTI_INTENT_NEON_SIGN] sender=%s lang=%s", sender_id, lang)
                     
                     # Galeria de imagini pentru panouri neon - DOAR pentru neon_sign intent
-                    if not NEON_GALLERY_SENT.get(sender_id):
+                    if not conv.neon_gallery_sent:
                         media_list = NEON_SIGN_MEDIA_RU if lang == "RU" else NEON_SIGN_MEDIA_RO
                         if PUBLIC_BASE_URL.startswith("https://") and all(u.endswith((".jpg",".jpeg",".png",".webp")) for u in media_list):
-                            NEON_GALLERY_SENT[sender_id] = True
-                            _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
-                            app.logger.info("[NEON_GALLERY_SENT] sender=%s lang=%s - neon images sent", sender_id, lang)
+                            if claim_flag(sender_id, "neon_gallery_sent"):  # set BEFORE scheduling, atomic
+                                _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
+                                app.logger.info("[NEON_GALLERY_SENT] sender=%s lang=%s - neon images sent", sender_id, lang)
                     
         except Exception as e:
             app.logger.exception("Failed to process multi-intent %s for sender %s: %s", intent_type, sender_id, e)
@@ -2178,7 +2000,8 @@ def _should_send_location_delivery(sender_id: str, text: str) -> tuple[str, str]
         return None
     
     # STRICT RULE: Dacă am trimis deja orice mesaj de livrare, nu mai trimite
-    if DELIVERY_REPLIED.get(sender_id):
+    state = get_conversation(sender_id)
+    if state.delivery_replied:
         app.logger.info(f"[LOCATION_DELIVERY_BLOCKED] sender={sender_id} - delivery message already sent in this conversation")
         return None
     
@@ -2211,23 +2034,21 @@ def _should_send_location_delivery(sender_id: str, text: str) -> tuple[str, str]
     
     # STRICT RULE: O singură dată per conversație - nu mai permite locații diferite
     # Dacă am trimis deja orice mesaj de livrare, nu mai trimite
-    if DELIVERY_REPLIED.get(sender_id):
+    # STRICT: Marchează atomic că am trimis un mesaj de livrare (global flag)
+    if not claim_flag(sender_id, "delivery_replied"):
         return None
     
     # Setează flag-ul pentru această locație
-    LOCATION_DELIVERY_REPLIED[sender_id] = location
-    
-    # STRICT: Marchează că am trimis un mesaj de livrare (global flag)
-    DELIVERY_REPLIED[sender_id] = True
+    state.location_delivery = location
     
     # Track user's location choice for delivery method detection
-    USER_LOCATION_CHOICE[sender_id] = location
+    state.location_choice = location
     
     # If it's OTHER_MD, try to extract the specific location name
     if location == "OTHER_MD":
         specific_location = _extract_specific_location_name(text)
         if specific_location:
-            USER_SPECIFIC_LOCATION[sender_id] = specific_location
+            state.specific_location = specific_location
             app.logger.info(f"[SPECIFIC_LOCATION_CAPTURED] sender={sender_id} location={specific_location}")
     
     # Determină limba
@@ -2244,6 +2065,7 @@ def _detect_delivery_method_choice(sender_id: str, text: str) -> tuple[str, str]
         return None
     
     text_lower = text.lower().strip()
+    state = get_conversation(sender_id)
     
     # Verifică dacă utilizatorul a ales curier
     curier_patterns = [
@@ -2263,24 +2085,24 @@ def _detect_delivery_method_choice(sender_id: str, text: str) -> tuple[str, str]
     # Verifică dacă a ales curier
     if any(re.search(pattern, text_lower) for pattern in curier_patterns):
         # Verifică dacă știm locația utilizatorului
-        user_location = USER_LOCATION_CHOICE.get(sender_id)
+        user_location = state.location_choice
         if user_location:
-            USER_DELIVERY_METHOD[sender_id] = "curier"
+            state.delivery_method = "curier"
             return (user_location, "curier")
     
     # Verifică dacă a ales poștă
     elif any(re.search(pattern, text_lower) for pattern in posta_patterns):
         # Verifică dacă știm locația utilizatorului
-        user_location = USER_LOCATION_CHOICE.get(sender_id)
+        user_location = state.location_choice
         if user_location:
-            USER_DELIVERY_METHOD[sender_id] = "posta"
+            state.delivery_method = "posta"
             return (user_location, "posta")
         else:
             # Dacă utilizatorul alege "poștă" fără să fi specificat locația,
             # înseamnă că este în alte localități (poșta e disponibilă doar pentru OTHER_MD)
             # Nu setăm curier pentru Chișinău/Bălți - acolo e doar curier
-            USER_DELIVERY_METHOD[sender_id] = "posta"
-            USER_LOCATION_CHOICE[sender_id] = "OTHER_MD"  # Setăm implicit ca OTHER_MD
+            state.delivery_method = "posta"
+            state.location_choice = "OTHER_MD"  # Setăm implicit ca OTHER_MD
             app.logger.info(f"[DELIVERY_METHOD_CHOICE_DEFAULT] sender={sender_id} chose posta without location, defaulting to OTHER_MD")
             return ("OTHER_MD", "posta")
     
@@ -2298,13 +2120,15 @@ def _should_send_delivery(sender_id: str, text: str) -> str | None:
         return None
     
     # STRICT RULE: Dacă am trimis deja orice mesaj de livrare, nu mai trimite
-    if DELIVERY_REPLIED.get(sender_id):
+    state = get_conversation(sender_id)
+    if state.delivery_replied:
         app.logger.info(f"[DELIVERY_BLOCKED] sender={sender_id} - delivery message already sent in this conversation")
         return None
     
     if DELIVERY_REGEX.search(text):
-        # STRICT: Marchează că am trimis un mesaj de livrare (global flag)
-        DELIVERY_REPLIED[sender_id] = True
+        # STRICT: Marchează atomic că am trimis un mesaj de livrare (global flag)
+        if not claim_flag(sender_id, "delivery_replied"):
+            return None
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     return None
 
@@ -2316,9 +2140,8 @@ def _should_send_eta(sender_id: str, text: str) -> str | None:
     if not text:
         return None
     if ETA_REGEX.search(text):
-        if ETA_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "eta_replied"):
             return None
-        ETA_REPLIED[sender_id] = True
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     return None
 
@@ -2330,9 +2153,8 @@ def _should_send_followup(sender_id: str, text: str) -> str | None:
     if not text:
         return None
     if FOLLOWUP_REGEX.search(text):
-        if FOLLOWUP_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "followup_replied"):
             return None
-        FOLLOWUP_REPLIED[sender_id] = True
         # limbă: dacă textul conține chirilice -> RU
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     return None
@@ -2355,17 +2177,10 @@ def _should_send_thank_you(sender_id: str, text: str) -> str | None:
         return None
     
     if THANK_YOU_REGEX.search(clean_text):
-        import time
-        now = time.time()
-        
-        # Check if enough time has passed since last thank you response
-        last_thank_you = THANK_YOU_REPLIED.get(sender_id, 0.0)
-        if now - last_thank_you < THANK_YOU_COOLDOWN_SEC:
+        # Check and update the timestamp atomically if the cooldown has passed
+        if not claim_cooldown(sender_id, "thank_you_at", THANK_YOU_COOLDOWN_SEC):
             app.logger.info(f"[THANK_YOU_COOLDOWN] sender={sender_id} - cooldown active, skipping")
             return None
-        
-        # Update timestamp and allow response
-        THANK_YOU_REPLIED[sender_id] = now
         app.logger.info(f"[THANK_YOU_MATCH] sender={sender_id} text={text[:50]}...")
         
         # limbă: dacă textul conține chirilice -> RU
@@ -2380,9 +2195,8 @@ def _should_send_goodbye(sender_id: str, text: str) -> str | None:
     if not text:
         return None
     if GOODBYE_REGEX.search(text):
-        if GOODBYE_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "goodbye_replied"):
             return None
-        GOODBYE_REPLIED[sender_id] = True
         # limbă: dacă textul conține chirilice -> RU
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     return None
@@ -2465,41 +2279,28 @@ def _should_send_payment(sender_id: str, text: str) -> str | None:
         app.logger.info("[DESIGN_MESSAGE_DETECTED] sender=%s text=%r - skipping payment response", sender_id, text)
         return None
 
-    now = time.time()
-    # Cleanup old thank you timestamps (keep for 1 hour)
-    for uid, ts in list(THANK_YOU_REPLIED.items()):
-        if now - ts > 3600:  # 1 hour
-            THANK_YOU_REPLIED.pop(uid, None)
-    # Cleanup old greeting timestamps (keep for 24 hours)
-    for uid, ts in list(GREETING_SENT.items()):
-        if now - ts > 86400:  # 24 hours
-            GREETING_SENT.pop(uid, None)
-
     # Verifică tipul de întrebare și anti-spam specific (ordinea contează!)
     if ADVANCE_AMOUNT_REGEX.search(text):
         # Întrebare despre SUMA avansului (prioritate înaltă)
-        if ADVANCE_AMOUNT_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "advance_amount_replied"):
             app.logger.info("[ADVANCE_AMOUNT_SPAM_GUARD] sender=%s text=%r", sender_id, text)
             return None
-        ADVANCE_AMOUNT_REPLIED[sender_id] = True
         app.logger.info("[ADVANCE_AMOUNT_MATCH] sender=%s text=%r", sender_id, text)
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     
     elif (("avans" in text.lower()) or ("предоплат" in text.lower()) or ("аванс" in text.lower())) and ADVANCE_METHOD_REGEX.search(text):
         # Întrebare despre METODA de achitare (prioritate înaltă)
-        if ADVANCE_METHOD_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "advance_method_replied"):
             app.logger.info("[ADVANCE_METHOD_SPAM_GUARD] sender=%s text=%r", sender_id, text)
             return None
-        ADVANCE_METHOD_REPLIED[sender_id] = True
         app.logger.info("[ADVANCE_METHOD_MATCH] sender=%s text=%r", sender_id, text)
         return "RU" if CYRILLIC_RE.search(text) else "RO"
     
     elif PAYMENT_REGEX.search(text) or ADVANCE_REGEX.search(text):
         # Întrebare generală despre plată/avans (prioritate joasă)
-        if PAYMENT_GENERAL_REPLIED.get(sender_id):
+        if not claim_flag(sender_id, "payment_general_replied"):
             app.logger.info("[PAYMENT_GENERAL_SPAM_GUARD] sender=%s text=%r", sender_id, text)
             return None
-        PAYMENT_GENERAL_REPLIED[sender_id] = True
         app.logger.info("[PAYMENT_GENERAL_MATCH] sender=%s text=%r", sender_id, text)
         return "RU" if CYRILLIC_RE.search(text) else "RO"
 
@@ -2507,10 +2308,39 @@ def _should_send_payment(sender_id: str, text: str) -> str | None:
 
 
 
+def _capture_in_background(sender_id: str, text: str, location_context, specific_location) -> None:
+    try:
+        process_customer_message(
+            platform_user_id=sender_id,
+            text=text,
+            location_context=location_context,
+            specific_location=specific_location
+        )
+    except Exception as e:
+        app.logger.warning(f"[CUSTOMER_CAPTURE] Error processing message: {e}")
+
+
 # ---------- Routes ----------
+@app.teardown_request
+def _flush_conversations(exc=None):
+    # scrie înapoi (o singură dată) flag-urile modificate în request
+    try:
+        CONVERSATIONS.flush()
+    except Exception:
+        app.logger.exception("Conversation state flush failed")
+
 @app.get("/health")
 def health():
-    return {"ok": True}, 200
+    body = {"ok": True, "conversations": CONVERSATIONS.stats()}
+    if CUSTOMER_CAPTURE_ENABLED:
+        body["capture_store"] = get_capture_store().stats()
+        # extractoare sărite pentru câmpuri deja stabilite în lead (vezi AggregationRecord.settled_fields)
+        body["capture_parser_skips"] = get_parser_skip_counts()
+        # DM-uri trimise la parser / oprite de prefiltru
+        body["capture_prefilter"] = get_prefilter_stats()
+    if STATE_JOURNAL is not None:
+        body["state_journal"] = STATE_JOURNAL.stats()
+    return body, 200
 
 # Handshake (GET /webhook)
 @app.get("/webhook")
@@ -2569,16 +2399,10 @@ def webhook():
             if not comment_id:
                 continue
 
-            # DEDUP comentarii
-            now = time.time()
-            # curățare TTL
-            for old_cid, ts in list(PROCESSED_COMMENTS.items()):
-                if now - ts > COMMENT_TTL:
-                    del PROCESSED_COMMENTS[old_cid]
-            if comment_id in PROCESSED_COMMENTS:
+            # DEDUP comentarii (expirare TTL inclusă)
+            if PROCESSED_COMMENTS.check_and_add(comment_id):
                 app.logger.info(f"[comments] Comment {comment_id} already processed, skipping")
                 continue
-            PROCESSED_COMMENTS[comment_id] = now
             app.logger.info(f"[comments] Processing new comment {comment_id}, text length: {len(text) if text else 0}")
 
             # Verifică dacă comentariul conține intent de preț
@@ -2609,7 +2433,10 @@ def webhook():
                 app.logger.exception(f"[comments] Public reply failed for {comment_id}")
 
     # --- 2) Fluxul de MESAJE (DM) — trigger ofertă + anti-spam ---
-    for sender_id, msg in _iter_message_events(data):
+    events = list(_iter_message_events(data))
+    # o singură citire (pipeline) pentru starea tuturor expeditorilor din request
+    CONVERSATIONS.prefetch(sender_id for sender_id, msg in events if not msg.get("is_echo"))
+    for sender_id, msg in events:
         if msg.get("is_echo"):
             continue
         
@@ -2640,19 +2467,25 @@ def webhook():
 
         attachments = msg.get("attachments") if isinstance(msg.get("attachments"), list) else []
         app.logger.info("EVENT sender=%s text=%r attachments=%d", sender_id, text_in, len(attachments))
+        conv = get_conversation(sender_id)
 
         # === Customer capture integration (non-blocking) ===
         if CUSTOMER_CAPTURE_ENABLED and text_in:
             try:
                 # Get location context if available
-                location_context = USER_LOCATION_CHOICE.get(sender_id)
-                specific_location = USER_SPECIFIC_LOCATION.get(sender_id)
-                process_customer_message(
-                    platform_user_id=sender_id, 
-                    text=text_in, 
-                    location_context=location_context,
-                    specific_location=specific_location
-                )
+                location_context = conv.location_choice
+                specific_location = conv.specific_location
+                if CAPTURE_POOL is not None:
+                    CAPTURE_POOL.submit(
+                        _capture_in_background, sender_id, text_in, location_context, specific_location
+                    )
+                else:
+                    process_customer_message(
+                        platform_user_id=sender_id, 
+                        text=text_in, 
+                        location_context=location_context,
+                        specific_location=specific_location
+                    )
             except Exception as e:
                 app.logger.warning(f"[CUSTOMER_CAPTURE] Error processing message: {e}")
 
@@ -2719,7 +2552,7 @@ def webhook():
         # --- DELIVERY METHOD CHOICE ---
         # Detectează alegerea metodei de livrare (curier/poștă)
         # STRICT ANTI-SPAM: O singură dată per conversație
-        if DELIVERY_FORM_REPLIED.get(sender_id):
+        if conv.delivery_form_replied:
             app.logger.info("[DELIVERY_FORM_BLOCKED] sender=%s - delivery form already sent in this conversation", sender_id)
         else:
             delivery_choice = _detect_delivery_method_choice(sender_id, text_in)
@@ -2742,8 +2575,10 @@ def webhook():
                     else:
                         continue
                     
-                    # STRICT: Marchează că am trimis un formular de livrare
-                    DELIVERY_FORM_REPLIED[sender_id] = True
+                    # STRICT: Marchează atomic că am trimis un formular de livrare
+                    if not claim_flag(sender_id, "delivery_form_replied"):
+                        app.logger.info("[DELIVERY_FORM_BLOCKED] sender=%s - claimed concurrently", sender_id)
+                        continue
                     _send_dm_delayed(sender_id, form_msg[:900])
                     app.logger.info("[DELIVERY_FORM_SENT] sender=%s location=%s method=%s", sender_id, location_category, method)
                 except Exception as e:
@@ -2815,12 +2650,12 @@ def webhook():
             
             # Galeria de imagini pentru panouri neon - DOAR pentru neon_sign intent
             # Never sent for lamp/offer intents - only when specific neon patterns are detected
-            if not NEON_GALLERY_SENT.get(sender_id):
+            if not conv.neon_gallery_sent:
                 media_list = NEON_SIGN_MEDIA_RU if neon_lang == "RU" else NEON_SIGN_MEDIA_RO
                 if PUBLIC_BASE_URL.startswith("https://") and all(u.endswith((".jpg",".jpeg",".png",".webp")) for u in media_list):
-                    NEON_GALLERY_SENT[sender_id] = True  # set BEFORE scheduling
-                    _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
-                    app.logger.info("[NEON_GALLERY_SENT] sender=%s lang=%s - neon images sent", sender_id, neon_lang)
+                    if claim_flag(sender_id, "neon_gallery_sent"):  # set BEFORE scheduling, atomic
+                        _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
+                        app.logger.info("[NEON_GALLERY_SENT] sender=%s lang=%s - neon images sent", sender_id, neon_lang)
                 else:
                     app.logger.warning("Skipping neon gallery: invalid PUBLIC_BASE_URL or media list")
             continue
@@ -2837,11 +2672,11 @@ def webhook():
                     app.logger.exception("Failed to schedule offer: %s", e)
                 
                 # Galeria de imagini - o singură dată per conversație
-                if not GALLERY_SENT.get(sender_id):
+                if not conv.gallery_sent:
                     media_list = OFFER_MEDIA_RU if lang == "RU" else OFFER_MEDIA_RO
                     if PUBLIC_BASE_URL.startswith("https://") and all(u.endswith((".jpg",".jpeg",".png",".webp")) for u in media_list):
-                        GALLERY_SENT[sender_id] = True  # set BEFORE scheduling
-                        _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
+                        if claim_flag(sender_id, "gallery_sent"):  # set BEFORE scheduling, atomic
+                            _send_images_delayed(sender_id, media_list, seconds=random.uniform(0.8, 1.6))
                     else:
                         app.logger.warning("Skipping gallery: invalid PUBLIC_BASE_URL or media list")
                 continue